@@ -0,0 +1,74 @@
+"""
+Compare the vectorized reward engine with the per-market reward computation.
+
+Builds a synthetic universe of markets, runs both paths on it, checks that they
+agree and prints the time each one takes.
+
+Usage: python -m benchmarks.bench_rewards [number of markets]
+"""
+import sys
+import time
+import random
+import warnings
+
+import numpy as np
+
+from poly_utils.books import parse_book
+from data_updater.find_markets import process_single_row, process_rows
+
+warnings.filterwarnings("ignore")
+
+USDC = '0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174'
+
+
+def synthetic_market(n):
+    tick = random.choice([0.01, 0.01, 0.001])
+    scale = round(1 / tick)
+    mid = random.randint(int(0.05 * scale), int(0.95 * scale))
+
+    def side(lo, hi):
+        prices = {random.randint(max(lo, 1), min(hi, scale - 1)) / scale for _ in range(random.randint(0, 20))}
+        return [{'price': str(p), 'size': str(random.randint(1, 100000) / 100)} for p in prices]
+
+    bids = sorted(side(mid - scale // 4, mid), key=lambda l: float(l['price']))
+    asks = sorted(side(mid + 1, mid + scale // 4), key=lambda l: -float(l['price']))
+
+    row = {
+        'question': f'Market {n}', 'neg_risk': False,
+        'tokens': [{'outcome': 'Yes', 'token_id': str(2 * n)}, {'outcome': 'No', 'token_id': str(2 * n + 1)}],
+        'rewards': {'min_size': 50, 'max_spread': random.choice([1, 2, 3, 3.5, 4.5, 5]),
+                    'rates': [{'asset_address': USDC, 'rewards_daily_rate': random.choice([1, 10, 25, 100, 250])}]},
+        'minimum_tick_size': tick, 'end_date_iso': '', 'market_slug': f'market-{n}', 'condition_id': f'0x{n:064x}',
+    }
+    return row, parse_book({'bids': bids, 'asks': asks})
+
+
+def same(a, b):
+    return a == b or (np.isnan(a) and np.isnan(b))
+
+
+def main(markets=2000):
+    random.seed(0)
+    universe = [synthetic_market(n) for n in range(markets)]
+    rows = [row for row, _ in universe]
+    books = [book for _, book in universe]
+
+    start = time.perf_counter()
+    per_row = [process_single_row(row, None, book) for row, book in universe]
+    per_row_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = process_rows(rows, books)
+    batched_time = time.perf_counter() - start
+
+    cols = ['best_bid', 'best_ask', 'bid_reward_per_100', 'ask_reward_per_100', 'sm_reward_per_100', 'gm_reward_per_100']
+    mismatches = sum(1 for a, b in zip(per_row, batched) for c in cols if not same(float(a[c]), float(b[c])))
+
+    print(f"{markets} markets")
+    print(f"per-row:    {per_row_time:.3f}s ({markets / per_row_time:,.0f} markets/s)")
+    print(f"vectorized: {batched_time:.3f}s ({markets / batched_time:,.0f} markets/s)")
+    print(f"speedup:    {per_row_time / batched_time:.1f}x, {mismatches} mismatched values")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
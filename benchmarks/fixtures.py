@@ -0,0 +1,110 @@
+"""
+Fixtures for the benchmark suite.
+
+Synthetic fixtures are built from a fixed seed, so every run measures the same
+inputs. Recorded fixtures come from a RECORD_DIR capture (see
+poly_data.feed_recorder) when one is given.
+"""
+import random
+import itertools
+
+import numpy as np
+import pandas as pd
+from sortedcontainers import SortedDict
+
+from poly_utils.price_history import PriceHistoryStore
+
+SEED = 0
+
+# Levels on each side of a synthetic book, one cent apart
+BOOK_LEVELS = 40
+
+HYPERPARAMETERS = {'default': {'stop_loss_threshold': -5.0, 'take_profit_threshold': 2.0,
+                               'volatility_threshold': 20.0, 'spread_threshold': 0.05, 'sleep_period': 1.0}}
+
+
+def market_row(n=0):
+    """A merged Selected/All Markets row, as global_state.markets holds it."""
+    return pd.Series({
+        'question': f"Benchmark market {n}", 'answer1': 'Yes', 'answer2': 'No',
+        'condition_id': f"0x{n + 1:064x}", 'token1': str(10**40 + 2 * n), 'token2': str(10**40 + 2 * n + 1),
+        'neg_risk': 'FALSE', 'tick_size': 0.01, 'min_size': 20, 'max_spread': 3, '3_hour': 5,
+        'best_bid': 0.49, 'best_ask': 0.51, 'param_type': 'default', 'trade_size': 50, 'max_size': 100,
+    })
+
+
+def book_event(market, token, levels=BOOK_LEVELS, seed=SEED):
+    """A websocket 'book' event with `levels` one-cent levels on each side of 0.50 (at most 49)."""
+    rng = random.Random(seed)
+    bids = [{'price': str(round(0.49 - 0.01 * k, 2)), 'size': str(rng.randint(1, 2000))} for k in range(levels)]
+    asks = [{'price': str(round(0.51 + 0.01 * k, 2)), 'size': str(rng.randint(1, 2000))} for k in range(levels)]
+    return {'event_type': 'book', 'market': market, 'asset_id': token, 'timestamp': '0', 'hash': '',
+            'bids': bids[::-1], 'asks': asks[::-1]}
+
+
+def book(levels=BOOK_LEVELS, seed=SEED):
+    """A token1 book in the bot's {'bids', 'asks'} SortedDict shape."""
+    event = book_event('', '', levels, seed)
+    return {side: SortedDict({float(e['price']): float(e['size']) for e in event[side]}) for side in ('bids', 'asks')}
+
+
+def price_changes(count, levels=BOOK_LEVELS, seed=SEED):
+    """(side, price, size) updates to levels of a book(levels), a fifth of them removals."""
+    rng = random.Random(seed)
+    levels = {side: list(prices) for side, prices in book(levels, seed).items()}
+    return [(side, rng.choice(levels[side]), 0.0 if rng.random() < 0.2 else float(rng.randint(1, 2000)))
+            for side in (rng.choice(('bids', 'asks')) for _ in range(count))]
+
+
+def orders_frame(tokens, seed=SEED):
+    """An open orders DataFrame, as PolymarketClient.get_all_orders returns it, with a buy and a sell per token."""
+    rng = random.Random(seed)
+    rows = []
+    for n in range(tokens):
+        for side in ('BUY', 'SELL'):
+            rows.append({'id': f"order-{n}-{side}", 'asset_id': str(10**40 + n), 'market': f"0x{n:064x}",
+                         'side': side, 'price': round(rng.uniform(0.05, 0.95), 2),
+                         'original_size': float(rng.randint(20, 200)), 'size_matched': 0.0})
+    return pd.DataFrame(rows)
+
+
+class FixedOrdersClient:
+    """Returns the same open orders on every call, for timing update_orders on its own."""
+
+    def __init__(self, orders):
+        self.orders = orders
+
+    def get_all_orders(self):
+        return self.orders
+
+    def cancel_all_asset(self, asset_id):
+        pass
+
+
+def price_history_store(root, token, days=31, seed=SEED):
+    """A PriceHistoryStore under root holding `days` days of 10-minute points for one token."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(1_700_000_000, 1_700_000_000 + days * 86400, 600)
+    p = np.clip(0.5 + np.cumsum(rng.normal(0, 0.005, len(t))), 0.01, 0.99)
+
+    store = PriceHistoryStore(root)
+    store.append(token, [{'t': int(a), 'p': float(b)} for a, b in zip(t, p)])
+    return store
+
+
+def recorded_events(directory, limit=20000):
+    """
+    The first market events of a capture, skipping updates to books the capture has not sent yet.
+
+    Returns:
+        list: Event dicts in receive order
+    """
+    from poly_sim.replay import iter_capture
+
+    seen, events = set(), []
+    for _, _, event in itertools.islice(iter_capture(directory), limit):
+        if event.get('event_type') == 'book':
+            seen.add(event['market'])
+        if event.get('event_type') in ('book', 'price_change') and event.get('market') in seen:
+            events.append(event)
+    return events
@@ -0,0 +1,331 @@
+"""
+Microbenchmarks of the book, strategy and market discovery hot paths.
+
+Each benchmark times one call of a function the bot runs per event, per
+evaluation or per market, on fixed synthetic inputs (see benchmarks.fixtures),
+and reports the fastest and the median time per call over several repeats.
+With --capture the websocket handling is also timed over the first events of
+a recorded feed.
+
+Medians are compared with a baseline, and the run fails when a benchmark got
+slower than the baseline by more than the threshold and by more than
+MIN_SLOWDOWN seconds per call, and still is when measured again. Baselines
+are only comparable on the machine that wrote them, so none is kept in the
+repository: write one with --save on the benchmark host, and again after an
+intended change.
+
+Usage:
+    python -m benchmarks.suite [-k SUBSTRING] [--capture DIR] [--baseline PATH]
+                               [--threshold FRACTION] [--save] [--json PATH]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import itertools
+import contextlib
+
+import pandas as pd
+
+import trading
+import poly_data.global_state as global_state
+from poly_data.data_processing import process_book_data, process_price_change, process_data, process_user_data
+from poly_data.data_utils import apply_markets, update_orders
+from poly_data.trading_utils import (get_best_bid_ask_deets, find_best_price_with_size, get_order_prices,
+                                     get_buy_sell_amount)
+from data_updater.find_markets import process_single_row, add_volatility
+from poly_sim.clock import VirtualClock, VirtualEventLoop
+from poly_sim.sim_client import SimClient
+from benchmarks import fixtures
+from benchmarks.bench_rewards import synthetic_market
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# A benchmark fails when its median is this fraction slower than its baseline
+THRESHOLD = 0.25
+
+# ...and at least this many seconds per call slower, as timings of a few microseconds jitter by more than the threshold
+MIN_SLOWDOWN = 2e-6
+
+# Each repeat runs for at least this many seconds, and the median repeat is compared
+MIN_TIME = 0.3
+REPEATS = 9
+
+# Open orders for the update_orders benchmark, a buy and a sell per token
+ORDER_TOKENS = 1000
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Register a benchmark. The decorated function sets up its inputs and returns the call to time."""
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+def _reset_market():
+    # One configured market with a synthetic book, flat and without orders
+    row = fixtures.market_row()
+    global_state.markets = {}
+    global_state.params = fixtures.HYPERPARAMETERS
+    apply_markets(pd.DataFrame([row]))
+    global_state.all_data = {row['condition_id']: fixtures.book()}
+    global_state.positions = {}
+    global_state.orders = {}
+    return global_state.markets[row['condition_id']]
+
+
+@benchmark('process_book_data')
+def bench_process_book_data():
+    row = _reset_market()
+    event = fixtures.book_event(row['condition_id'], row['token1'])
+    return lambda: process_book_data(row['condition_id'], event)
+
+
+@benchmark('process_price_change')
+def bench_process_price_change():
+    row = _reset_market()
+    market = row['condition_id']
+    changes = itertools.cycle(fixtures.price_changes(10000))
+
+    def op():
+        side, price, size = next(changes)
+        process_price_change(market, side, price, size)
+    return op
+
+
+@benchmark('get_best_bid_ask_deets[token1]')
+def bench_deets_token1():
+    row = _reset_market()
+    return lambda: get_best_bid_ask_deets(row['condition_id'], 'token1', 100, 0.1)
+
+
+@benchmark('get_best_bid_ask_deets[token2]')
+def bench_deets_token2():
+    row = _reset_market()
+    return lambda: get_best_bid_ask_deets(row['condition_id'], 'token2', 100, 0.1)
+
+
+@benchmark('find_best_price_with_size')
+def bench_find_best_price_with_size():
+    row = _reset_market()
+    bids = global_state.all_data[row['condition_id']]['bids']
+    return lambda: find_best_price_with_size(bids, 1500, reverse=True)
+
+
+@benchmark('get_order_prices')
+def bench_get_order_prices():
+    row = _reset_market()
+    deets = get_best_bid_ask_deets(row['condition_id'], 'token1', 100, 0.1)
+    args = (deets['best_bid'], deets['best_bid_size'], deets['top_bid'],
+            deets['best_ask'], deets['best_ask_size'], deets['top_ask'], 0.5, row)
+    return lambda: get_order_prices(*args)
+
+
+@benchmark('get_buy_sell_amount')
+def bench_get_buy_sell_amount():
+    row = _reset_market()
+    return lambda: get_buy_sell_amount(60, 0.49, row, 10)
+
+
+@benchmark('perform_trade')
+def bench_perform_trade():
+    """
+    A steady-state evaluation: the bot's orders already rest at the prices it wants.
+
+    Runs on a virtual clock so the cooldown at the end costs nothing, against a
+    SimClient whose orders never fill.
+    """
+    row = _reset_market()
+    market = row['condition_id']
+
+    clock = VirtualClock(time.time())
+    loop = VirtualEventLoop(clock)
+    client = SimClient(clock, fills=False)
+    client.register_markets(global_state.markets)
+    global_state.client = client
+    # Market locks are bound to the loop that created them
+    trading.market_locks.clear()
+
+    async def evaluate():
+        task = asyncio.ensure_future(trading.perform_trade(market))
+        while not task.done():
+            await asyncio.sleep(0)
+            if loop.idle() and loop.next_timer() is not None:
+                clock.set(loop.next_timer())
+
+        # Report placements back, so the next evaluation sees its own orders
+        for frame in client.take_frames(float('inf')):
+            process_user_data(frame)
+
+    return lambda: loop.run_until_complete(evaluate())
+
+
+@benchmark(f'update_orders[{2 * ORDER_TOKENS} orders]')
+def bench_update_orders():
+    _reset_market()
+    global_state.client = fixtures.FixedOrdersClient(fixtures.orders_frame(ORDER_TOKENS))
+    return update_orders
+
+
+@benchmark('process_single_row')
+def bench_process_single_row():
+    random.seed(fixtures.SEED)
+    market, book = synthetic_market(0)
+    return lambda: process_single_row(market, None, book)
+
+
+@benchmark('add_volatility')
+def bench_add_volatility():
+    row = fixtures.market_row().to_dict()
+    store = fixtures.price_history_store(tempfile.mkdtemp(prefix='bench-history-'), row['token1'])
+    # No new points, as on a refresh between two history samples
+    return lambda: add_volatility(row, history=[], store=store)
+
+
+def recorded_benchmark(directory):
+    """process_data over the first events of a capture, timed per event."""
+    events = fixtures.recorded_events(directory)
+    if not events:
+        raise SystemExit(f"No market events in {directory}")
+
+    def setup():
+        global_state.all_data = {}
+        stream = itertools.cycle(events)
+        return lambda: process_data(next(stream), trade=False)
+
+    return 'process_data[recorded]', setup
+
+
+def measure(op, min_time=MIN_TIME, repeats=REPEATS):
+    """
+    Time a call.
+
+    Returns:
+        dict: Fastest and median seconds per call over the repeats, and the calls per repeat
+    """
+    def run(number):
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        return time.perf_counter() - start
+
+    # Grow the number of calls per repeat until one repeat takes min_time
+    number = 1
+    elapsed = run(number)
+    while elapsed < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+        elapsed = run(number)
+
+    per_call = sorted([elapsed / number] + [run(number) / number for _ in range(repeats - 1)])
+    return {'seconds': per_call[0], 'median': per_call[len(per_call) // 2], 'number': number}
+
+
+def _format(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def _slower(result, previous, threshold):
+    return (result['median'] > previous['median'] * (1 + threshold)
+            and result['median'] - previous['median'] > MIN_SLOWDOWN)
+
+
+def run(benchmarks, baseline=None, threshold=THRESHOLD):
+    """
+    Run benchmarks and compare their medians with a baseline.
+
+    A benchmark that looks slower is measured again, and only counts as a
+    regression if it still is.
+
+    Args:
+        benchmarks (list): (name, setup) pairs
+        baseline (dict, optional): Earlier results by name
+        threshold (float): Allowed slowdown as a fraction of the baseline
+
+    Returns:
+        tuple: (results by name, names that regressed)
+    """
+    results, regressed = {}, []
+    devnull = open(os.devnull, 'w')
+
+    for name, setup in benchmarks:
+        # The bot's own logging would dominate the timings
+        with contextlib.redirect_stdout(devnull):
+            result = measure(setup())
+        previous = (baseline or {}).get(name)
+
+        if previous and _slower(result, previous, threshold):
+            with contextlib.redirect_stdout(devnull):
+                again = measure(setup())
+            result = min(result, again, key=lambda r: r['median'])
+        results[name] = result
+
+        line = f"{name:40} {_format(result['seconds']):>10} {_format(result['median']):>10}"
+        if previous:
+            change = result['median'] / previous['median'] - 1
+            line += f" {_format(previous['median']):>10} {100 * change:+7.1f}%"
+            if _slower(result, previous, threshold):
+                regressed.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    return results, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot's hot paths against a stored baseline")
+    parser.add_argument('-k', dest='select', help="Only run benchmarks whose name contains this")
+    parser.add_argument('--capture', help="Also time process_data over this recording directory")
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="Fail when a benchmark is this fraction slower than the baseline")
+    parser.add_argument('--save', action='store_true', help="Write the results as the new baseline")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    benchmarks = list(BENCHMARKS)
+    if args.capture:
+        benchmarks.append(recorded_benchmark(args.capture))
+    if args.select:
+        benchmarks = [(name, setup) for name, setup in benchmarks if args.select in name]
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    elif not args.save:
+        print(f"No baseline at {args.baseline}, write one with --save")
+
+    print(f"{'benchmark':40} {'fastest':>10} {'median':>10}" + (f" {'baseline':>10} {'change':>8}" if baseline else ''))
+    results, regressed = run(benchmarks, baseline, args.threshold)
+
+    report = {'created': pd.Timestamp.utcnow().isoformat(), 'python': platform.python_version(),
+              'machine': platform.platform(), 'processor': platform.processor(), 'results': results}
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"Saved baseline to {args.baseline}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    if regressed:
+        print(f"{len(regressed)} benchmarks regressed by more than {100 * args.threshold:.0f}%: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
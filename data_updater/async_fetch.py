@@ -0,0 +1,164 @@
+import time
+import random
+import asyncio
+import threading
+import concurrent.futures
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from poly_utils.endpoints import CLOB_HOST
+
+# Published rate limits per endpoint as (requests, seconds)
+ENDPOINT_LIMITS = {
+    'sampling-markets': (50, 10),
+    'book': (50, 10),
+    'books': (50, 10),
+    'prices-history': (100, 10),
+}
+
+# Fraction of the published limit we actually use, to leave headroom for other clients
+LIMIT_HEADROOM = 0.9
+
+# Retry policy for transient failures (429, 5xx, connection errors)
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 15
+
+# Size of the connection pool and of the thread pool running blocking requests
+POOL_SIZE = 16
+
+
+class TokenBucket:
+    """
+    Async token bucket limiter.
+
+    Allows bursts of up to `capacity` requests and refills continuously at
+    `capacity / period` requests per second.
+    """
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        # Created lazily so the lock binds to the loop that uses it
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def penalize(self, seconds):
+        """Drain the bucket so no request is sent for roughly `seconds` (used after a 429)."""
+        self.tokens = min(self.tokens, -seconds * self.rate)
+        self.updated = time.monotonic()
+
+
+class RateLimitedFetcher:
+    """
+    Fetches JSON from the CLOB API at (but not above) the published rate limits.
+
+    Requests run on a shared, pooled requests.Session in a thread pool so the
+    event loop can keep many of them in flight. Each endpoint has its own token
+    bucket. Transient failures are retried with exponential backoff and jitter.
+    """
+
+    def __init__(self, limits=ENDPOINT_LIMITS, pool_size=POOL_SIZE):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=pool_size)
+        self.buckets = {name: TokenBucket(max(1, int(n * LIMIT_HEADROOM)), period) for name, (n, period) in limits.items()}
+
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self.started = time.monotonic()
+
+    def _record(self, endpoint, key):
+        with self._stats_lock:
+            stats = self.stats.setdefault(endpoint, {'ok': 0, 'retries': 0, 'failed': 0})
+            stats[key] += 1
+
+    def _request(self, method, url, params, body):
+        response = self.session.request(method, url, params=params, json=body, timeout=30)
+        return response.status_code, response
+
+    async def fetch(self, endpoint, path, params=None, body=None, method='GET'):
+        """
+        Fetch one endpoint, waiting for its rate limiter and retrying on transient errors.
+
+        Args:
+            endpoint (str): Rate-limit bucket name, e.g. 'book' or 'prices-history'
+            path (str): Path relative to CLOB_HOST
+            params (dict, optional): Query parameters
+            body (optional): JSON body for POST requests
+            method (str, optional): HTTP method, defaults to 'GET'
+
+        Returns:
+            Parsed JSON response
+
+        Raises:
+            Exception: If the request still fails after MAX_RETRIES attempts
+        """
+        loop = asyncio.get_running_loop()
+        bucket = self.buckets.get(endpoint)
+        url = CLOB_HOST + path
+
+        for attempt in range(MAX_RETRIES + 1):
+            if bucket is not None:
+                await bucket.acquire()
+
+            try:
+                status, response = await loop.run_in_executor(self.executor, self._request, method, url, params, body)
+                if status == 200:
+                    self._record(endpoint, 'ok')
+                    return response.json()
+
+                if status == 429 and bucket is not None:
+                    bucket.penalize(float(response.headers.get('Retry-After', 1)))
+
+                if status != 429 and status < 500:
+                    response.raise_for_status()
+
+                error = Exception(f"HTTP {status} from {path}")
+            except requests.HTTPError:
+                self._record(endpoint, 'failed')
+                raise
+            except Exception as ex:
+                error = ex
+
+            if attempt == MAX_RETRIES:
+                break
+
+            self._record(endpoint, 'retries')
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+            await asyncio.sleep(random.uniform(0, delay))
+
+        self._record(endpoint, 'failed')
+        raise error
+
+    def report(self):
+        """Print requests per second and retry/failure counts for each endpoint."""
+        elapsed = time.monotonic() - self.started
+        for endpoint, stats in self.stats.items():
+            print(f"{endpoint}: {stats['ok']} ok ({stats['ok'] / elapsed:.1f}/s), "
+                  f"{stats['retries']} retries, {stats['failed']} failed in {elapsed:.0f}s")
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
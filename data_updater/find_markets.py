@@ -2,14 +2,22 @@ import pandas as pd
 import numpy as np
 import os
 import requests
-import time
 import warnings
+
+from poly_utils.endpoints import CLOB_HOST
+from poly_utils.books import parse_book
+from data_updater.reward_engine import compute_rewards
+from poly_utils.price_history import PriceHistoryStore
+from poly_utils.volatility import multi_window_volatility, WINDOWS
 warnings.filterwarnings("ignore")
 
 
 if not os.path.exists('data'):
     os.makedirs('data')
 
+# Price history read back from the local store for volatility, slightly over the longest window
+HISTORY_WINDOW = 31 * 24 * 60 * 60
+
 def get_sel_df(spreadsheet, sheet_name='Selected Markets'):
     try:
         wk2 = spreadsheet.worksheet(sheet_name)
@@ -19,32 +27,6 @@ def get_sel_df(spreadsheet, sheet_name='Selected Markets'):
     except:
         return pd.DataFrame()
     
-def get_all_markets(client):
-    cursor = ""
-    all_markets = []
-
-    while True:
-        try:
-            markets = client.get_sampling_markets(next_cursor = cursor)
-            markets_df = pd.DataFrame(markets['data'])
-
-
-            cursor = markets['next_cursor']
-            
-
-
-            all_markets.append(markets_df)
-
-            if cursor is None:
-                break
-        except:
-            break
-
-    all_df = pd.concat(all_markets)
-    all_df = all_df.reset_index(drop=True)
-
-    return all_df
-
 def get_bid_ask_range(ret, TICK_SIZE):
     bid_from = ret['midpoint'] - ret['max_spread'] / 100
     bid_to = ret['best_ask'] #Although bid to this high up will change bid_from because of changing midpoint, take optimistic approach
@@ -112,7 +94,7 @@ def add_formula_params(curr_df, midpoint, v, daily_reward):
     curr_df['reward_per_100'] = (curr_df['Q'] / curr_df['Q'].sum()) * daily_reward / 2 / curr_df['size'] * curr_df['100']
     return curr_df
 
-def process_single_row(row, client):
+def market_info(row):
     ret = {}
     ret['question'] = row['question']
     ret['neg_risk'] = row['neg_risk']
@@ -123,9 +105,6 @@ def process_single_row(row, client):
     ret['min_size'] = row['rewards']['min_size']
     ret['max_spread'] = row['rewards']['max_spread']
 
-    token1 = row['tokens'][0]['token_id']
-    token2 = row['tokens'][1]['token_id']
-
     rate = 0
     for rate_info in row['rewards']['rates']:
         if rate_info['asset_address'].lower() == '0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174'.lower():
@@ -133,20 +112,28 @@ def process_single_row(row, client):
             break
 
     ret['rewards_daily_rate'] = rate
-    book = client.get_order_book(token1)
+    return ret
+
+def process_single_row(row, client, book=None):
+    ret = market_info(row)
+    rate = ret['rewards_daily_rate']
+
+    token1 = row['tokens'][0]['token_id']
+    token2 = row['tokens'][1]['token_id']
+
+    # The book can be passed in already fetched, e.g. by the bulk books endpoint
+    if book is None:
+        summary = client.get_order_book(token1)
+        book = parse_book({'bids': [vars(o) for o in summary.bids], 'asks': [vars(o) for o in summary.asks]})
     
     bids = pd.DataFrame()
     asks = pd.DataFrame()
 
-    try:
-        bids = pd.DataFrame(book.bids).astype(float)
-    except:
-        pass
+    if len(book.bid_prices) > 0:
+        bids = pd.DataFrame({'price': book.bid_prices, 'size': book.bid_sizes})
 
-    try:
-        asks = pd.DataFrame(book.asks).astype(float)
-    except:
-        pass
+    if len(book.ask_prices) > 0:
+        asks = pd.DataFrame({'price': book.ask_prices, 'size': book.ask_sizes})
 
 
     try:
@@ -216,39 +203,72 @@ def process_single_row(row, client):
     return ret
 
 
-def get_all_results(all_df, client, max_workers=3, batch_size=40):
+def process_rows(rows, books):
+    """
+    Compute the rewards of many markets at once with the vectorized reward engine.
+
+    Produces the same rows as calling process_single_row on each market.
+
+    Args:
+        rows (list): Sampling market rows
+        books (list): CompactBook of each row's first token
+
+    Returns:
+        list: One result dict per row
+    """
+    infos = [market_info(row) for row in rows]
+    rewards = compute_rewards(books, [i['max_spread'] for i in infos], [i['rewards_daily_rate'] for i in infos],
+                              [row['minimum_tick_size'] for row in rows])
+
     all_results = []
+    for n, (row, ret) in enumerate(zip(rows, infos)):
+        ret['best_bid'] = rewards['best_bid'][n]
+        ret['best_ask'] = rewards['best_ask'][n]
+        ret['midpoint'] = rewards['midpoint'][n]
+        ret['tick_size'] = row['minimum_tick_size']
+
+        for col in ['bid_reward_per_100', 'ask_reward_per_100', 'sm_reward_per_100', 'gm_reward_per_100']:
+            ret[col] = rewards[col][n]
+
+        ret['end_date_iso'] = row['end_date_iso']
+        ret['market_slug'] = row['market_slug']
+        ret['token1'] = row['tokens'][0]['token_id']
+        ret['token2'] = row['tokens'][1]['token_id']
+        ret['condition_id'] = row['condition_id']
+        all_results.append(ret)
+
+    return all_results
+
+
+def score_books(rows, books):
+    """
+    Compute the rewards of the rows whose books were fetched.
+
+    Args:
+        rows (list): Sampling market rows
+        books (dict): {token_id: CompactBook}
+
+    Returns:
+        list: Result dicts of the rows that have a book and could be processed
+    """
+    valid_rows, valid_books = [], []
+    for row in rows:
+        book = books.get(str(row['tokens'][0]['token_id']))
+        if book is None:
+            print("error fetching market")
+            continue
 
-    def process_with_progress(args):
-        idx, row = args
         try:
-            return process_single_row(row, client)
+            market_info(row)
+            float(row['minimum_tick_size'])
         except:
-            print("error fetching market")
-            return None
-
-    # Process in batches to respect rate limits (Book endpoint: 50 requests/10s)
-    for i in range(0, len(all_df), batch_size):
-        batch_df = all_df.iloc[i:i+batch_size]
-        batch_results = []
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(process_with_progress, (idx, row)) for idx, row in batch_df.iterrows()]
-            
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result is not None:
-                    batch_results.append(result)
-        
-        all_results.extend(batch_results)
-        print(f'{len(all_results)} of {len(all_df)} markets processed')
-        
-        # Rate limit: sleep for 10 seconds after each batch to respect API limits
-        if i + batch_size < len(all_df):
-            print("Waiting 10 seconds to respect rate limits...")
-            time.sleep(10)
+            print("error processing market")
+            continue
 
-    return all_results
+        valid_rows.append(row)
+        valid_books.append(book)
+
+    return process_rows(valid_rows, valid_books)
 
 def get_combined_markets(new_df, new_markets, sel_df):
 
@@ -263,81 +283,61 @@ def get_combined_markets(new_df, new_markets, sel_df):
     all_markets = all_markets.sort_values('gm_reward_per_100', ascending=False)
     return all_markets
 
-import concurrent.futures
-
-def calculate_annualized_volatility(df, hours):
-    end_time = df['t'].max()
-    start_time = end_time - pd.Timedelta(hours=hours)
-    window_df = df[df['t'] >= start_time]
-    volatility = window_df['log_return'].std()
-    annualized_volatility = volatility * np.sqrt(60 * 24 * 252)
-    return round(annualized_volatility, 2)
+def history_params(token, store):
+    """Query parameters that fetch only the price points missing from the local store."""
+    last = store.last_timestamp(token)
+    if last is None:
+        return {'interval': '1m', 'market': token, 'fidelity': 10}
+    return {'startTs': last + 1, 'market': token, 'fidelity': 10}
+
+def add_volatility(row, history=None, store=None):
+    store = store or PriceHistoryStore()
+
+    if history is None:
+        res = requests.get(f'{CLOB_HOST}/prices-history', params=history_params(row['token1'], store))
+        history = res.json()['history']
+
+    # Only new points are written; the window used for volatility is read back from the store
+    store.append(row['token1'], history)
+    return volatility_rows([row], store)[0]
+
+def volatility_rows(rows, store):
+    """
+    Add the volatility columns to many rows at once, from the price histories in the store.
+
+    Rows whose token has no stored history are dropped.
+    """
+    kept, histories = [], []
+    for row in rows:
+        last = store.last_timestamp(row['token1'])
+        if last is not None:
+            kept.append(row)
+            histories.append(store.read(row['token1'], start=last - HISTORY_WINDOW))
+
+    if not kept:
+        return []
+
+    counts = np.array([len(h) for h in histories])
+    prices = np.concatenate([h['p'] for h in histories]).round(2)
+    stats = multi_window_volatility(np.concatenate([h['t'] for h in histories]), prices, counts)
+    last_prices = prices[np.cumsum(counts) - 1]
 
-def add_volatility(row):
-    res = requests.get(f'https://clob.polymarket.com/prices-history?interval=1m&market={row["token1"]}&fidelity=10')
-    price_df = pd.DataFrame(res.json()['history'])
-    price_df['t'] = pd.to_datetime(price_df['t'], unit='s')
-    price_df['p'] = price_df['p'].round(2)
-
-    price_df.to_csv(f'data/{row["token1"]}.csv', index=False)
-    
-    price_df['log_return'] = np.log(price_df['p'] / price_df['p'].shift(1))
-
-    row_dict = row.copy()
-
-    stats = {
-        '1_hour': calculate_annualized_volatility(price_df, 1),
-        '3_hour': calculate_annualized_volatility(price_df, 3),
-        '6_hour': calculate_annualized_volatility(price_df, 6),
-        '12_hour': calculate_annualized_volatility(price_df, 12),
-        '24_hour': calculate_annualized_volatility(price_df, 24),
-        '7_day': calculate_annualized_volatility(price_df, 24 * 7),
-        '14_day': calculate_annualized_volatility(price_df, 24 * 14),
-        '30_day': calculate_annualized_volatility(price_df, 24 * 30),
-        'volatility_price': price_df['p'].iloc[-1]
-    }
-
-    new_dict = {**row_dict, **stats}
-    return new_dict
-
-def add_volatility_to_df(df, max_workers=2, batch_size=40):
-    
     results = []
-    df = df.reset_index(drop=True)
+    for n, row in enumerate(kept):
+        row_stats = {name: stats[name][n] for name in WINDOWS}
+        row_stats['volatility_price'] = last_prices[n]
+        results.append({**row, **row_stats})
 
-    def process_volatility_with_progress(args):
-        idx, row = args
-        try:
-            ret = add_volatility(row.to_dict())
-            return ret
-        except:
-            print("Error fetching volatility")
-            return None
-
-    # Process in batches to respect rate limits (Price endpoint: 100 requests/10s)
-    for i in range(0, len(df), batch_size):
-        batch_df = df.iloc[i:i+batch_size]
-        batch_results = []
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(process_volatility_with_progress, (idx, row)) for idx, row in batch_df.iterrows()]
-            
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result is not None:
-                    batch_results.append(result)
-        
-        results.extend(batch_results)
-        print(f'{len(results)} of {len(df)} volatility calculations completed')
+    return results
 
-        # Rate limit: sleep for 10 seconds after each batch to respect API limits
-        if i + batch_size < len(df):
-            print("Waiting 10 seconds to respect rate limits...")
-            time.sleep(10)
-            
-    return pd.DataFrame(results)
+def volatility_frame(df, store=None):
+    """Add the volatility columns to the rows of df from the histories already in the store."""
+    rows = volatility_rows([row.to_dict() for _, row in df.iterrows()], store or PriceHistoryStore())
+    if not rows:
+        # Keep the columns and their types when no market has a stored history
+        return df.iloc[:0].assign(**{col: pd.Series(dtype=float) for col in list(WINDOWS) + ['volatility_price']})
+    return pd.DataFrame(rows)
 
-    
 def get_markets(all_results, sel_df, maker_reward=1):
     new_df = pd.DataFrame(all_results)
     new_df['spread'] = abs(new_df['best_ask'] - new_df['best_bid'])
@@ -0,0 +1,216 @@
+import time
+import asyncio
+
+from data_updater.async_fetch import RateLimitedFetcher, POOL_SIZE
+from data_updater.find_markets import score_books, history_params
+from poly_utils.books import parse_books_response, books_request_body, BOOKS_BATCH_SIZE
+from poly_utils.price_history import PriceHistoryStore
+
+# Capacity of the queue between two stages; a full queue makes the stage before it wait
+QUEUE_SIZE = 1000
+
+# Concurrent requests per fetching stage
+BOOK_WORKERS = 4
+HISTORY_WORKERS = POOL_SIZE
+
+# Cursor the sampling markets endpoint returns after the last page
+END_CURSOR = 'LTE='
+
+_DONE = object()
+
+
+class _Stage:
+    # Item count and first/last activity of a stage, for the timing summary
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.first = None
+        self.last = None
+
+    def tick(self, n=1):
+        now = time.monotonic()
+        if self.first is None:
+            self.first = now
+        self.last = now
+        self.count += n
+
+
+async def _pages(fetcher, out, stage):
+    # Returns True once the last page was read
+    cursor = ''
+    complete = False
+    while True:
+        try:
+            page = await fetcher.fetch('sampling-markets', '/sampling-markets', {'next_cursor': cursor})
+        except Exception as ex:
+            print(f"Error fetching sampling markets page: {ex}")
+            break
+
+        for row in page['data']:
+            await out.put(row)
+        stage.tick(len(page['data']))
+
+        cursor = page.get('next_cursor')
+        if not page['data'] or cursor in (None, '', END_CURSOR):
+            complete = True
+            break
+
+    await out.put(_DONE)
+    return complete
+
+
+async def _batches(rows, out, results, cache, seen):
+    # Group rows into batches for the books endpoint; rows with a good cached result skip it
+    batch = []
+    while True:
+        row = await rows.get()
+        if row is _DONE:
+            break
+
+        seen.add(row['condition_id'])
+        if cache is not None and cache.stale_reason(row) is None:
+            await results.put(cache.cached_result(row['condition_id']))
+            continue
+
+        batch.append(row)
+        if len(batch) == BOOKS_BATCH_SIZE:
+            await out.put(batch)
+            batch = []
+
+    if batch:
+        await out.put(batch)
+    for _ in range(BOOK_WORKERS):
+        await out.put(_DONE)
+
+
+async def _books(fetcher, batches, out, stage):
+    while True:
+        batch = await batches.get()
+        if batch is _DONE:
+            break
+
+        tokens = [str(row['tokens'][0]['token_id']) for row in batch]
+        try:
+            response = await fetcher.fetch('books', '/books', body=books_request_body(tokens), method='POST')
+        except Exception as ex:
+            print(f"Error fetching {len(batch)} books: {ex}")
+            continue
+
+        await out.put((batch, parse_books_response(response)))
+        stage.tick(len(batch))
+
+    await out.put(_DONE)
+
+
+async def _score(books, out, cache, stage):
+    finished = 0
+    while finished < BOOK_WORKERS:
+        item = await books.get()
+        if item is _DONE:
+            finished += 1
+            continue
+
+        rows, batch_books = item
+        by_id = {row['condition_id']: row for row in rows}
+        for result in score_books(rows, batch_books):
+            if cache is not None:
+                cache.update_result(by_id[result['condition_id']], result)
+            await out.put(result)
+            stage.tick()
+
+    await out.put(_DONE)
+
+
+async def _select(results, out, collected, wanted, cache):
+    # Keep every result, and send the ones that will need volatility on to the history stage
+    while True:
+        result = await results.get()
+        if result is _DONE:
+            break
+
+        collected.append(result)
+        if wanted(result) and (cache is None or cache.needs_volatility(result['condition_id'])):
+            await out.put(result)
+
+    for _ in range(HISTORY_WORKERS):
+        await out.put(_DONE)
+
+
+async def _histories(fetcher, results, store, refreshed, stage):
+    while True:
+        result = await results.get()
+        if result is _DONE:
+            break
+
+        token = result['token1']
+        try:
+            res = await fetcher.fetch('prices-history', '/prices-history', history_params(token, store))
+        except Exception as ex:
+            print(f"Error fetching price history of {token}: {ex}")
+            continue
+
+        store.append(token, res['history'])
+        refreshed.add(result['condition_id'])
+        stage.tick()
+
+
+async def _run(sel_df, maker_reward, cache, store, max_workers):
+    fetcher = RateLimitedFetcher(pool_size=max_workers)
+    selected = set(sel_df['question']) if 'question' in sel_df else set()
+
+    # Same selection as get_markets: selected markets plus those paying at least maker_reward
+    def wanted(result):
+        return result['question'] in selected or result['gm_reward_per_100'] >= maker_reward
+
+    queues = [asyncio.Queue(QUEUE_SIZE) for _ in range(5)]
+    rows_q, batches_q, books_q, results_q, history_q = queues
+    stages = [_Stage('pages'), _Stage('books'), _Stage('scores'), _Stage('histories')]
+
+    collected, seen, refreshed = [], set(), set()
+    started = time.monotonic()
+
+    try:
+        complete, *_ = await asyncio.gather(
+            _pages(fetcher, rows_q, stages[0]),
+            _batches(rows_q, batches_q, results_q, cache, seen),
+            *[_books(fetcher, batches_q, books_q, stages[1]) for _ in range(BOOK_WORKERS)],
+            _score(books_q, results_q, cache, stages[2]),
+            _select(results_q, history_q, collected, wanted, cache),
+            *[_histories(fetcher, history_q, store, refreshed, stages[3]) for _ in range(HISTORY_WORKERS)],
+        )
+    finally:
+        fetcher.report()
+        fetcher.close()
+
+    for stage in stages:
+        if stage.first is not None:
+            print(f"{stage.name}: {stage.count} items between {stage.first - started:.1f}s and {stage.last - started:.1f}s")
+    print(f"Discovery pipeline finished in {time.monotonic() - started:.1f}s")
+
+    # Markets missing from a partial listing may still exist, so only forget them after a full one
+    if cache is not None and complete:
+        cache.prune(seen)
+
+    return collected, refreshed
+
+
+def discover_markets(sel_df, maker_reward=1, cache=None, store=None, max_workers=POOL_SIZE):
+    """
+    Page the sampling markets, fetch their books, score their rewards and fetch the
+    price histories of the markets worth trading, with all stages running at once.
+
+    Each stage reads from a bounded queue fed by the one before it and has its own
+    rate limiter, so books are being fetched while later pages are still coming in
+    and histories are fetched as soon as a market is scored.
+
+    Args:
+        sel_df (DataFrame): Selected Markets, whose histories are always fetched
+        maker_reward (float, optional): Minimum gm_reward_per_100 of other markets to fetch histories for
+        cache (UniverseCache, optional): Reuse unchanged markets from the previous refresh
+        store (PriceHistoryStore, optional): Where histories are appended
+        max_workers (int, optional): Size of the HTTP connection pool
+
+    Returns:
+        tuple: (list of reward result dicts, set of condition IDs whose history was refreshed)
+    """
+    return asyncio.run(_run(sel_df, maker_reward, cache, store or PriceHistoryStore(), max_workers))
@@ -0,0 +1,201 @@
+import numpy as np
+
+# Decimal scale used by get_bid_ask_range when rounding the quoting ranges
+RANGE_DECIMALS = 3
+
+
+def _flatten(books, side):
+    # Concatenate one side of every book into flat price/size arrays plus per-book lengths
+    prices = [getattr(book, side + '_prices') for book in books]
+    sizes = [getattr(book, side + '_sizes') for book in books]
+    counts = np.fromiter((len(p) for p in prices), dtype=np.int64, count=len(prices))
+
+    if not len(prices) or not counts.sum():
+        return np.zeros(0), np.zeros(0), counts
+    return np.concatenate(prices), np.concatenate(sizes), counts
+
+
+def _last(values, counts):
+    # Last value of each segment, or 0 for empty segments
+    ends = np.cumsum(counts) - 1
+    out = np.zeros(len(counts))
+    has = counts > 0
+    out[has] = values[ends[has]]
+    return out
+
+
+def _round(x, decimals):
+    # Same result as round() on a numpy float: scale, round half to even, unscale
+    scale = 10.0 ** decimals
+    return np.rint(x * scale) / scale
+
+
+def _segment_sums(values, starts, counts):
+    """
+    Sum each segment exactly the way a pandas Series.sum() of it would.
+
+    numpy sums a 1-d array pairwise, so the result depends on the length of the
+    array. Segments are grouped by length and each group is summed as the rows
+    of a 2-d array, which applies the same pairwise order row by row.
+    """
+    sums = np.zeros(len(counts))
+    for length in np.unique(counts[counts > 0]):
+        seg = np.nonzero(counts == length)[0]
+        sums[seg] = values[starts[seg][:, None] + np.arange(length)].sum(axis=1)
+    return sums
+
+
+def _ladders(start, end, tick, decimals, python_round):
+    """
+    Generate the quoting ladder of every market, as generate_numbers does.
+
+    Returns:
+        tuple: (flat ladder prices, owning market of each price, ladder lengths)
+    """
+    scale = 10.0 ** decimals
+
+    on_grid = start * 100 % 1 == 0
+    first = np.where(on_grid, start + tick, (np.trunc(start * 100) + 1) / 100)
+
+    # generate_numbers rounds its second value with round(); whether that is Python's
+    # or numpy's rounding depends on the type the first value ended up with
+    second = _round(first + tick, decimals)
+    for i in np.nonzero(python_round | ~on_grid)[0]:
+        second[i] = round(float(first[i]) + float(tick[i]), int(decimals[i]))
+
+    # Every later value is the nearest float to an integer number of ticks, i.e. k / 10^d
+    k = np.rint(second * scale)
+    estimate = np.where(first < end, np.maximum(np.ceil((end - second) * scale), 0) + 3, 0).astype(np.int64)
+
+    owner = np.repeat(np.arange(len(start)), estimate)
+    offsets = np.cumsum(estimate) - estimate
+    j = np.arange(len(owner)) - offsets[owner]
+
+    prices = np.where(j == 0, first[owner], (k[owner] + j - 1) / scale[owner])
+
+    # The loop stops at the first value that is not below the end of the range
+    stop = prices >= end[owner]
+    first_stop = np.full(len(start), np.iinfo(np.int64).max)
+    np.minimum.at(first_stop, owner[stop], j[stop])
+    keep = j < first_stop[owner]
+
+    return prices[keep], owner[keep], np.bincount(owner[keep], minlength=len(start))
+
+
+def _lookup(ladder, owner, book_prices, book_sizes, book_counts):
+    # Size resting at each ladder price in the owner's book, or 0 (the left merge + fillna)
+    book_owner = np.repeat(np.arange(len(book_counts)), book_counts)
+
+    # Match prices exactly, as the merge does, by keying on (market, exact price)
+    _, inverse = np.unique(np.concatenate([ladder, book_prices]), return_inverse=True)
+    width = inverse.max() + 1 if len(inverse) else 1
+    ladder_keys = owner * width + inverse[:len(ladder)]
+    book_keys = book_owner * width + inverse[len(ladder):]
+
+    order = np.argsort(book_keys, kind='stable')
+    sorted_keys = book_keys[order]
+    pos = np.minimum(np.searchsorted(sorted_keys, ladder_keys), max(len(sorted_keys) - 1, 0))
+
+    sizes = np.zeros(len(ladder))
+    if len(sorted_keys):
+        found = sorted_keys[pos] == ladder_keys
+        sizes[found] = book_sizes[order[pos[found]]]
+    return sizes
+
+
+def _side_rewards(range_from, range_to, midpoint, v, daily_rate, tick, decimals, python_round,
+                  book_prices, book_sizes, book_counts):
+    ladder, owner, counts = _ladders(range_from, range_to, tick, decimals, python_round)
+    size = _lookup(ladder, owner, book_prices, book_sizes, book_counts)
+
+    # add_formula_params, applied to every market's ladder at once
+    mid, spread = midpoint[owner], v[owner]
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        s = np.abs(ladder - mid)
+        S = ((spread - s) / spread) ** 2
+        h = 1 / ladder * 100
+        size = size + h
+        Q = S * size
+
+        starts = np.cumsum(counts) - counts
+        total = _segment_sums(np.where(np.isnan(Q), 0, Q), starts, counts)
+        reward = (Q / total[owner]) * daily_rate[owner] / 2 / size * h
+
+    # Max per market, skipping NaN; markets with an empty ladder get NaN
+    best = np.full(len(counts), np.nan)
+    filled = counts > 0
+    if filled.any():
+        best[filled] = np.fmax.reduceat(reward, starts[filled])
+    best = _round(best, 2)
+
+    # A market with no orders on this side of the book earns nothing
+    best[book_counts == 0] = 0
+    return best
+
+
+def compute_rewards(books, max_spread, daily_rate, tick_size):
+    """
+    Compute the reward per 100 of every market in one vectorized pass.
+
+    Gives exactly the same numbers as process_single_row, which builds the
+    ladders and merges them with the book one market at a time.
+
+    Args:
+        books (list): CompactBook of each market's first token
+        max_spread (list): Maximum rewarded spread of each market, in cents
+        daily_rate (list): Daily reward rate of each market
+        tick_size (list): Minimum tick size of each market
+
+    Returns:
+        dict: Arrays of best_bid, best_ask, midpoint, bid_reward_per_100,
+            ask_reward_per_100, sm_reward_per_100 and gm_reward_per_100
+    """
+    bid_prices, bid_sizes, bid_counts = _flatten(books, 'bid')
+    ask_prices, ask_sizes, ask_counts = _flatten(books, 'ask')
+
+    tick = np.asarray(tick_size, dtype=np.float64)
+    decimals = np.array([len(str(t).split('.')[1]) for t in tick_size])
+    daily = np.asarray(daily_rate, dtype=np.float64)
+    spread = np.asarray(max_spread, dtype=np.float64) / 100
+    v = np.array([round(s / 100, 2) for s in max_spread], dtype=np.float64)
+
+    best_bid = _last(bid_prices, bid_counts)
+    best_ask = _last(ask_prices, ask_counts)
+    midpoint = (best_bid + best_ask) / 2
+
+    # get_bid_ask_range
+    widen = tick + 0.1 * tick
+
+    bid_from = midpoint - spread
+    bid_to = np.where(best_ask == 0, midpoint, best_ask)
+    bid_to = np.where(bid_to - tick > midpoint, best_bid + widen, bid_to)
+    bid_from = np.where(bid_from > bid_to, bid_to - widen, bid_from)
+
+    ask_to = midpoint + spread
+    ask_from = np.where(best_bid == 0, midpoint, best_bid)
+    ask_from = np.where(ask_from + tick < midpoint, best_ask - widen, ask_from)
+    ask_to = np.where(ask_from > ask_to, ask_from + widen, ask_to)
+
+    bid_from, bid_to = _round(bid_from, RANGE_DECIMALS), _round(bid_to, RANGE_DECIMALS)
+    ask_from, ask_to = _round(ask_from, RANGE_DECIMALS), _round(ask_to, RANGE_DECIMALS)
+
+    # A range clipped to 0 starts from a Python int, which changes how its ladder is rounded
+    bid_clipped, ask_clipped = bid_from < 0, ask_from < 0
+    bid_from = np.where(bid_clipped, 0, bid_from)
+    ask_from = np.where(ask_clipped, 0, ask_from)
+
+    bid_reward = _side_rewards(bid_from, bid_to, midpoint, v, daily, tick, decimals, bid_clipped,
+                               bid_prices, bid_sizes, bid_counts)
+    ask_reward = _side_rewards(ask_from, ask_to, midpoint, v, daily, tick, decimals, ask_clipped,
+                               ask_prices, ask_sizes, ask_counts)
+
+    with np.errstate(invalid='ignore'):
+        return {
+            'best_bid': best_bid,
+            'best_ask': best_ask,
+            'midpoint': midpoint,
+            'bid_reward_per_100': bid_reward,
+            'ask_reward_per_100': ask_reward,
+            'sm_reward_per_100': _round((bid_reward + ask_reward) / 2, 2),
+            'gm_reward_per_100': _round((bid_reward * ask_reward) ** 0.5, 2),
+        }
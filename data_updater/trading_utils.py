@@ -9,6 +9,8 @@ from web3.middleware import geth_poa_middleware
 
 import json
 
+from poly_utils.endpoints import CLOB_HOST, POLYGON_RPC
+
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -19,7 +21,7 @@ import os
 MAX_INT = 2**256 - 1
 
 def get_clob_client():
-    host = "https://clob.polymarket.com"
+    host = CLOB_HOST
     key = os.getenv("PK")
     chain_id = POLYGON
     
@@ -41,7 +43,7 @@ def get_clob_client():
 
 
 def approveContracts():
-    web3 = Web3(Web3.HTTPProvider("https://polygon-rpc.com"))
+    web3 = Web3(Web3.HTTPProvider(POLYGON_RPC))
     web3.middleware_onion.inject(geth_poa_middleware, layer=0)
     wallet = web3.eth.account.privateKeyToAccount(os.getenv("PK"))
     
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+
+import pandas as pd
+
+# Where the previous universe is kept between refreshes
+CACHE_PATH = 'data/universe.pkl'
+
+# A market's book and rewards are refetched when its token price moved at least this much
+MOVE_THRESHOLD = 0.02
+
+# Cached book results and volatility are refetched at least this often, even if nothing changed
+MAX_RESULT_AGE = 60 * 60
+MAX_VOLATILITY_AGE = 60 * 60
+
+VOLATILITY_COLS = ['1_hour', '3_hour', '6_hour', '12_hour', '24_hour', '7_day', '14_day', '30_day', 'volatility_price']
+
+
+def market_hash(row):
+    """Hash the parts of a sampling market row that affect its rewards: reward terms, tokens and tick size."""
+    content = {
+        'question': row['question'],
+        'neg_risk': row['neg_risk'],
+        'rewards': row['rewards'],
+        'tokens': [(t['token_id'], t['outcome']) for t in row['tokens']],
+        'tick': row['minimum_tick_size'],
+    }
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _token_price(row):
+    try:
+        return float(row['tokens'][0]['price'])
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+class UniverseCache:
+    """
+    The previous market universe, keyed by condition_id.
+
+    For each market it keeps the content hash of its sampling row, the token price
+    seen when its book was last fetched, the computed reward row and its volatility
+    stats, so a refresh only has to refetch the markets that changed.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.markets = {}
+
+    @classmethod
+    def load(cls, path=CACHE_PATH):
+        cache = cls(path)
+        if os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    cache.markets = pickle.load(f)
+            except Exception as ex:
+                print(f"Could not read universe cache, starting empty: {ex}")
+        return cache
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.markets, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def stale_reason(self, row, move_threshold=MOVE_THRESHOLD, max_age=MAX_RESULT_AGE, now=None):
+        """
+        Check whether a sampling market row's book and rewards must be refetched.
+
+        Returns:
+            str: 'new', 'changed', 'moved' or 'expired', or None if the cached result is still good
+        """
+        now = time.time() if now is None else now
+        entry = self.markets.get(row['condition_id'])
+        price = _token_price(row)
+
+        if entry is None or 'result' not in entry:
+            return 'new'
+        if entry['hash'] != market_hash(row):
+            return 'changed'
+        if price is not None and entry['price'] is not None and abs(price - entry['price']) >= move_threshold:
+            return 'moved'
+        if now - entry['fetched'] > max_age:
+            return 'expired'
+        return None
+
+    def update_result(self, row, result, now=None):
+        """Store a freshly computed reward row, keeping its volatility if the market didn't change."""
+        entry = self.markets.get(row['condition_id'], {})
+        if entry.get('hash') != market_hash(row):
+            entry = {}
+
+        entry.update({'hash': market_hash(row), 'price': _token_price(row),
+                      'fetched': time.time() if now is None else now, 'result': result})
+        self.markets[row['condition_id']] = entry
+
+    def cached_result(self, condition_id):
+        return self.markets[condition_id]['result']
+
+    def prune(self, condition_ids):
+        """Forget the markets that are not in condition_ids."""
+        current = set(condition_ids)
+        for condition_id in list(self.markets):
+            if condition_id not in current:
+                del self.markets[condition_id]
+
+    def needs_volatility(self, condition_id, max_age=MAX_VOLATILITY_AGE, now=None):
+        """Check whether a market has no volatility stats, or stats older than max_age."""
+        now = time.time() if now is None else now
+        entry = self.markets.get(condition_id, {})
+        return 'volatility' not in entry or now - entry['volatility_time'] > max_age
+
+    def update_volatility(self, vol_df):
+        now = time.time()
+        for _, row in vol_df.iterrows():
+            entry = self.markets.get(row['condition_id'])
+            if entry is not None:
+                entry['volatility'] = {col: row[col] for col in VOLATILITY_COLS}
+                entry['volatility_time'] = now
+
+    def with_volatility(self, df):
+        """Add the cached volatility stats to df, dropping rows that have none."""
+        rows = []
+        for _, row in df.iterrows():
+            entry = self.markets.get(row['condition_id'], {})
+            if 'volatility' in entry:
+                rows.append({**row.to_dict(), **entry['volatility']})
+        if not rows:
+            # Keep the columns and their types, as before any stats are cached
+            return df.iloc[:0].assign(**{col: pd.Series(dtype=float) for col in VOLATILITY_COLS})
+        return pd.DataFrame(rows)
@@ -1,4 +1,5 @@
 import gc                      # Garbage collection
+import os                      # Operating system interface
 import time                    # Time functions
 import asyncio                 # Asynchronous I/O
 import traceback               # Exception handling
@@ -6,21 +7,75 @@ import threading               # Thread management
 
 from poly_data.polymarket_client import PolymarketClient
 from poly_data.data_utils import update_markets, update_positions, update_orders
-from poly_data.websocket_handlers import connect_market_websocket, connect_user_websocket
+from poly_data.websocket_handlers import connect_market_websocket, connect_user_websocket, follow_shared_book
 import poly_data.global_state as global_state
-from poly_data.data_processing import remove_from_performing
+from poly_data.data_processing import remove_from_performing, resync_books
+from poly_data.reconciliation import request_reconcile, start_reconciler
+from poly_data.position_ledger import PositionLedger
+from poly_data.warm_start import load_snapshot, save_snapshot, mark_validated
+from poly_data.realized_vol import sample_volatility
+from poly_data.feed_recorder import start_recorder, RECORD_DIR
+from poly_data.soak_monitor import start_soak_monitor
+from poly_data.loop_monitor import start_loop_monitor
+from poly_data.metrics import start_metrics_server, POLL_SECONDS
+from poly_data.profiler import start_profiler
+from poly_data.sharding import start_shard, SharedStateClient
+from poly_data.shared_book import SHARED_BOOK
+from trading import perform_trade
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def update_once():
+def update_once(restored=False):
     """
     Initialize the application state by fetching market data, positions, and orders.
+
+    Args:
+        restored (bool, optional): If positions were restored from the ledger, only
+            apply the API diff so in-flight trades aren't overwritten, and check
+            restored positions the API no longer lists on-chain
     """
     update_markets()    # Get market information from Google Sheets
-    update_positions()  # Get current positions from Polymarket
+    update_positions(avgOnly=restored, reconcile_missing=restored)  # Get current positions from Polymarket
     update_orders()     # Get current orders from Polymarket
 
+def requote(markets, loop):
+    """
+    Schedule perform_trade on the event loop for markets whose configuration or book changed.
+
+    Args:
+        markets (list): Condition IDs to requote
+        loop: The event loop running the websockets
+    """
+    for market in markets:
+        asyncio.run_coroutine_threadsafe(perform_trade(market), loop)
+
+def revalidate(loop, restored=False):
+    """
+    Refresh warm-start state from its sources in the background.
+
+    Each part leaves guarded mode as soon as its own refresh succeeds.
+
+    Args:
+        loop: The event loop running the websockets
+        restored (bool, optional): Whether positions were restored from the ledger
+    """
+    for part, refresh in [
+        ('config', lambda: requote(update_markets(), loop)),
+        ('books', lambda: requote(resync_books(list(global_state.markets)), loop)),
+        ('positions', lambda: update_positions(avgOnly=restored, reconcile_missing=restored)),
+        ('orders', update_orders)
+    ]:
+        while True:
+            try:
+                refresh()
+                mark_validated(part)
+                break
+            except:
+                print(f"Error revalidating {part}, retrying")
+                print(traceback.format_exc())
+                time.sleep(5)
+
 def remove_from_pending():
     """
     Clean up stale trades that have been pending for too long (>15 seconds).
@@ -39,6 +94,9 @@ def remove_from_pending():
                         print(f"Removing stale entry {trade_id} from {col} after 15 seconds")
                         remove_from_performing(col, trade_id)
                         print("After removing: ", global_state.performing, global_state.performing_timestamps)
+
+                        # The trade never resolved, so check the token's real balance
+                        request_reconcile(col.rsplit('_', 1)[0], 'stale trade')
                 except:
                     print("Error in remove_from_pending")
                     print(traceback.format_exc())                
@@ -46,12 +104,15 @@ def remove_from_pending():
         print("Error in remove_from_pending")
         print(traceback.format_exc())
 
-def update_periodically():
+def update_periodically(loop):
     """
     Background thread function that periodically updates market data, positions and orders.
     - Positions and orders are updated every 5 seconds
     - Market data is updated every 30 seconds (every 6 cycles)
     - Stale pending trades are removed each cycle
+
+    Args:
+        loop: The event loop running the websockets, used to requote changed markets
     """
     i = 1
     while True:
@@ -59,16 +120,30 @@ def update_periodically():
         
         try:
             # Clean up stale trades
-            remove_from_pending()
+            with POLL_SECONDS.timer('pending'):
+                remove_from_pending()
             
             # Update positions and orders every cycle
-            update_positions(avgOnly=True)  # Only update average price, not position size
-            update_orders()
+            with POLL_SECONDS.timer('positions'):
+                update_positions(avgOnly=True)  # Only update average price, not position size
+            with POLL_SECONDS.timer('orders'):
+                update_orders()
 
             # Update market data every 6th cycle (30 seconds)
             if i % 6 == 0:
-                update_markets()
+                with POLL_SECONDS.timer('markets'):
+                    changed = update_markets()
+                requote(changed, loop)
+                global_state.ledger.snapshot()  # Compact the position ledger
+                if global_state.shard is None:
+                    save_snapshot()             # Save state for warm restarts
                 i = 1
+
+            # Apply a change of this shard's markets without waiting for the next refresh
+            elif global_state.shard is not None and global_state.shard.changed.is_set():
+                with POLL_SECONDS.timer('markets'):
+                    changed = update_markets()
+                requote(changed, loop)
                     
             gc.collect()  # Force garbage collection to free memory
             i += 1
@@ -76,40 +151,97 @@ def update_periodically():
             print("Error in update_periodically")
             print(traceback.format_exc())
             
+async def keep_connected(connect):
+    """
+    Run a websocket handler forever, reconnecting whenever it returns.
+
+    Args:
+        connect: Function returning the handler coroutine for a new connection
+    """
+    while True:
+        try:
+            await connect()
+            print("Reconnecting to the websocket")
+        except:
+            print("Error in main loop")
+            print(traceback.format_exc())
+            
+        await asyncio.sleep(1)
+        gc.collect()  # Clean up memory
+
 async def main():
     """
     Main application entry point. Initializes client, data, and manages websocket connections.
     """
     # Initialize client
     global_state.client = PolymarketClient()
+
+    # Take a share of the markets from the coordinator if SHARD_COORDINATOR is set
+    global_state.shard = start_shard()
+    if global_state.shard is not None:
+        global_state.client = SharedStateClient(global_state.client, global_state.shard)
+
+    # Record raw websocket frames if RECORD_FEED is set, each shard worker into its own directory
+    global_state.recorder = start_recorder(
+        RECORD_DIR if global_state.shard is None else os.path.join(RECORD_DIR, f"shard-{global_state.shard.worker_id}"))
     
-    # Initialize state and fetch initial data
+    # Restore positions and in-flight trades from the local ledger
+    global_state.ledger = PositionLedger('ledger' if global_state.shard is None else f"ledger-{global_state.shard.worker_id}")
+    restored = global_state.ledger.restore()
+
+    # Initialize state, from the warm-start snapshot if there is a recent one.
+    # A shard worker starts cold, since its markets may have moved since the snapshot
     global_state.all_tokens = []
-    update_once()
-    print("After initial updates: ", global_state.orders, global_state.positions)
+    warm = load_snapshot() if global_state.shard is None else False
+
+    if not warm:
+        update_once(restored)
+        print("After initial updates: ", global_state.orders, global_state.positions)
 
     print("\n")
     print(f'There are {len(global_state.df)} market, {len(global_state.positions)} positions and {len(global_state.orders)} orders. Starting positions: {global_state.positions}')
 
+    # Watch for callbacks that block the event loop
+    global_state.loop_monitor = start_loop_monitor()
+
+    # Serve feed, strategy and order counters on /metrics if METRICS_PORT is set
+    start_metrics_server()
+
+    # Profile the loop per market for a window on SIGUSR2
+    profiler = start_profiler()
+
+    # Start background position reconciliation worker
+    start_reconciler()
+
     # Start background update thread
-    update_thread = threading.Thread(target=update_periodically, daemon=True)
+    loop = asyncio.get_running_loop()
+    update_thread = threading.Thread(target=update_periodically, args=(loop,), daemon=True)
     update_thread.start()
+
+    # Sample live mid prices for realized volatility
+    asyncio.create_task(sample_volatility())
+
+    # Sample memory, tasks and structure sizes for soak tests if SOAK_MONITOR is set
+    soak_monitor = start_soak_monitor()
+
+    if warm:
+        # Refresh the snapshot's state in the background. Each market is quoted once
+        # its book arrives from the websocket or the resync, never off the snapshot's
+        threading.Thread(target=revalidate, args=(loop, restored), daemon=True).start()
     
-    # Main loop - maintain websocket connections
-    while True:
-        try:
-            # Connect to market and user websockets simultaneously
-            await asyncio.gather(
-                connect_market_websocket(global_state.all_tokens), 
-                connect_user_websocket()
-            )
-            print("Reconnecting to the websocket")
-        except:
-            print("Error in main loop")
-            print(traceback.format_exc())
-            
-        await asyncio.sleep(1)
-        gc.collect()  # Clean up memory
+    # Read books from the feed handler's shared memory if SHARED_BOOK is set, else from the market websocket
+    if SHARED_BOOK:
+        market_feed = lambda: follow_shared_book(SHARED_BOOK)
+    else:
+        market_feed = lambda: connect_market_websocket(
+            global_state.all_tokens if global_state.shard is None else global_state.shard.tokens())
+
+    # Main loop - maintain market and user websocket connections, each reconnecting on its own
+    # so the market websocket can resubscribe when a shard's markets change
+    await asyncio.gather(
+        keep_connected(market_feed),
+        keep_connected(connect_user_websocket)
+    )
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
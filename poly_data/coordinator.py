@@ -0,0 +1,258 @@
+"""
+Coordinator for running the bot as several shard worker processes on one host.
+
+The coordinator keeps the list of live workers, from which each worker derives
+the same consistent hash assignment of markets (see poly_data.sharding). It
+also polls positions, open orders and balances once for all of them, and
+holds the live positions each worker reports with its heartbeat.
+
+Usage:
+    python -m poly_data.coordinator serve [--address HOST:PORT] [--no-poll]
+    python -m poly_data.coordinator launch --workers N [--address HOST:PORT]
+    python -m poly_data.coordinator status [--address HOST:PORT]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import traceback
+import subprocess
+from multiprocessing.managers import BaseManager
+
+from dotenv import load_dotenv
+
+from poly_data.sharding import connect_coordinator, coordinator_authkey, parse_address, SHARD_COORDINATOR
+
+load_dotenv()
+
+ADDRESS = SHARD_COORDINATOR or '127.0.0.1:50515'
+
+# A worker that hasn't sent a heartbeat for this many seconds has left
+WORKER_TIMEOUT = float(os.getenv('SHARD_WORKER_TIMEOUT', '10'))
+
+# Seconds after a change of workers before markets move to their new owner
+HANDOFF = float(os.getenv('SHARD_HANDOFF', '5'))
+
+# Seconds between polls of positions and orders, and of balances
+POLL_INTERVAL = float(os.getenv('COORDINATOR_POLL', '2'))
+BALANCE_INTERVAL = 60
+
+# Seconds before a launched worker that exited is started again
+RESTART_DELAY = 10
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Coordinator:
+    """
+    Membership and shared account state of the shard workers, served to them
+    through a multiprocessing manager.
+
+    Every change of the workers bumps the version and sets a handoff time
+    HANDOFF seconds ahead; workers drop the markets they lose right away and
+    take the ones they gain after the handoff time.
+    """
+
+    def __init__(self, client=None, handoff=HANDOFF, timeout=WORKER_TIMEOUT):
+        """
+        Args:
+            client (PolymarketClient, optional): Client to poll positions, orders and balances with
+            handoff (float, optional): Seconds between a change of workers and markets moving
+            timeout (float, optional): Seconds without a heartbeat before a worker is dropped
+        """
+        self.client = client
+        self.handoff = handoff
+        self.timeout = timeout
+
+        self.started = time.time()
+        self.version = 0
+        self.effective_at = 0.0
+        self.workers = {}
+        self._lock = threading.Lock()
+
+        self._positions = None
+        self._orders = None
+        self._balances = None
+
+    def _changed(self, reason):
+        self.version += 1
+        self.effective_at = time.time() + self.handoff
+        print(f"Workers {', '.join(sorted(self.workers)) or 'none'} ({reason}), markets move in {self.handoff:g}s")
+
+    def _expire(self):
+        now = time.time()
+        for worker_id, worker in list(self.workers.items()):
+            if now - worker['seen'] > self.timeout:
+                del self.workers[worker_id]
+                self._changed(f"{worker_id} timed out")
+
+    # ------- Called by workers -------
+
+    def heartbeat(self, worker_id, info=None):
+        """
+        Register or refresh a worker.
+
+        Returns:
+            tuple: (version, worker ids, handoff time) of the current membership
+        """
+        with self._lock:
+            self._expire()
+            joined = worker_id not in self.workers
+            self.workers[worker_id] = {'seen': time.time(), 'info': info or {}}
+            if joined:
+                self._changed(f"{worker_id} joined")
+            # The start time tells versions of a restarted coordinator apart
+            return (self.started, self.version), sorted(self.workers), self.effective_at
+
+    def leave(self, worker_id):
+        with self._lock:
+            if self.workers.pop(worker_id, None) is not None:
+                self._changed(f"{worker_id} left")
+
+    def positions(self):
+        """All positions of the account from the data API, as a DataFrame, or None before the first poll."""
+        return self._positions
+
+    def orders(self):
+        """All open orders of the account, as a DataFrame, or None before the first poll."""
+        return self._orders
+
+    def balances(self):
+        """{'usdc', 'positions', 'time'}, or None before the first poll."""
+        return self._balances
+
+    def status(self):
+        """Workers with their market counts, the market assignment version and the workers' live positions."""
+        with self._lock:
+            self._expire()
+            now = time.time()
+            workers = {worker_id: {'age': now - worker['seen'], 'markets': worker['info'].get('markets'),
+                                   'pid': worker['info'].get('pid')}
+                       for worker_id, worker in self.workers.items()}
+            positions = {token: dict(position, worker=worker_id)
+                         for worker_id, worker in self.workers.items()
+                         for token, position in worker['info'].get('positions', {}).items()}
+            return {'version': self.version, 'handoff_in': max(self.effective_at - now, 0), 'workers': workers,
+                    'positions': positions, 'balances': self._balances}
+
+    # ------- Shared state polling -------
+
+    def start_polling(self):
+        if self.client is not None:
+            threading.Thread(target=self._poll, daemon=True).start()
+        return self
+
+    def _poll(self):
+        next_balance = 0
+        while True:
+            try:
+                self._positions = self.client.get_all_positions()
+                self._orders = self.client.get_all_orders()
+
+                if time.time() >= next_balance:
+                    self._balances = {'usdc': self.client.get_usdc_balance(),
+                                      'positions': self.client.get_pos_balance(), 'time': time.time()}
+                    next_balance = time.time() + BALANCE_INTERVAL
+            except Exception:
+                print("Error polling account state")
+                print(traceback.format_exc())
+            time.sleep(POLL_INTERVAL)
+
+
+def serve(address=ADDRESS, poll=True):
+    """Serve a Coordinator on address until the process exits."""
+    client = None
+    if poll:
+        # Connecting the client derives API credentials, so it is only created by the serving process
+        from poly_data.polymarket_client import PolymarketClient
+        client = PolymarketClient()
+
+    coordinator = Coordinator(client).start_polling()
+
+    class _Manager(BaseManager):
+        pass
+
+    _Manager.register('coordinator', callable=lambda: coordinator)
+    server = _Manager(address=parse_address(address), authkey=coordinator_authkey()).get_server()
+    print(f"Coordinator listening on {address}")
+    server.serve_forever()
+
+
+def _start_worker(n, address, log_dir):
+    env = {**os.environ, 'SHARD_ID': str(n), 'SHARD_COORDINATOR': address}
+    # Each worker serves its metrics on its own port
+    if os.getenv('METRICS_PORT'):
+        env['METRICS_PORT'] = str(int(os.getenv('METRICS_PORT')) + n)
+
+    log = open(os.path.join(log_dir, f"shard-{n}.log"), 'a')
+    return subprocess.Popen([sys.executable, os.path.join(REPO, 'main.py')], env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def launch(workers, address=ADDRESS, log_dir='.'):
+    """
+    Run the coordinator and `workers` shard workers in the current directory,
+    starting workers again when they exit, until interrupted.
+
+    The workers share the working directory, so the risk-off files in
+    positions/ move with their markets; each keeps its own ledger in state/.
+    """
+    threading.Thread(target=serve, args=(address,), daemon=True).start()
+    time.sleep(2)
+
+    processes = {n: _start_worker(n, address, log_dir) for n in range(workers)}
+    exited = {}
+    print(f"Started {workers} workers, logging to {os.path.abspath(log_dir)}/shard-<n>.log")
+
+    try:
+        while True:
+            time.sleep(1)
+            for n, process in processes.items():
+                if process.poll() is not None and n not in exited:
+                    print(f"Worker {n} exited with code {process.returncode}, restarting in {RESTART_DELAY}s")
+                    exited[n] = time.time() + RESTART_DELAY
+            for n, restart_at in list(exited.items()):
+                if time.time() >= restart_at:
+                    processes[n] = _start_worker(n, address, log_dir)
+                    del exited[n]
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in processes.values():
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def print_status(address=ADDRESS):
+    status = connect_coordinator(address).status()
+    print(f"Version {status['version']}, {len(status['workers'])} workers"
+          + (f", handoff in {status['handoff_in']:.1f}s" if status['handoff_in'] else ''))
+    for worker_id, worker in sorted(status['workers'].items()):
+        print(f"  {worker_id:>8}  pid {worker['pid']}  {worker['markets']} markets  last seen {worker['age']:.1f}s ago")
+
+    if status['balances']:
+        print(f"USDC {status['balances']['usdc']:.2f}, positions {status['balances']['positions']:.2f}")
+    open_positions = {token: p for token, p in status['positions'].items() if p['size']}
+    print(f"{len(open_positions)} open positions held by workers")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Coordinate bot processes that split the selected markets")
+    parser.add_argument('command', choices=['serve', 'launch', 'status'])
+    parser.add_argument('--address', default=ADDRESS, help="host:port the coordinator listens on")
+    parser.add_argument('--workers', type=int, default=2, help="Workers to launch")
+    parser.add_argument('--no-poll', action='store_true', help="Don't poll positions, orders and balances")
+    parser.add_argument('--log-dir', default='.', help="Where launched workers write their output")
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.address, poll=not args.no_poll)
+    elif args.command == 'launch':
+        launch(args.workers, args.address, args.log_dir)
+    else:
+        print_status(args.address)
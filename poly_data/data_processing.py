@@ -6,7 +6,11 @@ import poly_data.CONSTANTS as CONSTANTS
 from trading import perform_trade
 import time 
 import asyncio
-from poly_data.data_utils import set_position, set_order, update_positions
+from poly_data.data_utils import set_position, set_order
+from poly_data.reconciliation import request_reconcile
+
+# Number of matched trade IDs remembered until they are confirmed or fail
+MATCHED_TRADES_SIZE = 10000
 
 def process_book_data(asset, json_data):
     global_state.all_data[asset] = {
@@ -17,6 +21,61 @@ def process_book_data(asset, json_data):
     global_state.all_data[asset]['bids'].update({float(entry['price']): float(entry['size']) for entry in json_data['bids']})
     global_state.all_data[asset]['asks'].update({float(entry['price']): float(entry['size']) for entry in json_data['asks']})
 
+    if global_state.live_books is not None:
+        global_state.live_books.add(asset)
+
+def resync_books(markets):
+    """
+    Replace the books of several markets with fresh snapshots from the bulk books endpoint.
+
+    Markets that already received a live book from the websocket are left alone.
+    This makes blocking HTTP calls and should be run off the event loop.
+
+    Args:
+        markets (list): Condition IDs to resync
+
+    Returns:
+        list: Condition IDs whose books were replaced
+    """
+    tokens = {}
+    for market in markets:
+        row = global_state.markets.get(market)
+        if row is not None and (global_state.live_books is None or market not in global_state.live_books):
+            tokens[str(row['token1'])] = market
+
+    if len(tokens) == 0:
+        return []
+
+    books = global_state.client.get_order_books(list(tokens))
+
+    resynced = []
+    for token, book in books.items():
+        market = tokens[token]
+        if global_state.live_books is not None and market in global_state.live_books:
+            continue
+
+        global_state.all_data[market] = {
+            'bids': SortedDict(zip(book.bid_prices.tolist(), book.bid_sizes.tolist())),
+            'asks': SortedDict(zip(book.ask_prices.tolist(), book.ask_sizes.tolist()))
+        }
+
+        if global_state.live_books is not None:
+            global_state.live_books.add(market)
+        resynced.append(market)
+
+    print(f"Resynced {len(books)} books from the API")
+    return resynced
+
+def process_shared_book(market, bid_prices, bid_sizes, ask_prices, ask_sizes):
+    """Replace a market's book with levels read from the shared book."""
+    global_state.all_data[market] = {
+        'bids': SortedDict(zip(bid_prices.tolist(), bid_sizes.tolist())),
+        'asks': SortedDict(zip(ask_prices.tolist(), ask_sizes.tolist()))
+    }
+
+    if global_state.live_books is not None:
+        global_state.live_books.add(market)
+
 def process_price_change(asset, side, price_level, new_size):
     if side == 'bids':
         book = global_state.all_data[asset]['bids']
@@ -70,6 +129,9 @@ def add_to_performing(col, id):
     global_state.performing[col].add(id)
     global_state.performing_timestamps[col][id] = time.time()
 
+    if global_state.ledger is not None:
+        global_state.ledger.record_matched(col, id)
+
 def remove_from_performing(col, id):
     if col in global_state.performing:
         global_state.performing[col].discard(id)
@@ -77,6 +139,19 @@ def remove_from_performing(col, id):
     if col in global_state.performing_timestamps:
         global_state.performing_timestamps[col].pop(id, None)
 
+    if global_state.ledger is not None:
+        global_state.ledger.record_resolved(col, id)
+
+def remember_matched(id):
+    global_state.matched_trades[id] = True
+    global_state.matched_trades.move_to_end(id)
+    if len(global_state.matched_trades) > MATCHED_TRADES_SIZE:
+        global_state.matched_trades.popitem(last=False)
+
+def was_matched(col, id):
+    """Check whether a trade was seen matching, or restored in flight from the ledger."""
+    return id in global_state.matched_trades or id in global_state.performing.get(col, ())
+
 def process_user_data(rows):
     # Normalize to a list
     if isinstance(rows, dict):
@@ -92,6 +167,10 @@ def process_user_data(rows):
             col = token + "_" + side
 
             if row['event_type'] == 'trade':
+                if global_state.ledger is not None and global_state.ledger.seen_trade(row['id'], row['status']):
+                    print(f"Skipping duplicate trade update {row['id']} ({row['status']})")
+                    continue
+
                 size = 0
                 price = 0
                 maker_outcome = ""
@@ -122,11 +201,17 @@ def process_user_data(rows):
 
                 if row['status'] == 'CONFIRMED' or row['status'] == 'FAILED' :
                     if row['status'] == 'FAILED':
-                        print(f"Trade failed for {token}, decreasing")
-                        asyncio.create_task(asyncio.sleep(2))
-                        update_positions()
+                        print(f"Trade failed for {token}, reconciling")
+                        remove_from_performing(col, row['id'])
+                        global_state.matched_trades.pop(row['id'], None)
+                        request_reconcile(token, 'failed trade')
                     else:
+                        if not was_matched(col, row['id']):
+                            # We never saw this trade match, so our local position may be off
+                            request_reconcile(token, 'unexpected confirmation')
+
                         remove_from_performing(col, row['id'])
+                        global_state.matched_trades.pop(row['id'], None)
                         print("Confirmed. Performing is ", len(global_state.performing[col]))
                         print("Last trade update is ", global_state.last_trade_update)
                         print("Performing is ", global_state.performing)
@@ -136,6 +221,7 @@ def process_user_data(rows):
 
                 elif row['status'] == 'MATCHED':
                     add_to_performing(col, row['id'])
+                    remember_matched(row['id'])
 
                     print("Matched. Performing is ", len(global_state.performing[col]))
                     set_position(token, side, size, price)
@@ -145,7 +231,18 @@ def process_user_data(rows):
                     print("Performing timestamps is ", global_state.performing_timestamps)
                     asyncio.create_task(perform_trade(market))
                 elif row['status'] == 'MINED':
+                    if not was_matched(col, row['id']):
+                        # Reconcile a missed match once, here, rather than again on confirmation
+                        request_reconcile(token, 'unexpected mined trade')
+                    remember_matched(row['id'])
                     remove_from_performing(col, row['id'])
+                elif row['status'] == 'RETRYING':
+                    # The settlement transaction is being resubmitted; the trade is still in flight
+                    if was_matched(col, row['id']):
+                        add_to_performing(col, row['id'])
+                else:
+                    print(f"Unexpected trade status {row['status']} for {token}")
+                    request_reconcile(token, f"trade status {row['status']}")
 
             elif row['event_type'] == 'order':
                 print("ORDER EVENT FOR: ", row['market'], " STATUS: ",  row['status'], " TYPE: ", row['type'], " SIDE: ", side, "  ORIGINAL SIZE: ", row['original_size'], " SIZE MATCHED: ", row['size_matched'])
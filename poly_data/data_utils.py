@@ -1,10 +1,11 @@
 import poly_data.global_state as global_state
-from poly_data.utils import get_sheet_df
+from poly_data.utils import get_sheet_config
+from poly_data.reconciliation import request_reconcile, has_trades_in_flight
 import time
 import poly_data.global_state as global_state
 
 #sth here seems to be removing the position
-def update_positions(avgOnly=False):
+def update_positions(avgOnly=False, reconcile_missing=False):
     pos_df = global_state.client.get_all_positions()
 
     for idx, row in pos_df.iterrows():
@@ -15,6 +16,8 @@ def update_positions(avgOnly=False):
         else:
             position = {'size': 0, 'avgPrice': 0}
 
+        previous = position.copy()
+
         position['avgPrice'] = row['avgPrice']
 
         if not avgOnly:
@@ -43,6 +46,17 @@ def update_positions(avgOnly=False):
     
         global_state.positions[asset] = position
 
+        if global_state.ledger is not None and position != previous:
+            global_state.ledger.record_position(asset, 'api', position['size'] - previous['size'], 0, position)
+
+    if reconcile_missing:
+        # Positions restored from the ledger that the API no longer lists were likely closed
+        # while the bot was down, or aren't indexed yet; check their balances on-chain
+        listed = {str(asset) for asset in pos_df['asset']} if len(pos_df) > 0 else set()
+        for token, position in list(global_state.positions.items()):
+            if token not in listed and position['size'] != 0 and not has_trades_in_flight(token):
+                request_reconcile(token, 'not listed by the API after restore')
+
 def get_position(token):
     token = str(token)
     if token in global_state.positions:
@@ -86,6 +100,9 @@ def set_position(token, side, size, price, source='websocket'):
     else:
         global_state.positions[token] = {'size': size, 'avgPrice': price}
 
+    if global_state.ledger is not None:
+        global_state.ledger.record_position(token, source, size, price, global_state.positions[token])
+
     print(f"Updated position from {source}, set to ", global_state.positions[token])
 
 def update_orders():
@@ -145,26 +162,85 @@ def set_order(token, side, size, price):
 
     
 
+def apply_markets(df):
+    """
+    Index market rows by condition ID and register the tokens of new markets.
+
+    Args:
+        df (DataFrame): Merged market configuration
+
+    Returns:
+        tuple: (added, removed, changed) lists of condition IDs
+    """
+    previous = global_state.markets
+    markets = {}
+    for _, row in df.iterrows():
+        markets.setdefault(row['condition_id'], row)
+
+    added = [m for m in markets if m not in previous]
+    removed = [m for m in previous if m not in markets]
+    changed = [m for m in markets if m in previous and not markets[m].equals(previous[m])]
+
+    known_tokens = set(global_state.all_tokens)
+
+    for market in added:
+        row = markets[market]
+        token1, token2 = str(row['token1']), str(row['token2'])
+
+        if token1 not in known_tokens:
+            global_state.all_tokens.append(token1)
+            known_tokens.add(token1)
+
+        if token1 not in global_state.REVERSE_TOKENS:
+            global_state.REVERSE_TOKENS[token1] = token2
+
+        if token2 not in global_state.REVERSE_TOKENS:
+            global_state.REVERSE_TOKENS[token2] = token1
+
+        for col2 in [f"{token1}_buy", f"{token1}_sell", f"{token2}_buy", f"{token2}_sell"]:
+            if col2 not in global_state.performing:
+                global_state.performing[col2] = set()
+
+    global_state.markets = markets
+    return added, removed, changed
+
 def update_markets():
-    received_df, received_params = get_sheet_df()
+    """
+    Refresh the market configuration and apply only what changed.
+
+    In a shard worker only the markets the worker owns are applied, and a
+    change of those markets is applied even if the configuration is unchanged.
+
+    Returns:
+        list: Condition IDs of markets that were added or changed and should be requoted
+    """
+    received_df, received_params, changed = get_sheet_config()
+
+    shard = global_state.shard
+    if shard is not None and shard.changed.is_set():
+        shard.changed.clear()
+        changed = True
+
+    if not changed and global_state.df is not None:
+        return []
+
+    params_changed = received_params != global_state.params
 
     if len(received_df) > 0:
         global_state.df, global_state.params = received_df.copy(), received_params
-    
 
-    for _, row in global_state.df.iterrows():
-        for col in ['token1', 'token2']:
-            row[col] = str(row[col])
+    added, removed, changed_markets = apply_markets(global_state.df if shard is None else shard.select(global_state.df))
 
-        if row['token1'] not in global_state.all_tokens:
-            global_state.all_tokens.append(row['token1'])
+    if added or removed or changed_markets or params_changed:
+        print(f"Market config updated: {len(added)} added, {len(removed)} removed, {len(changed_markets)} changed"
+              f"{', hyperparameters changed' if params_changed else ''}")
 
-        if row['token1'] not in global_state.REVERSE_TOKENS:
-            global_state.REVERSE_TOKENS[row['token1']] = row['token2']
+    # Subscribe the market websocket to the shard's new set of markets
+    if shard is not None and (added or removed):
+        shard.resubscribe()
 
-        if row['token2'] not in global_state.REVERSE_TOKENS:
-            global_state.REVERSE_TOKENS[row['token2']] = row['token1']
+    # A hyperparameter change affects every market
+    if params_changed:
+        return list(global_state.markets.keys())
 
-        for col2 in [f"{row['token1']}_buy", f"{row['token1']}_sell", f"{row['token2']}_buy", f"{row['token2']}_sell"]:
-            if col2 not in global_state.performing:
-                global_state.performing[col2] = set()
\ No newline at end of file
+    return added + changed_markets
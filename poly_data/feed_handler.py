@@ -0,0 +1,155 @@
+"""
+Feed handler: one process that owns the market websocket for every selected
+market and keeps their books in a shared memory segment (see
+poly_data.shared_book). Bot processes started with SHARED_BOOK set to the
+segment's name read their books from it instead of opening their own market
+websockets, so the network and parsing work is done once, on its own core.
+
+Usage:
+    python -m poly_data.feed_handler [--name NAME] [--capacity N]
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import traceback
+
+import websockets
+
+from poly_data.utils import get_sheet_config
+from poly_data.shared_book import SharedBook, SHARED_BOOK, DEFAULT_NAME, CAPACITY
+from poly_data.feed_recorder import MARKET, RECORD_DIR, start_recorder
+from poly_utils.endpoints import WS_HOST
+
+# Seconds between checks of the selected markets
+CONFIG_INTERVAL = 30
+
+# Seconds between liveness signals to readers
+HEARTBEAT_INTERVAL = 1
+
+
+class FeedHandler:
+    """
+    Writes the market websocket into a SharedBook.
+
+    The token1 book of every selected market gets a slot, as the bot only
+    subscribes to token1. Book snapshots replace a slot's levels and price
+    changes update single levels, each under the slot's seqlock. The
+    selected markets are checked every CONFIG_INTERVAL seconds, and the
+    websocket reconnects to subscribe when they change.
+    """
+
+    def __init__(self, book):
+        """
+        Args:
+            book (SharedBook): A writable segment
+        """
+        self.book = book
+        self.tokens = []
+        self.websocket = None
+        # Apart from the bots' captures, which hold their user frames
+        self.recorder = start_recorder(os.path.join(RECORD_DIR, 'feed_handler'))
+        self.messages = 0
+
+    def refresh_markets(self):
+        """Give every selected market's token1 a slot. Returns whether the tokens changed."""
+        df, _, _ = get_sheet_config()
+        tokens = []
+        for _, row in df.iterrows():
+            token = str(row['token1'])
+            if self.book.add(token, row['condition_id']) is None:
+                print(f"Shared book {self.book.name} is full, not following {row['condition_id']}")
+                continue
+            tokens.append(token)
+
+        changed = set(tokens) != set(self.tokens)
+        self.tokens = tokens
+        return changed
+
+    def handle(self, json_data, received_ns):
+        """Apply one websocket frame to the books."""
+        if isinstance(json_data, dict):
+            json_data = [json_data]
+
+        for event in json_data:
+            slot = self.book.market_slot(event.get('market'))
+            if slot is None:
+                continue
+
+            if event['event_type'] == 'book':
+                self.book.write_book(slot, [(entry['price'], entry['size']) for entry in event['bids']],
+                                     [(entry['price'], entry['size']) for entry in event['asks']], received_ns)
+
+            elif event['event_type'] == 'price_change':
+                self.book.write_changes(slot, [('bids' if change['side'] == 'BUY' else 'asks', change['price'], change['size'])
+                                               for change in event['price_changes']], received_ns)
+
+    async def connect(self):
+        async with websockets.connect(f"{WS_HOST}/ws/market", ping_interval=5, ping_timeout=None) as websocket:
+            self.websocket = websocket
+            await websocket.send(json.dumps({"assets_ids": self.tokens}))
+            print(f"Subscribed to {len(self.tokens)} tokens")
+
+            try:
+                while True:
+                    message = await websocket.recv()
+                    received_ns = time.time_ns()
+                    json_data = json.loads(message)
+                    if self.recorder is not None:
+                        self.recorder.record(MARKET, json_data, received_ns)
+                    self.handle(json_data, received_ns)
+                    self.messages += 1
+            except websockets.ConnectionClosed:
+                print("Connection closed in market websocket")
+            finally:
+                self.websocket = None
+
+    async def _refresh(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(CONFIG_INTERVAL)
+            try:
+                if await loop.run_in_executor(None, self.refresh_markets) and self.websocket is not None:
+                    await self.websocket.close()
+            except Exception:
+                print("Error refreshing markets")
+                print(traceback.format_exc())
+
+    async def _heartbeat(self):
+        last, count = time.time(), 0
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            self.book.heartbeat()
+            if time.time() - last >= 60:
+                print(f"{(self.messages - count) / (time.time() - last):.0f} messages/s into {self.book.count} books")
+                last, count = time.time(), self.messages
+
+    async def run(self):
+        self.refresh_markets()
+        asyncio.ensure_future(self._refresh())
+        asyncio.ensure_future(self._heartbeat())
+
+        while True:
+            try:
+                await self.connect()
+            except Exception:
+                print("Error in market websocket")
+                print(traceback.format_exc())
+            await asyncio.sleep(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Keep the selected markets' books in shared memory")
+    parser.add_argument('--name', default=SHARED_BOOK or DEFAULT_NAME, help="Shared memory segment name")
+    parser.add_argument('--capacity', type=int, default=CAPACITY, help="Books the segment holds")
+    args = parser.parse_args()
+
+    book = SharedBook.create(args.name, args.capacity)
+    print(f"Writing books to shared memory {args.name} ({book.shm.size / 2**20:.0f} MB for {args.capacity} books)")
+    try:
+        asyncio.run(FeedHandler(book).run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        book.close()
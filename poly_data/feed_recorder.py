@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import zlib
+import queue
+import heapq
+import atexit
+import struct
+import threading
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Set RECORD_FEED=1 to record every websocket frame to RECORD_DIR
+RECORD_DIR = os.getenv('RECORD_DIR', 'recordings')
+
+# Channels frames are recorded from
+MARKET = 0
+USER = 1
+
+# A market's buffered records are compressed into a block once they reach this many
+# bytes, or after FLUSH_INTERVAL seconds
+BLOCK_BYTES = 64 * 1024
+FLUSH_INTERVAL = 5
+
+# One record inside a block: receive time (ns), channel, payload length, then the JSON payload
+RECORD = struct.Struct('<qBI')
+
+# One index entry per block: key, first and last receive time (ns), offset and length in the data file, records
+INDEX_ENTRY = struct.Struct('<96sqqQII')
+INDEX_DTYPE = np.dtype([('key', 'S96'), ('t0', '<i8'), ('t1', '<i8'), ('offset', '<u8'), ('length', '<u4'), ('count', '<u4')])
+
+
+def hour_path(ts_ns, directory=RECORD_DIR):
+    """Path prefix of the capture files for the hour a receive time falls in."""
+    return os.path.join(directory, time.strftime('%Y%m%d-%H', time.gmtime(ts_ns // 10**9)))
+
+
+def _event_key(event):
+    # The market (condition id) the event belongs to, which book, price_change and user
+    # events all carry; a book's token only as a fallback, and events with neither under ''
+    if isinstance(event, dict):
+        return str(event.get('market') or event.get('asset_id') or '')
+    return ''
+
+
+class FeedRecorder:
+    """
+    Records websocket frames to hourly append-only capture files.
+
+    The event loop only puts (channel, receive time, parsed frame) on a queue.
+    A background thread serializes each event, buffers it per market and writes
+    zlib-compressed blocks to '<hour>.feed', adding one entry per block to
+    '<hour>.idx'. The index is written after its block, so it never points at
+    partial data, and one market-hour can be read without scanning the rest.
+    """
+
+    def __init__(self, directory=RECORD_DIR):
+        self.directory = directory
+        self.queue = queue.SimpleQueue()
+        self.buffers = {}
+        self.prefix = None
+        self.data_file = None
+        self.index_file = None
+        self.records = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.thread.start()
+        atexit.register(self.stop)
+        print(f"Recording websocket frames to {self.directory}")
+        return self
+
+    def record(self, channel, event, received_ns=None):
+        """Queue a parsed frame for recording. Safe to call from the event loop; never blocks."""
+        self.queue.put((channel, received_ns or time.time_ns(), event))
+
+    def stop(self):
+        self.queue.put(None)
+        if self.thread.is_alive():
+            self.thread.join(timeout=10)
+
+    def _open(self, prefix):
+        self._flush_all()
+        if self.data_file is not None:
+            self.data_file.close()
+            self.index_file.close()
+
+        self.prefix = prefix
+        self.data_file = open(prefix + '.feed', 'ab')
+        self.index_file = open(prefix + '.idx', 'ab')
+
+    def _flush(self, key):
+        buffer = self.buffers.pop(key, None)
+        if not buffer or not buffer['parts']:
+            return
+
+        block = zlib.compress(b''.join(buffer['parts']), 6)
+        offset = self.data_file.seek(0, os.SEEK_END)
+        self.data_file.write(block)
+        self.data_file.flush()
+
+        self.index_file.write(INDEX_ENTRY.pack(key.encode()[:96], buffer['t0'], buffer['t1'], offset, len(block), len(buffer['parts'])))
+        self.index_file.flush()
+
+    def _flush_all(self, older_than=None):
+        for key in list(self.buffers):
+            if older_than is None or self.buffers[key]['started'] < older_than:
+                self._flush(key)
+
+    def _add(self, channel, received_ns, event):
+        prefix = hour_path(received_ns, self.directory)
+        if prefix != self.prefix:
+            self._open(prefix)
+
+        payload = json.dumps(event, separators=(',', ':')).encode()
+        key = _event_key(event)
+
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = self.buffers[key] = {'parts': [], 'size': 0, 't0': received_ns, 't1': received_ns,
+                                          'started': time.monotonic()}
+
+        buffer['parts'].append(RECORD.pack(received_ns, channel, len(payload)) + payload)
+        buffer['size'] += RECORD.size + len(payload)
+        buffer['t1'] = received_ns
+        self.records += 1
+
+        if buffer['size'] >= BLOCK_BYTES:
+            self._flush(key)
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                item = False
+
+            if item is None:
+                break
+
+            if item:
+                channel, received_ns, frame = item
+                try:
+                    # Lists are split so every event is indexed under its own market
+                    for event in (frame if isinstance(frame, list) else [frame]):
+                        self._add(channel, received_ns, event)
+                except Exception as ex:
+                    print(f"Error recording frame: {ex}")
+
+            if self.prefix is not None:
+                self._flush_all(older_than=time.monotonic() - FLUSH_INTERVAL)
+
+        if self.prefix is not None:
+            self._flush_all()
+            self.data_file.close()
+            self.index_file.close()
+
+
+def start_recorder(directory=RECORD_DIR):
+    """
+    Start a FeedRecorder if RECORD_FEED is set, returning it, or None.
+
+    Every process needs a directory of its own: block offsets are taken from
+    the end of the data file, so two processes appending to the same hour
+    would interleave their blocks and corrupt each other's index.
+    """
+    if os.getenv('RECORD_FEED', '0').lower() in ('1', 'true', 'yes'):
+        return FeedRecorder(directory).start()
+    return None
+
+
+def read_index(prefix):
+    """Read the block index of one capture hour as a structured array."""
+    with open(prefix + '.idx', 'rb') as f:
+        data = f.read()
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    return np.frombuffer(data[:usable], dtype=INDEX_DTYPE)
+
+
+def _block_records(f, entry):
+    f.seek(int(entry['offset']))
+    raw = zlib.decompress(f.read(int(entry['length'])))
+
+    pos = 0
+    while pos < len(raw):
+        received_ns, channel, length = RECORD.unpack_from(raw, pos)
+        pos += RECORD.size
+        yield received_ns, channel, raw[pos:pos + length]
+        pos += length
+
+
+def read_market(prefix, market, start_ns=None, end_ns=None):
+    """
+    Read the recorded events of one market from one capture hour: its book
+    snapshots and price changes and, if user frames were recorded, its trades
+    and orders.
+
+    Only the blocks of that market overlapping [start_ns, end_ns) are read.
+
+    Args:
+        prefix (str): Capture hour, as returned by hour_path
+        market (str): Condition ID of the market
+
+    Yields:
+        tuple: (receive time in ns, channel, event dict)
+    """
+    index = read_index(prefix)
+    entries = index[index['key'] == market.encode()]
+    if start_ns is not None:
+        entries = entries[entries['t1'] >= start_ns]
+    if end_ns is not None:
+        entries = entries[entries['t0'] < end_ns]
+
+    with open(prefix + '.feed', 'rb') as f:
+        for entry in entries:
+            for received_ns, channel, payload in _block_records(f, entry):
+                if (start_ns is None or received_ns >= start_ns) and (end_ns is None or received_ns < end_ns):
+                    yield received_ns, channel, json.loads(payload)
+
+
+def read_all(prefix, channels=(MARKET, USER)):
+    """
+    Read every recorded event of one capture hour, in receive order.
+
+    Yields:
+        tuple: (receive time in ns, channel, event dict)
+    """
+    index = read_index(prefix)
+    with open(prefix + '.feed', 'rb') as f:
+        blocks = [list(_block_records(f, entry)) for entry in index]
+
+    for received_ns, channel, payload in heapq.merge(*blocks, key=lambda r: r[0]):
+        if channel in channels:
+            yield received_ns, channel, json.loads(payload)
@@ -1,5 +1,6 @@
 import threading
 import pandas as pd
+from collections import OrderedDict
 
 # ============ Market Data ============
 
@@ -15,6 +16,9 @@ all_data = {}
 # Market configuration data from Google Sheets
 df = None  
 
+# Rows of df indexed by condition ID
+markets = {}
+
 # ============ Client & Parameters ============
 
 # Polymarket client instance
@@ -36,6 +40,9 @@ performing = {}
 # Used to clear stale trades
 performing_timestamps = {}
 
+# Recent trade IDs seen matching, kept after they are mined so their confirmation is expected
+matched_trades = OrderedDict()
+
 # Timestamps for when positions were last updated
 last_trade_update = {}
 
@@ -47,3 +54,27 @@ orders = {}
 # Format: {token_id: {'size': float, 'avgPrice': float}}
 positions = {}
 
+# Warm-start state that hasn't been refreshed from its source yet ('config', 'positions', 'orders')
+unvalidated = set()
+
+# Markets that received a live book since a warm start; None when started cold
+live_books = None
+
+# Append-only position ledger used to restore state on restart (PositionLedger)
+ledger = None
+
+
+# Live realized volatility per market, sampled from the token1 book (RollingVolatility)
+realized_vol = {}
+
+# Writes raw websocket frames to disk when RECORD_FEED is set (FeedRecorder)
+recorder = None
+
+# Event loop lag and blocking call sites, unless LOOP_MONITOR is off (LoopMonitor)
+loop_monitor = None
+
+# This process's share of the markets when SHARD_COORDINATOR is set (ShardWorker)
+shard = None
+
+# The open market websocket, closed to resubscribe
+market_websocket = None
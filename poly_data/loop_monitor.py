@@ -0,0 +1,234 @@
+import os
+import sys
+import time
+import bisect
+import asyncio
+import threading
+import traceback
+from collections import defaultdict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# On by default: the heartbeat and the watchdog each wake a few dozen times a second
+LOOP_MONITOR = os.getenv('LOOP_MONITOR', '1').lower() in ('1', 'true', 'yes')
+
+# A callback that keeps the loop from running for longer than this many seconds is a stall
+LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD', '0.1'))
+
+# Seconds between ranked reports
+REPORT_INTERVAL = float(os.getenv('LOOP_REPORT_INTERVAL', '600'))
+
+# Seconds between heartbeats; lag below this is not seen
+HEARTBEAT = 0.05
+
+# Upper bounds of the lag histogram buckets, in seconds
+LAG_BUCKETS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10]
+
+# Innermost frames kept with a stall
+STACK_DEPTH = 25
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Functions whose 'asset' argument is a market's condition id rather than a token
+MARKET_ASSET_FUNCTIONS = {'process_data', 'process_book_data', 'process_price_change'}
+
+
+def _in_repo(filename):
+    return filename.startswith(REPO_ROOT) and 'site-packages' not in filename
+
+
+def frame_market(frame):
+    """
+    The market a stack is working on: the 'market' variable of the innermost
+    frame of the bot's own code that has one, or the 'asset' of the websocket
+    book handlers.
+
+    Returns:
+        str: The market's condition id, or None
+    """
+    while frame is not None:
+        code = frame.f_code
+        if _in_repo(code.co_filename):
+            name = 'market' if 'market' in code.co_varnames else 'asset' if code.co_name in MARKET_ASSET_FUNCTIONS else None
+            if name is not None:
+                value = frame.f_locals.get(name)
+                if isinstance(value, str):
+                    return value
+        frame = frame.f_back
+    return None
+
+
+def _site(frame):
+    filename = os.path.relpath(frame.filename, REPO_ROOT) if _in_repo(frame.filename) else os.path.basename(frame.filename)
+    return f"{filename}:{frame.lineno} {frame.name}"
+
+
+class LoopMonitor:
+    """
+    Measures event loop lag and finds the calls that block the loop.
+
+    A heartbeat coroutine sleeps HEARTBEAT seconds at a time and records how
+    late it wakes up in a histogram. A watchdog thread checks that the
+    heartbeat keeps coming; once it is LAG_THRESHOLD late, it captures the
+    stack of the loop thread, which at that moment is the callback holding the
+    loop. When the heartbeat resumes, the stall's full length is charged to
+    that call site (the innermost frame of the bot's own code, and the frame
+    actually running) and to the market being handled (see frame_market).
+
+    A call that blocks in C code without releasing the GIL also stops the
+    watchdog, which then sees the stack as it is right after that call.
+    """
+
+    def __init__(self, threshold=LAG_THRESHOLD, report_interval=REPORT_INTERVAL):
+        """
+        Args:
+            threshold (float, optional): Seconds of lag that count as a stall
+            report_interval (float, optional): Seconds between ranked reports, 0 for none
+        """
+        self.threshold = threshold
+        self.report_interval = report_interval
+
+        self.loop = None
+        self.thread_id = None
+        self.started = None
+
+        # Written by the heartbeat, read by the watchdog
+        self.beat = 0
+        self.beat_time = None
+
+        # Written by the watchdog, read by the heartbeat: (beat, site, market, stack)
+        self.pending = None
+
+        self.histogram = [0] * (len(LAG_BUCKETS) + 1)
+        self.beats = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.sites = defaultdict(lambda: {'count': 0, 'total': 0.0, 'max': 0.0, 'stack': None,
+                                          'markets': defaultdict(float)})
+        self.markets = defaultdict(lambda: {'count': 0, 'total': 0.0})
+
+    def start(self):
+        """Start the heartbeat on the running loop and the watchdog thread."""
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+        self.started = time.time()
+        self.beat_time = time.monotonic()
+
+        self.heartbeat_task = asyncio.ensure_future(self._heartbeat())
+        threading.Thread(target=self._watchdog, daemon=True).start()
+        print(f"Loop monitor reporting stalls over {1000 * self.threshold:.0f}ms")
+        return self
+
+    # ------- Heartbeat, on the loop -------
+
+    async def _heartbeat(self):
+        next_report = time.monotonic() + self.report_interval
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(HEARTBEAT)
+            now = time.monotonic()
+            lag = max(now - start - HEARTBEAT, 0.0)
+
+            self.beat += 1
+            self.beat_time = now
+            self._record(lag)
+
+            if self.report_interval and now >= next_report:
+                print(self.report())
+                next_report = now + self.report_interval
+
+    def _record(self, lag):
+        self.beats += 1
+        self.total_lag += lag
+        self.histogram[bisect.bisect_left(LAG_BUCKETS, lag)] += 1
+        self.max_lag = max(self.max_lag, lag)
+
+        if lag < self.threshold:
+            return
+
+        self.stalls += 1
+        pending, self.pending = self.pending, None
+        # Only a capture taken during this stall describes it
+        if pending is None or pending[0] != self.beat - 1:
+            site, market, stack = 'unknown (not captured)', None, None
+        else:
+            _, site, market, stack = pending
+
+        entry = self.sites[site]
+        entry['count'] += 1
+        entry['total'] += lag
+        if lag > entry['max']:
+            entry['max'], entry['stack'] = lag, stack
+        if market is not None:
+            entry['markets'][market] += lag
+            self.markets[market]['count'] += 1
+            self.markets[market]['total'] += lag
+
+        print(f"Event loop blocked for {1000 * lag:.0f}ms at {site}" + (f" on {market}" if market else ''))
+
+    # ------- Watchdog, on its own thread -------
+
+    def _watchdog(self):
+        captured = None
+        while True:
+            time.sleep(self.threshold / 2)
+            beat, beat_time = self.beat, self.beat_time
+
+            # The heartbeat is due HEARTBEAT after the last beat; anything later is lag
+            if time.monotonic() - beat_time - HEARTBEAT >= self.threshold and captured != beat:
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    self.pending = (beat,) + self._attribute(frame)
+                captured = beat
+
+    def _attribute(self, frame):
+        # The call site is the innermost frame of the bot's own code, plus the frame that is running
+        stack = traceback.extract_stack(frame, limit=STACK_DEPTH)
+        leaf = stack[-1]
+        own = next((f for f in reversed(stack) if _in_repo(f.filename)), None)
+        site = _site(leaf) if own is None or own is leaf else f"{_site(own)} -> {_site(leaf)}"
+
+        return site, frame_market(frame), ''.join(stack.format())
+
+    # ------- Reporting -------
+
+    def percentile(self, q):
+        """Upper bound of the histogram bucket the q-th percentile of lag falls in."""
+        target, seen = q / 100 * self.beats, 0
+        for n, count in enumerate(self.histogram):
+            seen += count
+            if seen >= target and count:
+                return LAG_BUCKETS[n] if n < len(LAG_BUCKETS) else float('inf')
+        return 0.0
+
+    def report(self, top=10):
+        """Lag distribution, and the call sites and markets that stalled the loop, longest total first."""
+        elapsed = time.time() - self.started
+        lines = [f"Event loop lag over {elapsed:.0f}s: {self.beats} beats, p50 <= {1000 * self.percentile(50):g}ms, "
+                 f"p99 <= {1000 * self.percentile(99):g}ms, max {1000 * self.max_lag:.0f}ms, "
+                 f"{self.stalls} stalls over {1000 * self.threshold:.0f}ms"]
+
+        bounds = [f"<={1000 * b:g}ms" for b in LAG_BUCKETS] + [f">{1000 * LAG_BUCKETS[-1]:g}ms"]
+        lines.append("  " + "  ".join(f"{b} {c}" for b, c in zip(bounds, self.histogram) if c))
+
+        for site, entry in sorted(self.sites.items(), key=lambda item: -item[1]['total'])[:top]:
+            markets = sorted(entry['markets'].items(), key=lambda item: -item[1])[:3]
+            lines.append(f"  {entry['total']:8.2f}s  {entry['count']:5} stalls  max {1000 * entry['max']:6.0f}ms  {site}"
+                         + (f"  [{', '.join(f'{m[:12]} {t:.2f}s' for m, t in markets)}]" if markets else ''))
+
+        if self.markets:
+            lines.append("  By market: " + ", ".join(
+                f"{market[:12]} {entry['total']:.2f}s/{entry['count']}"
+                for market, entry in sorted(self.markets.items(), key=lambda item: -item[1]['total'])[:top]))
+
+        return '\n'.join(lines)
+
+
+def start_loop_monitor():
+    """Start a LoopMonitor on the running loop unless LOOP_MONITOR is off, returning it, or None."""
+    if LOOP_MONITOR:
+        return LoopMonitor().start()
+    return None
@@ -0,0 +1,286 @@
+import os
+import time
+import array
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+import poly_data.global_state as global_state
+from poly_data.reconciliation import pending_count
+from poly_data.loop_monitor import LAG_BUCKETS
+
+load_dotenv()
+
+# Serve the metrics on http://METRICS_HOST:METRICS_PORT/metrics when METRICS_PORT is set
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = os.getenv('METRICS_PORT', '')
+
+# Label value identifying this process's share of the feed
+SHARD = os.getenv('SHARD_ID', '0')
+
+# Label combinations preallocated per metric; further combinations share one '_overflow' series.
+# Metrics labelled by market need one per market the bot trades
+CAPACITY = 1024
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """
+    Array-backed storage shared by counters and histograms.
+
+    Every label combination gets a fixed slot of `width` doubles the first time
+    it is seen. Each thread that records writes to its own preallocated array,
+    so recording is a dict lookup and an in-place add with no lock, and the
+    arrays are only summed when the metrics are scraped.
+    """
+    kind = None
+
+    def __init__(self, name, help, labels=(), width=1, capacity=CAPACITY):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.width = width
+        self.capacity = capacity
+
+        self._slots = {}
+        self._labels = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._arrays = []
+
+        REGISTRY.append(self)
+
+    def _slot(self, labels):
+        with self._lock:
+            slot = self._slots.get(labels)
+            if slot is None:
+                if len(self._labels) < self.capacity - 1:
+                    slot = len(self._labels)
+                    self._labels.append(labels)
+                else:
+                    # The last slot collects every combination past capacity
+                    slot = self.capacity - 1
+                    if len(self._labels) < self.capacity:
+                        self._labels.append(('_overflow',) * len(self.label_names))
+                        print(f"Metric {self.name} is past its {self.capacity} series, "
+                              f"further label combinations are counted under _overflow")
+                self._slots[labels] = slot
+            return slot
+
+    def _values(self):
+        values = array.array('d', bytes(8 * self.width * self.capacity))
+        self._local.values = values
+        with self._lock:
+            self._arrays.append(values)
+        return values
+
+    def _totals(self):
+        # Sum the per-thread arrays, one list of `width` values per used slot
+        with self._lock:
+            arrays, labels = list(self._arrays), list(self._labels)
+        totals = []
+        for slot in range(len(labels)):
+            start = slot * self.width
+            totals.append([sum(values[start + i] for values in arrays) for i in range(self.width)])
+        return labels, totals
+
+    def render(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A monotonically increasing count per label combination."""
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=(), capacity=CAPACITY):
+        super().__init__(name, help, labels, 1, capacity)
+
+    def inc(self, *labels, n=1):
+        """Add n to the series of the given label values, in the order of the metric's label names."""
+        slot = self._slots.get(labels)
+        if slot is None:
+            slot = self._slot(labels)
+        try:
+            values = self._local.values
+        except AttributeError:
+            values = self._values()
+        values[slot] += n
+
+    def render(self):
+        labels, totals = self._totals()
+        return [f"{self.name}{_format_labels(self.label_names, values)} {total[0]:g}"
+                for values, total in zip(labels, totals)]
+
+
+class Histogram(_Metric):
+    """A distribution of observed values per label combination, over fixed buckets."""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, capacity=CAPACITY):
+        self.buckets = list(buckets)
+        # One count per bucket, one for +Inf, then the sum of observed values
+        super().__init__(name, help, labels, len(self.buckets) + 2, capacity)
+
+    def observe(self, value, *labels):
+        """Record a value in the series of the given label values."""
+        slot = self._slots.get(labels)
+        if slot is None:
+            slot = self._slot(labels)
+        try:
+            values = self._local.values
+        except AttributeError:
+            values = self._values()
+        start = slot * self.width
+        values[start + bisect.bisect_left(self.buckets, value)] += 1
+        values[start + self.width - 1] += value
+
+    @contextmanager
+    def timer(self, *labels):
+        """Observe the seconds spent in the with block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self):
+        labels, totals = self._totals()
+        return [line for values, total in zip(labels, totals)
+                for line in _histogram_lines(self.name, self.label_names, values, self.buckets, total[:-1], total[-1])]
+
+
+def _histogram_lines(name, label_names, values, buckets, counts, total):
+    lines, cumulative = [], 0
+    for bound, count in zip(buckets + ['+Inf'], counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_format_labels(label_names, values, [('le', bound)])} {cumulative:g}")
+    lines.append(f"{name}_sum{_format_labels(label_names, values)} {total:g}")
+    lines.append(f"{name}_count{_format_labels(label_names, values)} {cumulative:g}")
+    return lines
+
+
+class Gauge:
+    """A value read when the metrics are scraped, from a function returning a number."""
+    kind = 'gauge'
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+        REGISTRY.append(self)
+
+    def render(self):
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [] if value is None else [f"{self.name} {value:g}"]
+
+
+class LoopLag:
+    """The loop monitor's lag histogram, as it stands at scrape time."""
+    kind = 'histogram'
+    name = 'poly_loop_lag_seconds'
+    help = 'How late the event loop heartbeat woke up'
+
+    def __init__(self):
+        REGISTRY.append(self)
+
+    def render(self):
+        monitor = global_state.loop_monitor
+        if monitor is None:
+            return []
+
+        return _histogram_lines(self.name, (), (), LAG_BUCKETS, list(monitor.histogram), monitor.total_lag)
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        samples = metric.render()
+        if samples:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+
+# ------- The bot's metrics -------
+
+MESSAGES = Counter('poly_ws_messages_total', 'Websocket events received', ('channel', 'event_type', 'shard'))
+BOOK_UPDATE = Histogram('poly_book_update_seconds', 'Time from receiving a market frame to the book being updated',
+                        ('shard',))
+
+# Outcomes and skip reasons are counted across markets, so their series don't multiply with the
+# market count; the duration and lock waits stay per market, one series each
+TRADE_RUNS = Counter('poly_perform_trade_total', 'perform_trade evaluations by outcome', ('outcome',))
+TRADE_SECONDS = Histogram('poly_perform_trade_seconds', 'perform_trade duration, without the cooldown', ('market',))
+TRADE_WAITS = Counter('poly_perform_trade_waits_total', 'Evaluations that waited for the market lock', ('market',))
+TRADE_SKIPS = Counter('poly_perform_trade_skips_total', 'Buy orders not sent, by reason', ('reason',))
+
+ORDERS = Counter('poly_orders_total', 'Order requests by action and result', ('action', 'result'))
+MERGE_SECONDS = Histogram('poly_merge_seconds', 'Position merge duration', ('result',))
+POLL_SECONDS = Histogram('poly_poll_seconds', 'Duration of the periodic REST refreshes', ('poll',))
+
+Gauge('poly_reconcile_queue', 'Tokens waiting to be reconciled', pending_count)
+Gauge('poly_recorder_queue', 'Frames waiting to be written by the feed recorder',
+      lambda: global_state.recorder.queue.qsize() if global_state.recorder is not None else None)
+Gauge('poly_performing_trades', 'Matched trades waiting for confirmation',
+      lambda: sum(len(entries) for entries in list(global_state.performing.values())))
+Gauge('poly_books', 'Order books held in memory', lambda: len(global_state.all_data))
+LoopLag()
+
+
+def count_events(channel, json_data):
+    """Count the events of one websocket frame by type."""
+    if isinstance(json_data, dict):
+        MESSAGES.inc(channel, json_data.get('event_type', ''), SHARD)
+    else:
+        for event in json_data:
+            MESSAGES.inc(channel, event.get('event_type', ''), SHARD)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        data = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server():
+    """Serve /metrics on METRICS_HOST:METRICS_PORT if METRICS_PORT is set, returning the server, or None."""
+    if not METRICS_PORT:
+        return None
+
+    server = ThreadingHTTPServer((METRICS_HOST, int(METRICS_PORT)), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return server
@@ -15,11 +15,15 @@ import requests                     # HTTP requests
 import pandas as pd                 # Data analysis
 import json                         # JSON processing
 import subprocess                   # For calling external processes
+import time                         # Merge timing
 
 from py_clob_client.clob_types import OpenOrderParams
 
 # Smart contract ABIs
 from poly_data.abis import NegRiskAdapterABI, ConditionalTokenABI, erc20_abi
+from poly_utils.books import fetch_books
+from poly_utils.endpoints import CLOB_HOST, DATA_API_HOST, POLYGON_RPC
+from poly_data.metrics import ORDERS, MERGE_SECONDS
 
 # Load environment variables
 load_dotenv()
@@ -45,7 +49,7 @@ class PolymarketClient:
         Args:
             pk (str, optional): Private key identifier, defaults to 'default'
         """
-        host="https://clob.polymarket.com"
+        host=CLOB_HOST
 
         # Get credentials from environment variables
         key=os.getenv("PK")
@@ -71,7 +75,7 @@ class PolymarketClient:
         self.client.set_api_creds(creds=self.creds)
         
         # Initialize Web3 connection to Polygon
-        web3 = Web3(Web3.HTTPProvider("https://polygon-rpc.com"))
+        web3 = Web3(Web3.HTTPProvider(POLYGON_RPC))
         web3.middleware_onion.inject(geth_poa_middleware, layer=0)
         
         # Set up USDC contract for balance checks
@@ -134,9 +138,11 @@ class PolymarketClient:
         try:
             # Submit the signed order to the API
             resp = self.client.post_order(signed_order)
+            ORDERS.inc('post', 'ok' if resp and resp.get('success', True) else 'rejected')
             return resp
         except Exception as ex:
             print(ex)
+            ORDERS.inc('post', 'rejected')
             return {}
 
     def get_order_book(self, market):
@@ -153,6 +159,19 @@ class PolymarketClient:
         return pd.DataFrame(orderBook.bids).astype(float), pd.DataFrame(orderBook.asks).astype(float)
 
 
+    def get_order_books(self, markets):
+        """
+        Get the order books of many markets using the bulk books endpoint.
+        
+        Args:
+            markets (list): Market token IDs to query
+            
+        Returns:
+            dict: {token_id: CompactBook} with bid and ask price/size arrays
+        """
+        return fetch_books(markets, host=self.client.host)
+
+
     def get_usdc_balance(self):
         """
         Get the USDC balance of the connected wallet.
@@ -169,7 +188,7 @@ class PolymarketClient:
         Returns:
             float: Total position value in USDC
         """
-        res = requests.get(f'https://data-api.polymarket.com/value?user={self.browser_wallet}')
+        res = requests.get(f'{DATA_API_HOST}/value?user={self.browser_wallet}')
         return float(res.json()['value'])
 
     def get_total_balance(self):
@@ -188,7 +207,7 @@ class PolymarketClient:
         Returns:
             DataFrame: All positions with details like market, size, avgPrice
         """
-        res = requests.get(f'https://data-api.polymarket.com/positions?user={self.browser_wallet}')
+        res = requests.get(f'{DATA_API_HOST}/positions?user={self.browser_wallet}')
         return pd.DataFrame(res.json())
     
     def get_raw_position(self, tokenId):
@@ -268,7 +287,12 @@ class PolymarketClient:
         Args:
             asset_id (str): Asset token ID
         """
-        self.client.cancel_market_orders(asset_id=str(asset_id))
+        try:
+            self.client.cancel_market_orders(asset_id=str(asset_id))
+        except Exception:
+            ORDERS.inc('cancel', 'rejected')
+            raise
+        ORDERS.inc('cancel', 'ok')
 
 
     
@@ -279,7 +303,12 @@ class PolymarketClient:
         Args:
             marketId (str): Market ID
         """
-        self.client.cancel_market_orders(market=marketId)
+        try:
+            self.client.cancel_market_orders(market=marketId)
+        except Exception:
+            ORDERS.inc('cancel', 'rejected')
+            raise
+        ORDERS.inc('cancel', 'ok')
 
     
     def merge_positions(self, amount_to_merge, condition_id, is_neg_risk_market):
@@ -308,7 +337,11 @@ class PolymarketClient:
         print(node_command)
 
         # Run the command and capture the output
-        result = subprocess.run(node_command, shell=True, capture_output=True, text=True)
+        start = time.perf_counter()
+        # merge.js sends the transaction to the same RPC the client reads balances from
+        result = subprocess.run(node_command, shell=True, capture_output=True, text=True,
+                                env={**os.environ, 'POLYGON_RPC': POLYGON_RPC})
+        MERGE_SECONDS.observe(time.perf_counter() - start, 'ok' if result.returncode == 0 else 'error')
         
         # Check if there was an error
         if result.returncode != 0:
@@ -0,0 +1,231 @@
+import os                         # Operating system interface
+import json                       # JSON handling
+import mmap                       # Memory-mapped files
+import time                       # Time functions
+import struct                     # Binary record packing
+import threading                  # Thread management
+from collections import OrderedDict
+
+import poly_data.global_state as global_state
+
+# Directory holding the ledger log and its snapshot
+STATE_DIR = 'state/'
+
+# Log file layout: a fixed header followed by fixed-size event records
+MAGIC = b'PMLEDG01'
+HEADER = struct.Struct('<8sQ')           # magic, number of records
+RECORD = struct.Struct('<dB96s48sdddd')  # time, kind, token/col, trade id, delta, price, size, avgPrice
+
+# Event kinds
+TRADE = 1
+MERGE = 2
+RECONCILE = 3
+MATCHED = 4
+RESOLVED = 5
+
+KINDS = {'websocket': TRADE, 'merge': MERGE, 'reconcile': RECONCILE, 'api': RECONCILE}
+
+# Number of records the log grows by when it fills up
+GROW_RECORDS = 16384
+
+# Number of (trade id, status) pairs remembered for websocket deduplication
+SEEN_TRADES_SIZE = 10000
+
+
+class PositionLedger:
+    """
+    Append-only, memory-mapped log of position events with periodic snapshots.
+
+    Every change to a position (websocket fills, merges and reconciliations) is
+    written as a fixed-size record together with the resulting size and average
+    price, so replaying the log after a restart only needs to apply the last
+    record seen for each token. Matched-but-unresolved trades are logged too,
+    which lets a restart restore the in-flight state that the data API can't see.
+
+    Calling snapshot() writes the current state to a compact JSON file and
+    truncates the log, keeping replay time bounded.
+    """
+
+    def __init__(self, name='ledger'):
+        """
+        Open (or create) the ledger files.
+
+        Args:
+            name (str, optional): Base file name inside STATE_DIR, defaults to 'ledger'
+        """
+        if not os.path.exists(STATE_DIR):
+            os.makedirs(STATE_DIR)
+
+        self.log_path = os.path.join(STATE_DIR, name + '.log')
+        self.snapshot_path = os.path.join(STATE_DIR, name + '.snap')
+
+        # Current state, rebuilt by restore() and kept up to date by every record
+        self.positions = {}
+        self.pending = {}
+
+        self.seen_trades = OrderedDict()
+
+        # Records arrive from the event loop, the update thread and the reconciler
+        self._lock = threading.Lock()
+
+        self._open_log()
+
+    def _open_log(self):
+        if not os.path.exists(self.log_path):
+            with open(self.log_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, 0))
+                f.truncate(HEADER.size + GROW_RECORDS * RECORD.size)
+
+        self._file = open(self.log_path, 'r+b')
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+
+        magic, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.log_path} is not a position ledger")
+
+        self.count = count
+        self.capacity = (len(self._mm) - HEADER.size) // RECORD.size
+
+    def _grow(self):
+        self._mm.flush()
+        self._mm.close()
+        self._file.truncate(HEADER.size + (self.capacity + GROW_RECORDS) * RECORD.size)
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        self.capacity += GROW_RECORDS
+
+    def _append(self, kind, key, trade_id='', delta=0, price=0, size=0, avgPrice=0):
+        if self.count >= self.capacity:
+            self._grow()
+
+        offset = HEADER.size + self.count * RECORD.size
+        RECORD.pack_into(self._mm, offset, time.time(), kind, key.encode(), trade_id.encode(),
+                         delta, price, size, avgPrice)
+
+        # Publish the record only after it has been fully written
+        self.count += 1
+        HEADER.pack_into(self._mm, 0, MAGIC, self.count)
+
+    def _apply(self, kind, key, trade_id, size, avgPrice):
+        if kind == MATCHED:
+            self.pending.setdefault(key, {})[trade_id] = True
+        elif kind == RESOLVED:
+            self.pending.get(key, {}).pop(trade_id, None)
+        else:
+            self.positions[key] = {'size': size, 'avgPrice': avgPrice}
+
+    def restore(self):
+        """
+        Rebuild positions and in-flight trades from the snapshot and the log.
+
+        The restored state is written into global_state.positions and
+        global_state.performing. In-flight trades get a fresh timestamp so the
+        usual stale-trade cleanup applies to them.
+
+        Returns:
+            bool: True if any state was restored
+        """
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                snap = json.load(f)
+            self.positions = snap['positions']
+            self.pending = {col: dict.fromkeys(ids, True) for col, ids in snap['pending'].items()}
+
+        for i in range(self.count):
+            _, kind, key, trade_id, _, _, size, avgPrice = RECORD.unpack_from(self._mm, HEADER.size + i * RECORD.size)
+            self._apply(kind, key.rstrip(b'\0').decode(), trade_id.rstrip(b'\0').decode(), size, avgPrice)
+
+        now = time.time()
+        for token, position in self.positions.items():
+            global_state.positions[token] = dict(position)
+
+        for col, ids in self.pending.items():
+            if ids:
+                global_state.performing.setdefault(col, set()).update(ids)
+                global_state.performing_timestamps.setdefault(col, {}).update(dict.fromkeys(ids, now))
+
+        restored = len(self.positions) > 0
+        if restored:
+            print(f"Restored {len(self.positions)} positions and {sum(len(v) for v in self.pending.values())} "
+                  f"in-flight trades from ledger ({self.count} log records)")
+
+        return restored
+
+    def position(self, token):
+        """Return the ledger's current view of a token's position."""
+        return self.positions.get(str(token), {'size': 0, 'avgPrice': 0})
+
+    def record_position(self, token, source, delta, price, position):
+        """
+        Log a position change.
+
+        Args:
+            token (str): Token ID
+            source (str): What caused the change ('websocket', 'merge', 'reconcile' or 'api')
+            delta (float): Signed change in size
+            price (float): Trade price, or 0 if not applicable
+            position (dict): Resulting position with 'size' and 'avgPrice'
+        """
+        token = str(token)
+        size, avgPrice = float(position['size']), float(position['avgPrice'])
+
+        with self._lock:
+            self._append(KINDS.get(source, RECONCILE), token, '', delta, price, size, avgPrice)
+            self._apply(TRADE, token, '', size, avgPrice)
+
+    def record_matched(self, col, trade_id):
+        """Log that a trade matched and is waiting to be mined."""
+        with self._lock:
+            self._append(MATCHED, col, trade_id)
+            self._apply(MATCHED, col, trade_id, 0, 0)
+
+    def record_resolved(self, col, trade_id):
+        """Log that a trade was confirmed, failed or went stale."""
+        with self._lock:
+            if trade_id not in self.pending.get(col, {}):
+                return
+            self._append(RESOLVED, col, trade_id)
+            self._apply(RESOLVED, col, trade_id, 0, 0)
+
+    def seen_trade(self, trade_id, status):
+        """
+        Remember a websocket trade update and report whether it was seen before.
+
+        The websocket can redeliver updates after a reconnect. Only a bounded
+        number of recent updates is kept, oldest evicted first.
+
+        Returns:
+            bool: True if this (trade id, status) pair was already processed
+        """
+        key = (trade_id, status)
+        if key in self.seen_trades:
+            self.seen_trades.move_to_end(key)
+            return True
+
+        self.seen_trades[key] = True
+        if len(self.seen_trades) > SEEN_TRADES_SIZE:
+            self.seen_trades.popitem(last=False)
+
+        return False
+
+    def snapshot(self):
+        """Write the current state to the snapshot file and truncate the log."""
+        with self._lock:
+            snap = {
+                'time': time.time(),
+                'positions': self.positions,
+                'pending': {col: list(ids) for col, ids in self.pending.items() if ids}
+            }
+
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(snap, f, separators=(',', ':'))
+            os.replace(tmp_path, self.snapshot_path)
+
+            self.count = 0
+            HEADER.pack_into(self._mm, 0, MAGIC, 0)
+            self._mm.flush()
+
+    def close(self):
+        self._mm.flush()
+        self._mm.close()
+        self._file.close()
@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+import signal
+import threading
+import traceback
+from collections import Counter
+
+from dotenv import load_dotenv
+
+import poly_data.global_state as global_state
+from poly_data.loop_monitor import REPO_ROOT, frame_market, _in_repo
+
+load_dotenv()
+
+# Installs the SIGUSR2 handler; the profiler costs nothing until it is signalled
+PROFILER = os.getenv('PROFILER', '1').lower() in ('1', 'true', 'yes')
+
+# Where collapsed stacks are written
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+# Seconds between samples, and the longest a window runs before it is written
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.01'))
+PROFILE_WINDOW = float(os.getenv('PROFILE_WINDOW', '60'))
+
+# Also sample the update and worker threads, not only the event loop
+PROFILE_ALL_THREADS = os.getenv('PROFILE_ALL_THREADS', '0').lower() in ('1', 'true', 'yes')
+
+# Frames kept per sample, innermost first
+MAX_DEPTH = 100
+
+IDLE = '(idle)'
+NO_MARKET = '(no market)'
+
+
+def _frame_name(code):
+    filename = os.path.relpath(code.co_filename, REPO_ROOT) if _in_repo(code.co_filename) else os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _is_idle(frame):
+    # The event loop waiting for I/O or a timer
+    return frame.f_code.co_name == 'select' and frame.f_code.co_filename.endswith('selectors.py')
+
+
+class SamplingProfiler:
+    """
+    A sampling profiler that can be switched on in the running bot.
+
+    While a window is open, a thread reads the event loop thread's stack every
+    interval seconds with sys._current_frames and counts each distinct stack,
+    tagged with the market being handled: the one whose perform_trade or whose
+    process_data message was running (see loop_monitor.frame_market). Samples
+    of the loop waiting for I/O count as idle.
+
+    When the window closes, the counts are written to '<directory>/profile-<start>.folded'
+    in the collapsed stack format read by flamegraph.pl, speedscope and
+    inferno, with the market as the root frame, and the markets that took the
+    most samples are printed.
+
+    Only the Python stack is seen. The sampling thread needs the GIL to read
+    it, so a sample lands where the loop thread lets the GIL go: short bursts
+    of work that end in a wait are undercounted, and time in C code holding
+    the GIL is charged to the frame after it.
+    """
+
+    def __init__(self, thread_id, directory=PROFILE_DIR, interval=PROFILE_INTERVAL, window=PROFILE_WINDOW,
+                 all_threads=PROFILE_ALL_THREADS):
+        """
+        Args:
+            thread_id (int): Identifier of the event loop thread
+            directory (str, optional): Where to write the collapsed stacks
+            interval (float, optional): Seconds between samples
+            window (float, optional): Seconds a window runs unless stopped earlier
+            all_threads (bool, optional): Sample every thread, rooted at the thread name
+        """
+        self.thread_id = thread_id
+        self.directory = directory
+        self.interval = interval
+        self.window = window
+        self.all_threads = all_threads
+
+        self.thread = None
+        self.stopping = threading.Event()
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, window=None):
+        """Open a profiling window of `window` seconds, or the default window."""
+        if self.running:
+            return
+        self.stopping.clear()
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = time.time()
+        self.thread = threading.Thread(target=self._run, args=(window or self.window,), daemon=True)
+        self.thread.start()
+        print(f"Profiling for up to {window or self.window:g}s every {1000 * self.interval:g}ms")
+
+    def stop(self):
+        """Close the window early; the samples are written by the sampling thread."""
+        self.stopping.set()
+
+    def toggle(self):
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def _run(self, window):
+        deadline = time.monotonic() + window
+        own = threading.get_ident()
+        try:
+            while not self.stopping.is_set() and time.monotonic() < deadline:
+                self.sample(own)
+                time.sleep(self.interval)
+            path = self.write()
+            print(self.summary())
+            print(f"Wrote {self.samples} samples to {path}")
+        except Exception:
+            print("Error in profiler")
+            print(traceback.format_exc())
+
+    def sample(self, own=None):
+        frames = sys._current_frames()
+        if self.all_threads:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            targets = [(ident, names.get(ident, str(ident))) for ident in frames if ident != own]
+        else:
+            targets = [(self.thread_id, None)]
+
+        for ident, name in targets:
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+
+            if _is_idle(frame):
+                key = (IDLE, name, ())
+            else:
+                # Code objects are cheap to hash; they are named when written
+                codes = []
+                current = frame
+                while current is not None and len(codes) < MAX_DEPTH:
+                    codes.append(current.f_code)
+                    current = current.f_back
+                key = (frame_market(frame) or NO_MARKET, name, tuple(codes))
+
+            self.stacks[key] += 1
+        self.samples += 1
+
+    def collapsed(self):
+        """The samples as 'root;caller;...;callee count' lines."""
+        lines = Counter()
+        for (market, name, codes), count in self.stacks.items():
+            frames = [market] + ([name] if name is not None else []) + [_frame_name(code) for code in reversed(codes)]
+            lines[';'.join(frame.replace(';', ':') for frame in frames)] += count
+        return [f"{stack} {count}" for stack, count in sorted(lines.items())]
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, time.strftime('profile-%Y%m%d-%H%M%S', time.localtime(self.started)) + '.folded')
+        with open(path, 'w') as f:
+            f.write('\n'.join(self.collapsed()) + '\n')
+        return path
+
+    def summary(self, top=10):
+        """Samples per market, busiest first, with their share of the time the loop was not idle."""
+        markets = Counter()
+        for (market, _, _), count in self.stacks.items():
+            markets[market] += count
+
+        idle = markets.pop(IDLE, 0)
+        busy = sum(markets.values())
+        lines = [f"Profile over {time.time() - self.started:.0f}s: {self.samples} samples, "
+                 f"{100 * busy / max(busy + idle, 1):.0f}% busy"]
+
+        for market, count in markets.most_common(top):
+            row = global_state.markets.get(market) if market != NO_MARKET else None
+            question = f"  {row['question'][:60]}" if row is not None else ''
+            lines.append(f"  {count:7} {100 * count / max(busy, 1):5.1f}%  {market[:16]}{question}")
+
+        return '\n'.join(lines)
+
+
+def start_profiler():
+    """
+    Install a SIGUSR2 handler that opens and closes a profiling window on the
+    running thread, unless PROFILER is off. Call it from the event loop thread.
+
+    Returns:
+        SamplingProfiler: The profiler, or None
+    """
+    if not PROFILER or not hasattr(signal, 'SIGUSR2'):
+        return None
+
+    profiler = SamplingProfiler(threading.get_ident())
+    signal.signal(signal.SIGUSR2, lambda signum, frame: profiler.toggle())
+    print(f"Send SIGUSR2 to process {os.getpid()} to profile for {profiler.window:g}s into {profiler.directory}/")
+    return profiler
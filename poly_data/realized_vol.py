@@ -0,0 +1,77 @@
+import time
+import math
+import asyncio
+from collections import deque
+
+import poly_data.global_state as global_state
+from poly_utils.volatility import RollingVolatility
+
+# How often every market's mid price is sampled
+SAMPLE_INTERVAL = 60
+
+# The sheet's volatility is computed from 10-minute price points. Returns are taken
+# over the same 10 minutes (overlapping, one per sample) so the live figures are on
+# the same scale as the sheet and volatility_threshold keeps its meaning.
+RETURN_LAG = 10
+
+# Windows tracked live, in seconds, named after the sheet columns they replace
+LIVE_WINDOWS = {
+    '1_hour': 60 * 60,
+    '3_hour': 3 * 60 * 60,
+    '24_hour': 24 * 60 * 60,
+}
+
+# A live window is used once it holds at least this fraction of its samples
+WARMUP_FRACTION = 0.5
+
+# Recent mids per market, RETURN_LAG + 1 samples deep
+_mids = {}
+
+
+def _mid(book):
+    if len(book['bids']) == 0 or len(book['asks']) == 0:
+        return None
+    return (book['bids'].peekitem(-1)[0] + book['asks'].peekitem(0)[0]) / 2
+
+
+def sample_market(market, now=None):
+    """Sample the mid price of a market's token1 book and update its rolling volatility."""
+    book = global_state.all_data.get(market)
+    mid = _mid(book) if book is not None else None
+    if mid is None or mid <= 0:
+        return
+
+    now = time.time() if now is None else now
+    mids = _mids.setdefault(market, deque(maxlen=RETURN_LAG + 1))
+    mids.append(mid)
+
+    if market not in global_state.realized_vol:
+        global_state.realized_vol[market] = RollingVolatility(LIVE_WINDOWS)
+
+    if len(mids) == mids.maxlen:
+        global_state.realized_vol[market].add_return(now, math.log(mids[-1] / mids[0]))
+
+
+async def sample_volatility():
+    """Sample every market's mid once per SAMPLE_INTERVAL. Runs on the event loop, next to the book updates."""
+    while True:
+        now = time.time()
+        for market in list(global_state.all_data.keys()):
+            try:
+                sample_market(market, now)
+            except Exception as ex:
+                print(f"Error sampling volatility for {market}: {ex}")
+
+        await asyncio.sleep(SAMPLE_INTERVAL)
+
+
+def get_volatility(market, name, fallback):
+    """
+    Return the live realized volatility of a market over one of LIVE_WINDOWS.
+
+    Falls back to the given value (the sheet column) while the window is still warming up.
+    """
+    rolling = global_state.realized_vol.get(market)
+    if rolling is None or rolling.count(name) < WARMUP_FRACTION * LIVE_WINDOWS[name] / SAMPLE_INTERVAL:
+        return fallback
+    return rolling.volatility(name)
@@ -0,0 +1,137 @@
+import time                       # Time functions
+import threading                  # Thread management
+import traceback                  # Exception handling
+
+import poly_data.global_state as global_state
+
+# Tokens waiting to be reconciled, mapped to (reason, earliest run time).
+# Repeated requests for the same token collapse into a single entry.
+_pending = {}
+_condition = threading.Condition()
+_worker = None
+
+# Seconds to wait before retrying a token that still has trades in flight
+RETRY_DELAY = 2
+
+# A token whose position changed from a trade this recently is retried later, as in update_positions
+RECENT_TRADE = 5
+
+
+def request_reconcile(token, reason=''):
+    """
+    Queue a position reconciliation for a single token.
+
+    This is safe to call from the event loop or from any thread and never blocks
+    on network I/O. If the token is already queued, the request is coalesced into
+    the existing entry.
+
+    Args:
+        token (str): Token ID whose position should be refreshed
+        reason (str, optional): Why the reconciliation was requested, for logging
+    """
+    token = str(token)
+
+    with _condition:
+        if token in _pending:
+            return
+        _pending[token] = (reason, 0)
+        _condition.notify()
+
+    print(f"Queued reconciliation for {token} ({reason})")
+
+
+def pending_count():
+    """Return the number of tokens waiting to be reconciled."""
+    with _condition:
+        return len(_pending)
+
+
+def has_trades_in_flight(token):
+    """Check whether any matched-but-unresolved trades exist for a token."""
+    for col in [f"{token}_buy", f"{token}_sell"]:
+        if len(global_state.performing.get(col, ())) > 0:
+            return True
+    return False
+
+
+def reconcile_position(token):
+    """
+    Refresh the position size of a single token from its on-chain balance.
+
+    The average price is left untouched; it is refreshed by the periodic update.
+    The balance is only written if no trade touched the token while it was
+    being fetched, so a fill applied meanwhile by the event loop isn't lost.
+
+    Args:
+        token (str): Token ID to reconcile
+
+    Returns:
+        bool: False if the token traded recently or during the fetch and should be retried
+    """
+    last_update = global_state.last_trade_update.get(token)
+    if has_trades_in_flight(token) or (last_update is not None and time.time() - last_update < RECENT_TRADE):
+        return False
+
+    _, shares = global_state.client.get_position(token)
+
+    if has_trades_in_flight(token) or global_state.last_trade_update.get(token) != last_update:
+        return False
+
+    position = global_state.positions.get(token, {'size': 0, 'avgPrice': 0}).copy()
+    old_size = position['size']
+    position['size'] = shares
+    global_state.positions[token] = position
+
+    if old_size != shares:
+        print(f"Reconciled {token}: position changed from {old_size} to {shares}")
+
+        if global_state.ledger is not None:
+            global_state.ledger.record_position(token, 'reconcile', shares - old_size, 0, position)
+
+    return True
+
+
+def _next_ready():
+    # Pick a token that is due, or return how long to wait for the next one
+    now = time.time()
+    wait = None
+
+    for token, (reason, not_before) in _pending.items():
+        if not_before <= now:
+            del _pending[token]
+            return token, reason, None
+        if wait is None or not_before - now < wait:
+            wait = not_before - now
+
+    return None, None, wait
+
+
+def _run():
+    while True:
+        with _condition:
+            token, reason, wait = _next_ready()
+            while token is None:
+                _condition.wait(timeout=wait)
+                token, reason, wait = _next_ready()
+
+        try:
+            done = reconcile_position(token)
+        except Exception:
+            print(f"Error reconciling position for {token}")
+            print(traceback.format_exc())
+            done = True
+
+        if not done:
+            with _condition:
+                _pending.setdefault(token, (reason, time.time() + RETRY_DELAY))
+
+
+def start_reconciler():
+    """Start the background reconciliation worker if it isn't running yet."""
+    global _worker
+
+    if _worker is not None and _worker.is_alive():
+        return
+
+    _worker = threading.Thread(target=_run, daemon=True)
+    _worker.start()
@@ -0,0 +1,274 @@
+import os
+import time
+import atexit
+import bisect
+import asyncio
+import hashlib
+import threading
+import traceback
+from multiprocessing.managers import BaseManager
+
+from dotenv import load_dotenv
+
+import poly_data.global_state as global_state
+
+load_dotenv()
+
+# host:port of the coordinator (python -m poly_data.coordinator serve); empty runs unsharded
+SHARD_COORDINATOR = os.getenv('SHARD_COORDINATOR', '')
+
+# This worker's name on the ring, shared with the metrics shard label
+SHARD_ID = os.getenv('SHARD_ID', '0')
+
+# Points per worker on the hash ring; more points spread markets more evenly
+VNODES = 128
+
+# Seconds between heartbeats to the coordinator
+HEARTBEAT = 1.0
+
+
+def coordinator_authkey():
+    """The coordinator's authentication key: COORDINATOR_AUTHKEY, or one derived from the account's key."""
+    key = os.getenv('COORDINATOR_AUTHKEY')
+    if key:
+        return key.encode()
+    return hashlib.sha256(b'poly-maker coordinator:' + (os.getenv('PK') or '').encode()).digest()
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+def _point(key):
+    # A stable 64-bit position on the ring; Python's hash() differs between processes
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    A consistent hash ring of workers.
+
+    Each worker is placed at VNODES points, and a market belongs to the worker
+    at the first point at or after the market's own. When a worker joins or
+    leaves, only the markets between its points and the previous ones move.
+    """
+
+    def __init__(self, workers, vnodes=VNODES):
+        self.workers = sorted(str(worker) for worker in workers)
+        points = sorted((_point(f"{worker}#{n}"), worker) for worker in self.workers for n in range(vnodes))
+        self._keys = [key for key, _ in points]
+        self._owners = [worker for _, worker in points]
+
+    def owner(self, market):
+        """The worker a market belongs to, or None on an empty ring."""
+        if not self._keys:
+            return None
+        n = bisect.bisect_left(self._keys, _point(str(market)))
+        return self._owners[n % len(self._owners)]
+
+    def assign(self, markets):
+        """Markets grouped by the worker they belong to."""
+        assignment = {worker: [] for worker in self.workers}
+        for market in markets:
+            owner = self.owner(market)
+            if owner is not None:
+                assignment[owner].append(market)
+        return assignment
+
+
+class CoordinatorManager(BaseManager):
+    pass
+
+
+CoordinatorManager.register('coordinator')
+
+
+def connect_coordinator(address=SHARD_COORDINATOR):
+    """A proxy for the coordinator at host:port."""
+    manager = CoordinatorManager(address=parse_address(address), authkey=coordinator_authkey())
+    manager.connect()
+    return manager.coordinator()
+
+
+class ShardWorker:
+    """
+    This process's membership in a group of bot processes that split the selected markets.
+
+    A heartbeat thread reports to the coordinator every HEARTBEAT seconds and
+    receives the current members. Each member builds the same HashRing from
+    them and keeps only the markets the ring gives it: update_markets applies
+    only those, the market websocket subscribes only to their tokens, and
+    perform_trade skips every other market.
+
+    When the members change, markets this worker loses are dropped at the
+    next heartbeat, while markets it gains are only taken once the
+    coordinator's handoff time has passed. By then their previous owner has
+    seen the change and stopped quoting them. Its resting orders are picked up
+    by the new owner's order refresh like any other open order.
+    """
+
+    def __init__(self, worker_id=SHARD_ID, address=SHARD_COORDINATOR):
+        """
+        Args:
+            worker_id (str, optional): This worker's name on the ring
+            address (str, optional): host:port of the coordinator
+        """
+        self.worker_id = str(worker_id)
+        self.address = address
+        self.coordinator = connect_coordinator(address)
+
+        self.loop = None
+        self.version = None
+        self.ring = HashRing([])
+        self.previous = HashRing([])
+        self.effective_at = 0.0
+        self._owners = {}
+        self._lock = threading.Lock()
+
+        # Set when the owned markets may have changed and update_markets should reapply them
+        self.changed = threading.Event()
+
+    def start(self):
+        """Join the coordinator, wait for this worker's markets to hand over and start the heartbeat."""
+        self.loop = asyncio.get_running_loop()
+        self.heartbeat()
+
+        wait = self.effective_at - time.time()
+        if wait > 0:
+            print(f"Shard {self.worker_id} waiting {wait:.1f}s for its markets to be handed over")
+            time.sleep(wait)
+        self.heartbeat()
+
+        threading.Thread(target=self._run, daemon=True).start()
+        atexit.register(self.leave)
+        print(f"Shard {self.worker_id} joined {self.address} with workers {', '.join(self.ring.workers)}")
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(HEARTBEAT)
+            try:
+                self.heartbeat()
+            except Exception:
+                # Keep the last assignment while the coordinator is away
+                print(f"Error in shard {self.worker_id} heartbeat")
+                print(traceback.format_exc())
+                try:
+                    self.coordinator = connect_coordinator(self.address)
+                except Exception:
+                    pass
+
+    def heartbeat(self):
+        owned = self._owned_tokens()
+        positions = {token: dict(position) for token, position in list(global_state.positions.items()) if token in owned}
+        version, workers, effective_at = self.coordinator.heartbeat(self.worker_id, {
+            'markets': len(global_state.markets), 'positions': positions, 'pid': os.getpid()})
+
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    print(f"Shard {self.worker_id}: workers changed to {', '.join(sorted(workers))}")
+                self.previous, self.ring = self.ring, HashRing(workers)
+                self.version, self.effective_at = version, effective_at
+                self._owners = {}
+                self.changed.set()
+            elif self.previous is not None and time.time() >= self.effective_at:
+                # The handoff is over; the markets gained can be taken now
+                self.previous = None
+                self._owners = {}
+                self.changed.set()
+
+    def owns(self, market):
+        """Whether this worker trades the market, under the current assignment and any handoff in progress."""
+        owner = self._owners.get(market)
+        if owner is None:
+            with self._lock:
+                mine = self.ring.owner(market) == self.worker_id
+                if self.previous is not None:
+                    mine = mine and self.previous.owner(market) == self.worker_id
+                self._owners[market] = owner = mine
+        return owner
+
+    def select(self, df):
+        """The rows of a market configuration this worker owns."""
+        if df is None or len(df) == 0:
+            return df
+        return df[df['condition_id'].map(self.owns)].reset_index(drop=True)
+
+    def tokens(self):
+        """Tokens to subscribe to on the market websocket, one per owned market."""
+        return [str(row['token1']) for row in list(global_state.markets.values())]
+
+    def _owned_tokens(self):
+        return {str(row[col]) for row in list(global_state.markets.values()) for col in ('token1', 'token2')}
+
+    def resubscribe(self):
+        """Reconnect the market websocket, so it subscribes to the owned markets' tokens."""
+        websocket = global_state.market_websocket
+        if websocket is not None and self.loop is not None:
+            asyncio.run_coroutine_threadsafe(websocket.close(), self.loop)
+
+    def leave(self):
+        try:
+            self.coordinator.leave(self.worker_id)
+        except Exception:
+            pass
+
+
+class SharedStateClient:
+    """
+    Wraps the PolymarketClient of a shard worker so that positions, open
+    orders and balances come from the coordinator's single poll instead of
+    every worker polling the APIs. Each worker only sees the positions and
+    orders of the tokens it owns. Everything else, including orders, cancels
+    and on-chain position checks, goes to the wrapped client.
+    """
+
+    def __init__(self, client, shard):
+        self.wrapped = client
+        self.shard = shard
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+    def _shared(self, name):
+        try:
+            return getattr(self.shard.coordinator, name)()
+        except Exception:
+            print(f"Coordinator has no {name}, asking the API")
+            return None
+
+    def get_all_positions(self):
+        df = self._shared('positions')
+        if df is None:
+            df = self.wrapped.get_all_positions()
+        if len(df) == 0:
+            return df
+        return df[df['asset'].astype(str).isin(self.shard._owned_tokens())].reset_index(drop=True)
+
+    def get_all_orders(self):
+        df = self._shared('orders')
+        if df is None:
+            df = self.wrapped.get_all_orders()
+        if len(df) == 0:
+            return df
+        return df[df['asset_id'].astype(str).isin(self.shard._owned_tokens())].reset_index(drop=True)
+
+    def get_usdc_balance(self):
+        balances = self._shared('balances')
+        return balances['usdc'] if balances else self.wrapped.get_usdc_balance()
+
+    def get_pos_balance(self):
+        balances = self._shared('balances')
+        return balances['positions'] if balances else self.wrapped.get_pos_balance()
+
+    def get_total_balance(self):
+        return self.get_usdc_balance() + self.get_pos_balance()
+
+
+def start_shard():
+    """Join the coordinator at SHARD_COORDINATOR as worker SHARD_ID if it is set, returning the ShardWorker, or None."""
+    if not SHARD_COORDINATOR:
+        return None
+    return ShardWorker().start()
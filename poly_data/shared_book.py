@@ -0,0 +1,319 @@
+"""
+Order books in shared memory, written by the feed handler process and read by
+any number of bot processes, poly_stats scripts or dashboards on the host.
+
+Usage:
+    python -m poly_data.shared_book top [--name NAME] [--limit N]
+"""
+import os
+import time
+import argparse
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Name of the shared memory segment; when set, main.py reads books from it instead of the market websocket
+SHARED_BOOK = os.getenv('SHARED_BOOK', '')
+
+# Segment the feed handler creates when SHARED_BOOK is not set
+DEFAULT_NAME = 'poly_books'
+
+# Books the segment holds, at 160 KB each
+CAPACITY = int(os.getenv('SHARED_BOOK_CAPACITY', '300'))
+
+# Price levels per side: every 0.0001 from 0 to 1, the finest tick size the CLOB allows
+TICKS = 10000
+LEVELS = TICKS + 1
+
+# Room for a token id (up to 78 digits) or a condition id (66 characters)
+KEY_BYTES = 80
+
+MAGIC = 0x31304b4f4f425950  # 'PYBOOK01'
+
+# Header fields, as uint64 indices
+_MAGIC, _CAPACITY, _LEVELS, _COUNT, _CREATED, _HEARTBEAT = range(6)
+HEADER_FIELDS = 8
+
+# Attempts at a consistent read before giving up on a book being written
+READ_RETRIES = 100
+
+# Seconds between a reader's checks for changed books
+POLL_INTERVAL = float(os.getenv('SHARED_BOOK_POLL', '0.005'))
+
+# Readers attach again when the writer has been silent this many seconds, as after a feed handler restart
+STALE_AFTER = 10
+
+
+def _layout(capacity):
+    # (name, dtype, shape) of each array, in order, each starting on a 64-byte boundary
+    fields = [
+        ('header', np.uint64, (HEADER_FIELDS,)),
+        ('seq', np.uint64, (capacity,)),
+        ('updated', np.int64, (capacity,)),
+        ('tokens', f'S{KEY_BYTES}', (capacity,)),
+        ('markets', f'S{KEY_BYTES}', (capacity,)),
+        ('bids', np.float64, (capacity, LEVELS)),
+        ('asks', np.float64, (capacity, LEVELS)),
+    ]
+    offsets, offset = {}, 0
+    for name, dtype, shape in fields:
+        offsets[name] = (offset, dtype, shape)
+        offset += int(np.dtype(dtype).itemsize * np.prod(shape))
+        offset = (offset + 63) // 64 * 64
+    return offsets, offset
+
+
+def price_index(price):
+    return int(round(float(price) * TICKS))
+
+
+class SharedBook:
+    """
+    Books of many tokens in one shared memory segment.
+
+    Each book takes a slot holding two arrays of LEVELS sizes, one per side,
+    indexed by price in ten-thousandths: a size of 0 means no level at that price.
+    A slot also records its token, the market it belongs to, the receive time
+    of the last update and a sequence number.
+
+    The sequence number makes each slot a seqlock. The single writer makes it
+    odd before changing the slot and even again afterwards. A reader copies
+    what it needs and keeps the copy only if the number was even and
+    unchanged across the copy; otherwise it tries again. Readers never block
+    the writer or each other, and nothing is serialized. The scheme relies on
+    readers seeing the writer's stores in program order, which x86 guarantees;
+    on weakly ordered CPUs such as ARM a torn read is possible in principle.
+
+    Slots are handed out in order and never reused while the segment exists,
+    so a reader can cache the token and market of a slot once it has seen
+    the slot counted in the header.
+    """
+
+    def __init__(self, shm, writable):
+        self.shm = shm
+        self.name = shm.name
+        self.writable = writable
+
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.uint64, buffer=shm.buf)
+        if header[_MAGIC] != MAGIC:
+            raise ValueError(f"Shared memory {shm.name} is not a shared book")
+        if header[_LEVELS] != LEVELS:
+            raise ValueError(f"Shared book {shm.name} has {header[_LEVELS]} levels per side, expected {LEVELS}")
+
+        self.capacity = int(header[_CAPACITY])
+        offsets, _ = _layout(self.capacity)
+        for name, (offset, dtype, shape) in offsets.items():
+            array = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            array.flags.writeable = writable
+            setattr(self, name, array)
+
+        self._slots = {}
+        self._market_slots = {}
+        self._known = 0
+
+    @classmethod
+    def create(cls, name=SHARED_BOOK or DEFAULT_NAME, capacity=CAPACITY):
+        """Create the segment, replacing one left behind by a writer that didn't exit cleanly."""
+        offsets, size = _layout(capacity)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.uint64, buffer=shm.buf)
+        header[:] = 0
+        header[_CAPACITY], header[_LEVELS] = capacity, LEVELS
+        header[_CREATED] = header[_HEARTBEAT] = time.time_ns()
+        header[_MAGIC] = MAGIC
+        return cls(shm, writable=True)
+
+    @classmethod
+    def attach(cls, name=SHARED_BOOK or DEFAULT_NAME):
+        """Map an existing segment read-only."""
+        shm = shared_memory.SharedMemory(name=name)
+        # Python tracks attached segments too and would unlink this one when the reader exits
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return cls(shm, writable=False)
+
+    def close(self):
+        # Views into the buffer must be gone before it can be closed
+        for name in ('header', 'seq', 'updated', 'tokens', 'markets', 'bids', 'asks'):
+            setattr(self, name, None)
+        self.shm.close()
+        if self.writable:
+            self.shm.unlink()
+
+    # ------- Directory -------
+
+    @property
+    def count(self):
+        return int(self.header[_COUNT])
+
+    def _refresh(self):
+        count = self.count
+        for slot in range(self._known, count):
+            token, market = self.tokens[slot].decode(), self.markets[slot].decode()
+            self._slots[token] = slot
+            self._market_slots[market] = slot
+        self._known = count
+
+    def slot(self, token):
+        """The slot of a token, or None."""
+        if self._known != self.count:
+            self._refresh()
+        return self._slots.get(str(token))
+
+    def market_slot(self, market):
+        """The slot of the latest token added for a market, or None."""
+        if self._known != self.count:
+            self._refresh()
+        return self._market_slots.get(market)
+
+    def market(self, slot):
+        return self.markets[slot].decode()
+
+    def token(self, slot):
+        return self.tokens[slot].decode()
+
+    def created(self):
+        return int(self.header[_CREATED])
+
+    def age(self):
+        """Seconds since the writer last signalled it is alive."""
+        return (time.time_ns() - int(self.header[_HEARTBEAT])) / 1e9
+
+    # ------- Writing, from the feed handler only -------
+
+    def add(self, token, market):
+        """The slot of a token, allocating one if it is new. Returns None when the segment is full."""
+        slot = self.slot(token)
+        if slot is not None:
+            return slot
+
+        slot = self.count
+        if slot >= self.capacity:
+            return None
+        self.tokens[slot], self.markets[slot] = str(token).encode(), str(market).encode()
+        self.seq[slot] = 0
+        self.bids[slot] = 0
+        self.asks[slot] = 0
+        # Counting the slot publishes it
+        self.header[_COUNT] = slot + 1
+        self._refresh()
+        return slot
+
+    def write_book(self, slot, bids, asks, received_ns=None):
+        """Replace a book with full sides, each a list of (price, size)."""
+        arrays = []
+        for levels in (bids, asks):
+            levels = np.array(levels, dtype=np.float64).reshape(-1, 2)
+            arrays.append((np.rint(levels[:, 0] * TICKS).astype(np.intp), levels[:, 1]))
+
+        # Parsed before the slot is opened, so readers are held off only for the copy
+        self.seq[slot] += 1
+        for side, (index, sizes) in zip((self.bids[slot], self.asks[slot]), arrays):
+            side[:] = 0
+            side[index] = sizes
+        self.updated[slot] = received_ns or time.time_ns()
+        self.seq[slot] += 1
+
+    def write_changes(self, slot, changes, received_ns=None):
+        """Apply level changes, each ('bids' or 'asks', price, size); a size of 0 removes the level."""
+        self.seq[slot] += 1
+        for side, price, size in changes:
+            (self.bids if side == 'bids' else self.asks)[slot, price_index(price)] = float(size)
+        self.updated[slot] = received_ns or time.time_ns()
+        self.seq[slot] += 1
+
+    def heartbeat(self):
+        self.header[_HEARTBEAT] = time.time_ns()
+
+    # ------- Reading -------
+
+    def read(self, slot, reader=None):
+        """
+        Read a book consistently.
+
+        Args:
+            slot (int): The book's slot
+            reader (function, optional): Called with the bid and ask size arrays; it
+                must copy what it keeps, as the arrays change under it. By default
+                the non-empty levels are copied out
+
+        Returns:
+            tuple: (sequence number, what reader returned), or None if the book was
+                being written on every attempt
+        """
+        reader = reader or _levels
+        for _ in range(READ_RETRIES):
+            seq = int(self.seq[slot])
+            if seq & 1:
+                continue
+            try:
+                result = reader(self.bids[slot], self.asks[slot])
+            except RuntimeError:
+                # numpy noticed the writer changing the arrays mid-copy, as a changed number would show
+                continue
+            if int(self.seq[slot]) == seq:
+                return seq, result
+        return None
+
+    def levels(self, token):
+        """
+        The non-empty levels of a token's book.
+
+        Returns:
+            tuple: (bid prices, bid sizes, ask prices, ask sizes) arrays, prices
+                ascending, or None if the token has no book
+        """
+        slot = self.slot(token)
+        if slot is None:
+            return None
+        result = self.read(slot)
+        return None if result is None else result[1]
+
+    def top(self, token):
+        """(best bid, best bid size, best ask, best ask size) of a token, with None for an empty side."""
+        levels = self.levels(token)
+        if levels is None:
+            return None
+        bid_prices, bid_sizes, ask_prices, ask_sizes = levels
+        return (bid_prices[-1] if len(bid_prices) else None, bid_sizes[-1] if len(bid_sizes) else None,
+                ask_prices[0] if len(ask_prices) else None, ask_sizes[0] if len(ask_sizes) else None)
+
+
+def _levels(bids, asks):
+    # Comparing first is several times faster than nonzero on floats across the whole grid
+    bid_index, ask_index = np.flatnonzero(bids != 0), np.flatnonzero(asks != 0)
+    return bid_index / TICKS, bids[bid_index], ask_index / TICKS, asks[ask_index]
+
+
+def print_top(name=SHARED_BOOK or DEFAULT_NAME, limit=50):
+    """Print the top of every book in a segment."""
+    book = SharedBook.attach(name)
+    print(f"{book.name}: {book.count} of {book.capacity} books, last written {book.age():.1f}s ago")
+    for slot in range(min(book.count, limit)):
+        top = book.top(book.token(slot))
+        if top is None:
+            continue
+        bid, bid_size, ask, ask_size = top
+        age = (time.time_ns() - int(book.updated[slot])) / 1e9
+        print(f"  {book.market(slot)[:12]}  {book.token(slot)[:12]}  "
+              f"{bid_size or 0:10.1f} @ {bid if bid is not None else float('nan'):.3f} | "
+              f"{ask if ask is not None else float('nan'):.3f} @ {ask_size or 0:<10.1f}  {age:7.1f}s ago")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect the shared order books")
+    parser.add_argument('command', choices=['top'])
+    parser.add_argument('--name', default=SHARED_BOOK or DEFAULT_NAME)
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    print_top(args.name, args.limit)
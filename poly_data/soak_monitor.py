@@ -0,0 +1,238 @@
+import os
+import gc
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import traceback
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+from dotenv import load_dotenv
+
+import trading
+import poly_data.global_state as global_state
+
+load_dotenv()
+
+# Set SOAK_MONITOR=1 to sample memory, tasks and the bot's structures every SOAK_INTERVAL seconds
+SOAK_DIR = os.getenv('SOAK_DIR', 'soak')
+SOAK_INTERVAL = float(os.getenv('SOAK_INTERVAL', '60'))
+
+# Stack frames tracemalloc keeps per allocation; 0 turns tracing off
+TRACE_FRAMES = int(os.getenv('SOAK_TRACEMALLOC', '1'))
+
+# Allocation sites and object types recorded per sample
+TRACE_LINES = 50
+MIN_OBJECTS = 100
+
+
+def rss_bytes():
+    """Resident set size of this process."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Without procfs only the peak is available
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def structure_sizes():
+    """Sizes of the bot's long-lived containers that are only ever added to, or could be."""
+    # Copies are taken first, since the update thread changes these while they are counted
+    performing = list(global_state.performing.values())
+    timestamps = list(global_state.performing_timestamps.values())
+    markets = global_state.markets
+
+    return {
+        'market_locks': len(trading.market_locks),
+        'all_data': len(global_state.all_data),
+        'all_data_not_selected': sum(1 for market in list(global_state.all_data) if market not in markets),
+        'performing_keys': len(performing),
+        'performing_entries': sum(len(entries) for entries in performing),
+        'performing_timestamps': sum(len(entries) for entries in timestamps),
+        'matched_trades': len(global_state.matched_trades),
+        'last_trade_update': len(global_state.last_trade_update),
+        'orders': len(global_state.orders),
+        'positions': len(global_state.positions),
+        'realized_vol': len(global_state.realized_vol),
+        'all_tokens': len(global_state.all_tokens),
+    }
+
+
+def task_counts():
+    """Live asyncio tasks of the running loop, by coroutine name."""
+    return dict(Counter(getattr(task.get_coro(), '__qualname__', type(task.get_coro()).__name__)
+                        for task in asyncio.all_tasks()))
+
+
+def object_counts(minimum=MIN_OBJECTS):
+    """Objects tracked by the garbage collector, by type name. Untracked types (str, float, int) are not counted."""
+    counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+    return {name: count for name, count in counts.items() if count >= minimum}
+
+
+class SoakMonitor:
+    """
+    Samples the bot's memory and bookkeeping on its own event loop during a soak run.
+
+    Every interval it appends one JSON line to '<directory>/soak-<start>.jsonl'
+    with RSS, the tracemalloc total and largest allocation sites, live asyncio
+    tasks by coroutine, garbage-collected objects by type and the sizes of the
+    bot's long-lived structures. The first and the latest tracemalloc snapshots
+    are also dumped next to it, for a closer look with tracemalloc. Read the
+    growth of each series with `python -m poly_data.soak_monitor report`.
+
+    Sampling walks every object on the heap, so it briefly blocks the loop;
+    keep the interval at a minute or more.
+    """
+
+    def __init__(self, directory=SOAK_DIR, interval=SOAK_INTERVAL, frames=TRACE_FRAMES):
+        """
+        Args:
+            directory (str, optional): Where to write samples and snapshots
+            interval (float, optional): Seconds between samples
+            frames (int, optional): Frames per traced allocation, 0 to skip tracemalloc
+        """
+        self.directory = directory
+        self.interval = interval
+        self.frames = frames
+
+        os.makedirs(directory, exist_ok=True)
+        self.prefix = os.path.join(directory, time.strftime('soak-%Y%m%d-%H%M%S'))
+        self.task = None
+        self.samples = 0
+
+    def start(self):
+        """Start tracing and schedule sampling on the running loop."""
+        if self.frames and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.task = asyncio.ensure_future(self.run())
+        print(f"Soak monitor writing to {self.prefix}.jsonl every {self.interval:g}s")
+        return self
+
+    async def run(self):
+        while True:
+            try:
+                self.write(self.sample())
+            except Exception:
+                print("Error in soak monitor")
+                print(traceback.format_exc())
+            await asyncio.sleep(self.interval)
+
+    def sample(self):
+        sample = {
+            't': time.time(),
+            'process': {'rss': rss_bytes(), 'threads': threading.active_count(), 'gc_objects': len(gc.get_objects())},
+            'structures': structure_sizes(),
+            'tasks': task_counts(),
+            'objects': object_counts(),
+        }
+        sample['process']['tasks'] = sum(sample['tasks'].values())
+
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ])
+            stats = snapshot.statistics('lineno')
+            sample['process']['traced'] = sum(stat.size for stat in stats)
+            sample['lines'] = {f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}": stat.size
+                               for stat in stats[:TRACE_LINES]}
+
+            snapshot.dump(self.prefix + ('-first' if self.samples == 0 else '-last') + '.tracemalloc')
+
+        return sample
+
+    def write(self, sample):
+        with open(self.prefix + '.jsonl', 'a') as f:
+            f.write(json.dumps(sample) + '\n')
+        self.samples += 1
+
+
+def start_soak_monitor():
+    """Start a SoakMonitor on the running loop if SOAK_MONITOR is set, returning it, or None."""
+    if os.getenv('SOAK_MONITOR', '0').lower() in ('1', 'true', 'yes'):
+        return SoakMonitor().start()
+    return None
+
+
+def load_samples(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def growth(samples, skip=0):
+    """
+    Fit a line through every series of a soak run.
+
+    Args:
+        samples (list): Samples as written by SoakMonitor
+        skip (float, optional): Seconds at the start to leave out, while caches fill
+
+    Returns:
+        dict: {group: [(name, first, last, growth per hour), ...]}, fastest growing first
+    """
+    if not samples:
+        return {}
+
+    start = samples[0]['t'] + skip
+    samples = [s for s in samples if s['t'] >= start]
+
+    series = {}
+    for s in samples:
+        for group in ('process', 'structures', 'tasks', 'objects', 'lines'):
+            for name, value in s.get(group, {}).items():
+                series.setdefault(group, {}).setdefault(name, []).append((s['t'], value))
+
+    result = {}
+    for group, named in series.items():
+        rows = []
+        for name, points in named.items():
+            t, values = np.array(points, dtype=float).T
+            # A slope needs a few points; series that only appear at the end show as unfit
+            slope = np.polyfit((t - t[0]) / 3600, values, 1)[0] if len(points) >= 3 and t[-1] > t[0] else float('nan')
+            rows.append((name, values[0], values[-1], slope))
+        result[group] = sorted(rows, key=lambda row: -row[3] if row[3] == row[3] else float('inf'))
+    return result
+
+
+def print_report(path, skip=600, top=15):
+    """Print how fast each series of a soak run grew."""
+    samples = load_samples(path)
+    if len(samples) < 2:
+        print(f"{path} has {len(samples)} samples, not enough to fit growth")
+        return
+
+    hours = (samples[-1]['t'] - samples[0]['t']) / 3600
+    print(f"{path}: {len(samples)} samples over {hours:.2f} hours, first {skip / 60:.0f} minutes left out")
+
+    byte_series = {'rss', 'traced'}
+    for group, rows in growth(samples, skip).items():
+        print(f"\n{group}:")
+        shown = rows if group in ('process', 'structures') else rows[:top]
+        for name, first, last, slope in shown:
+            if group == 'lines' or name in byte_series:
+                first, last, slope = first / 2**20, last / 2**20, slope / 2**20
+                unit = ' MB'
+            else:
+                unit = ''
+            relative = f" ({100 * slope / first:+.1f}%/h)" if first else ''
+            print(f"  {name[-70:]:70} {first:12,.1f} -> {last:12,.1f}{unit}  {slope:+12,.2f}{unit}/h{relative}")
+
+
+if __name__ == '__main__':
+    # python -m poly_data.soak_monitor report <soak .jsonl file> [--skip MINUTES] [--top N]
+    parser = argparse.ArgumentParser(description="Report the growth of a soak run's memory and structures")
+    parser.add_argument('command', choices=['report'])
+    parser.add_argument('path')
+    parser.add_argument('--skip', type=float, default=10, help="Minutes at the start to leave out")
+    parser.add_argument('--top', type=int, default=15, help="Object types and allocation sites to show")
+    args = parser.parse_args()
+
+    print_report(args.path, args.skip * 60, args.top)
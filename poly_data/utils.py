@@ -1,46 +1,38 @@
 import json
-from poly_utils.google_utils import get_spreadsheet
+from poly_utils.config_backend import get_config_backend, GoogleSheetsBackend
+from poly_utils.universe_store import current_version, load_universe
 import pandas as pd 
-import os
 
 def pretty_print(txt, dic):
     print("\n", txt, json.dumps(dic, indent=4))
 
-def get_sheet_df(read_only=None):
+# Worksheets that make up the trading configuration
+SELECTED_SHEET = 'Selected Markets'
+ALL_SHEET = 'All Markets'
+PARAMS_SHEET = 'Hyperparameters'
+
+# Last fetched configuration, reused while the content is unchanged
+_config_cache = {'hash': None, 'df': None, 'params': None}
+_backend = None
+
+def get_backend(read_only=None):
     """
-    Get sheet data with optional read-only mode
-    
+    Get the configuration backend, creating it on first use.
+
     Args:
-        read_only (bool): If None, auto-detects based on credentials availability
+        read_only (bool): Passed to the Google Sheets backend. If None, auto-detects
+            based on credentials availability
     """
-    all = 'All Markets'
-    sel = 'Selected Markets'
-
-    # Auto-detect read-only mode if not specified
-    if read_only is None:
-        creds_file = 'credentials.json' if os.path.exists('credentials.json') else '../credentials.json'
-        read_only = not os.path.exists(creds_file)
-        if read_only:
-            print("No credentials found, using read-only mode")
-
-    try:
-        spreadsheet = get_spreadsheet(read_only=read_only)
-    except FileNotFoundError:
-        print("No credentials found, falling back to read-only mode")
-        spreadsheet = get_spreadsheet(read_only=True)
-
-    wk = spreadsheet.worksheet(sel)
-    df = pd.DataFrame(wk.get_all_records())
-    df = df[df['question'] != ""].reset_index(drop=True)
+    global _backend
 
-    wk2 = spreadsheet.worksheet(all)
-    df2 = pd.DataFrame(wk2.get_all_records())
-    df2 = df2[df2['question'] != ""].reset_index(drop=True)
+    if _backend is None:
+        _backend = get_config_backend()
+        if isinstance(_backend, GoogleSheetsBackend):
+            _backend.read_only = read_only
 
-    result = df.merge(df2, on='question', how='inner')
+    return _backend
 
-    wk_p = spreadsheet.worksheet('Hyperparameters')
-    records = wk_p.get_all_records()
+def parse_hyperparameters(records):
     hyperparams, current_type = {}, None
 
     for r in records:
@@ -65,4 +57,63 @@ def get_sheet_df(read_only=None):
             
             hyperparams.setdefault(current_type, {})[r['param']] = value
 
-    return result, hyperparams
+    return hyperparams
+
+def build_config(records, universe_version=None):
+    """
+    Merge the Selected and All Markets records and parse hyperparameters.
+
+    If a universe version is given, All Markets is read from the local universe
+    written by update_markets.py instead of the records.
+    """
+    df = pd.DataFrame(records[SELECTED_SHEET])
+    df = df[df['question'] != ""].reset_index(drop=True)
+
+    if universe_version is not None:
+        df2 = load_universe(universe_version, questions=df['question'])
+    else:
+        df2 = pd.DataFrame(records[ALL_SHEET])
+        df2 = df2[df2['question'] != ""].reset_index(drop=True)
+
+    result = df.merge(df2, on='question', how='inner')
+
+    return result, parse_hyperparameters(records[PARAMS_SHEET])
+
+def get_sheet_config(read_only=None):
+    """
+    Get the trading configuration, skipping the rebuild when the content is unchanged.
+
+    Selected Markets and Hyperparameters are fetched from the configured backend
+    in one request (see poly_utils.config_backend). All Markets comes from the
+    local universe when update_markets.py runs on this host, and from the backend
+    otherwise. If neither the content hash nor the universe version changed, the
+    cached DataFrame and parameters are returned.
+
+    Args:
+        read_only (bool): If None, auto-detects based on credentials availability
+
+    Returns:
+        tuple: (markets DataFrame, hyperparameters dict, whether the content changed)
+    """
+    version = current_version()
+    titles = [SELECTED_SHEET, PARAMS_SHEET] if version is not None else [SELECTED_SHEET, ALL_SHEET, PARAMS_SHEET]
+
+    records, content_hash = get_backend(read_only).fetch(titles)
+    content_hash = f"{content_hash}:{version}"
+
+    if content_hash == _config_cache['hash']:
+        return _config_cache['df'], _config_cache['params'], False
+
+    df, params = build_config(records, version)
+    _config_cache.update({'hash': content_hash, 'df': df, 'params': params})
+    return df, params, True
+
+def get_sheet_df(read_only=None):
+    """
+    Get sheet data with optional read-only mode
+    
+    Args:
+        read_only (bool): If None, auto-detects based on credentials availability
+    """
+    df, params, _ = get_sheet_config(read_only)
+    return df, params
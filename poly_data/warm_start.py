@@ -0,0 +1,157 @@
+import os                         # Operating system interface
+import time                       # Time functions
+import zlib                       # Compression
+import pickle                     # Binary serialization
+import traceback                  # Exception handling
+from array import array           # Compact numeric arrays
+
+from sortedcontainers import SortedDict
+
+import poly_data.global_state as global_state
+from poly_data.data_utils import apply_markets
+
+# Location of the warm-start snapshot
+SNAPSHOT_PATH = 'state/warm_start.bin'
+
+# Snapshots older than this many seconds are ignored on startup
+MAX_SNAPSHOT_AGE = 5 * 60
+
+# Parts of the state that must be revalidated before leaving guarded mode
+PARTS = ('config', 'positions', 'orders')
+
+
+def _pack_book(book):
+    # Store each side as two flat double arrays instead of a dict of floats
+    packed = {}
+    for side in ['bids', 'asks']:
+        items = list(book[side].items())
+        packed[side] = (array('d', [p for p, _ in items]).tobytes(), array('d', [s for _, s in items]).tobytes())
+    return packed
+
+
+def _unpack_book(packed):
+    book = {}
+    for side in ['bids', 'asks']:
+        prices, sizes = array('d'), array('d')
+        prices.frombytes(packed[side][0])
+        sizes.frombytes(packed[side][1])
+        book[side] = SortedDict(zip(prices, sizes))
+    return book
+
+
+def save_snapshot():
+    """
+    Write the current market config, hyperparameters, books, positions and orders
+    to a compressed binary snapshot.
+
+    The file is written to a temporary path first and then moved into place, so a
+    crash mid-write never leaves a truncated snapshot behind.
+    """
+    if global_state.df is None:
+        return
+
+    books = {}
+    for market in list(global_state.all_data.keys()):
+        try:
+            books[market] = _pack_book(global_state.all_data[market])
+        except (RuntimeError, KeyError):
+            # Book was modified by the event loop while copying; skip it this time
+            continue
+
+    snapshot = {
+        'time': time.time(),
+        'df': global_state.df,
+        'params': global_state.params,
+        'all_tokens': list(global_state.all_tokens),
+        'reverse_tokens': dict(global_state.REVERSE_TOKENS),
+        'books': books,
+        'positions': {k: dict(v) for k, v in list(global_state.positions.items())},
+        'orders': {k: {s: dict(o) for s, o in v.items()} for k, v in list(global_state.orders.items())},
+    }
+
+    directory = os.path.dirname(SNAPSHOT_PATH)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    tmp_path = SNAPSHOT_PATH + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(zlib.compress(pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL), 1))
+    os.replace(tmp_path, SNAPSHOT_PATH)
+
+
+def load_snapshot(max_age=MAX_SNAPSHOT_AGE):
+    """
+    Load the warm-start snapshot into global_state and enter guarded mode.
+
+    Positions already restored from the position ledger take precedence over the
+    snapshot's copy.
+
+    Args:
+        max_age (float, optional): Maximum snapshot age in seconds
+
+    Returns:
+        bool: True if a snapshot was loaded
+    """
+    if not os.path.exists(SNAPSHOT_PATH):
+        return False
+
+    try:
+        with open(SNAPSHOT_PATH, 'rb') as f:
+            snapshot = pickle.loads(zlib.decompress(f.read()))
+    except Exception:
+        print("Could not read warm-start snapshot, starting cold")
+        print(traceback.format_exc())
+        return False
+
+    age = time.time() - snapshot['time']
+    if age > max_age:
+        print(f"Warm-start snapshot is {age / 60:.0f} minutes old, starting cold")
+        return False
+
+    global_state.df = snapshot['df']
+    global_state.params = snapshot['params']
+    global_state.all_tokens = snapshot['all_tokens']
+    global_state.REVERSE_TOKENS.update(snapshot['reverse_tokens'])
+    global_state.orders = snapshot['orders']
+    apply_markets(global_state.df)
+
+    for token, position in snapshot['positions'].items():
+        global_state.positions.setdefault(token, position)
+
+    for market, packed in snapshot['books'].items():
+        global_state.all_data[market] = _unpack_book(packed)
+
+    global_state.unvalidated = set(PARTS)
+    global_state.live_books = set()
+
+    print(f"Loaded warm-start snapshot from {age:.0f} seconds ago with {len(global_state.df)} markets "
+          f"and {len(snapshot['books'])} books. Quoting each market once its live book arrives.")
+    return True
+
+
+def mark_validated(part):
+    """Record that a part of the warm-start state has been refreshed from its source."""
+    if part in global_state.unvalidated:
+        global_state.unvalidated.discard(part)
+        if not global_state.unvalidated:
+            print("Warm-start state fully revalidated")
+
+
+def is_guarded(market):
+    """
+    Check whether a market should still be traded in guarded mode.
+
+    A market is guarded while any part of the warm-start state is unvalidated.
+    Markets aren't quoted at all until they have a live book (see has_live_book).
+    """
+    if global_state.live_books is None:
+        return False
+    return bool(global_state.unvalidated)
+
+
+def has_live_book(market):
+    """
+    Check whether a market's book came from the live feed or a resync rather than
+    the warm-start snapshot. Always true after a cold start.
+    """
+    return global_state.live_books is None or market in global_state.live_books
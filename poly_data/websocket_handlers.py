@@ -2,8 +2,16 @@ import asyncio                      # Asynchronous I/O
 import json                        # JSON handling
 import websockets                  # WebSocket client
 import traceback                   # Exception handling
+import time                        # Receive timestamps
 
-from poly_data.data_processing import process_data, process_user_data
+import numpy as np
+
+from poly_data.data_processing import process_data, process_user_data, process_shared_book
+from poly_data.shared_book import SharedBook, POLL_INTERVAL, STALE_AFTER
+from trading import perform_trade
+from poly_data.feed_recorder import MARKET, USER
+from poly_utils.endpoints import WS_HOST
+from poly_data.metrics import count_events, BOOK_UPDATE, SHARD
 import poly_data.global_state as global_state
 
 async def connect_market_websocket(chunk):
@@ -22,8 +30,10 @@ async def connect_market_websocket(chunk):
         If the connection is lost, the function will exit and the main loop will
         attempt to reconnect after a short delay.
     """
-    uri = "wss://ws-subscriptions-clob.polymarket.com/ws/market"
+    uri = f"{WS_HOST}/ws/market"
     async with websockets.connect(uri, ping_interval=5, ping_timeout=None) as websocket:
+        global_state.market_websocket = websocket
+
         # Prepare and send subscription message
         message = {"assets_ids": chunk}
         await websocket.send(json.dumps(message))
@@ -35,11 +45,16 @@ async def connect_market_websocket(chunk):
             # Process incoming market data indefinitely
             while True:
                 message = await websocket.recv()
+                received_ns = time.time_ns()
                 json_data = json.loads(message)
+                if global_state.recorder is not None:
+                    global_state.recorder.record(MARKET, json_data, received_ns)
+                count_events('market', json_data)
                 #print(f"type(json_data)={type(json_data)}")
                 #print(f"json_data (repr)={json_data!r}")  # unambiguous representation
                 # Process order book updates and trigger trading as needed
                 process_data(json_data)
+                BOOK_UPDATE.observe((time.time_ns() - received_ns) / 1e9, SHARD)
         except websockets.ConnectionClosed:
             print("Connection closed in market websocket")
             print(traceback.format_exc())
@@ -63,7 +78,7 @@ async def connect_user_websocket():
         If the connection is lost, the function will exit and the main loop will
         attempt to reconnect after a short delay.
     """
-    uri = "wss://ws-subscriptions-clob.polymarket.com/ws/user"
+    uri = f"{WS_HOST}/ws/user"
 
     async with websockets.connect(uri, ping_interval=5, ping_timeout=None) as websocket:
         # Prepare authentication message with API credentials
@@ -86,7 +101,11 @@ async def connect_user_websocket():
             # Process incoming user data indefinitely
             while True:
                 message = await websocket.recv()
+                received_ns = time.time_ns()
                 json_data = json.loads(message)
+                if global_state.recorder is not None:
+                    global_state.recorder.record(USER, json_data, received_ns)
+                count_events('user', json_data)
                 # Process trade and order updates
                 process_user_data(json_data)
         except websockets.ConnectionClosed:
@@ -97,4 +116,60 @@ async def connect_user_websocket():
             print(traceback.format_exc())
         finally:
             # Brief delay before attempting to reconnect
-            await asyncio.sleep(5)
\ No newline at end of file
+            await asyncio.sleep(5)
+
+async def follow_shared_book(name):
+    """
+    Read market books from the feed handler's shared memory instead of the market websocket.
+
+    Every POLL_INTERVAL seconds the sequence numbers of all books are compared
+    with the last ones read. Each changed book of a selected market is copied
+    into global_state.all_data and evaluated with perform_trade, so a burst of
+    updates to one market between two checks leads to a single evaluation.
+
+    Args:
+        name (str): Name of the shared memory segment
+
+    Notes:
+        Returns when the segment doesn't exist or the feed handler stops
+        signalling, and the main loop attaches again after a short delay.
+    """
+    try:
+        book = SharedBook.attach(name)
+    except FileNotFoundError:
+        print(f"Waiting for the feed handler to create shared book {name}")
+        await asyncio.sleep(5)
+        return
+
+    print(f"Reading books from shared memory {name}")
+    seen = np.zeros(book.capacity, dtype=np.uint64)
+    markets = None
+
+    try:
+        while book.age() < STALE_AFTER:
+            # A new market selection may include books that haven't changed since they were skipped
+            if global_state.markets is not markets:
+                markets = global_state.markets
+                seen[:] = 0
+
+            count = book.count
+            for slot in np.flatnonzero(book.seq[:count] != seen[:count]):
+                market = book.market(slot)
+                if market not in markets:
+                    seen[slot] = book.seq[slot]
+                    continue
+
+                result = book.read(slot)
+                if result is None:
+                    continue
+
+                seen[slot], levels = result
+                process_shared_book(market, *levels)
+                BOOK_UPDATE.observe((time.time_ns() - int(book.updated[slot])) / 1e9, SHARD)
+                asyncio.create_task(perform_trade(market))
+
+            await asyncio.sleep(POLL_INTERVAL)
+
+        print(f"Feed handler stopped writing to {name}, attaching again")
+    finally:
+        book.close()
@@ -25,8 +25,8 @@ const parentEnvPath = resolve(__dirname, '../.env');
 const envPath = existsSync(localEnvPath) ? localEnvPath : parentEnvPath;
 require('dotenv').config({ path: envPath })
 
-// Connect to Polygon network
-const provider = new ethers.providers.JsonRpcProvider("https://polygon-rpc.com");
+// Connect to Polygon network, or the RPC of a local stand-in exchange (see poly_sim/exchange.py)
+const provider = new ethers.providers.JsonRpcProvider(process.env.POLYGON_RPC || "https://polygon-rpc.com");
 const privateKey = process.env.PK;
 const wallet = new ethers.Wallet(privateKey, provider);
 
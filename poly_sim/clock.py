@@ -0,0 +1,68 @@
+import time
+import asyncio
+
+import pandas as pd
+
+
+class VirtualClock:
+    """
+    Replaces the wall clock with the time of the frame being replayed.
+
+    While installed, time.time() and pd.Timestamp.utcnow() return the virtual time,
+    so everything the bot timestamps (trade updates, risk-off periods, pending
+    trades) follows the capture instead of the machine running the replay.
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+        self._time = None
+        self._utcnow = None
+
+    def set(self, now):
+        # Never go backwards, even if two frames were received out of order
+        if now > self.now:
+            self.now = now
+
+    def install(self):
+        self._time = time.time
+        self._utcnow = pd.Timestamp.utcnow
+
+        clock = self
+        time.time = lambda: clock.now
+        pd.Timestamp.utcnow = classmethod(lambda cls: pd.Timestamp(clock.now, unit='s', tz='UTC'))
+
+    def uninstall(self):
+        if self._time is not None:
+            time.time = self._time
+            pd.Timestamp.utcnow = self._utcnow
+            self._time = None
+
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """
+    An event loop that keeps time with a VirtualClock.
+
+    asyncio.sleep and every other timer then wait in virtual time: perform_trade's
+    cooldown and the bot's periodic tasks fire when the replay moves the clock
+    past them, however fast the replay runs.
+    """
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+        # Timers due within this much of now fire. The default (the monotonic clock's
+        # resolution) is below the float spacing of epoch seconds, so a timer due
+        # exactly now would never fire
+        self._clock_resolution = 1e-6
+
+    def time(self):
+        return self.clock.now
+
+    def next_timer(self):
+        """Virtual time of the earliest pending timer, or None."""
+        # _scheduled is the loop's timer heap; cancelled handles stay in it until the loop drops them
+        return min((handle.when() for handle in self._scheduled if not handle.cancelled()), default=None)
+
+    def idle(self):
+        """Whether no callback is waiting to run at the current virtual time."""
+        return not self._ready
@@ -0,0 +1,520 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+import websockets
+from sortedcontainers import SortedDict
+
+from poly_sim.sim_client import SimClient, USER_LATENCY
+from poly_utils.config_backend import SQLiteConfigBackend
+
+HTTP_PORT = 8080
+WS_PORT = 8081
+
+TICK = 0.01
+
+# Price levels kept on each side of a synthetic book
+DEPTH = 8
+
+# USDC the simulated account starts with
+STARTING_USDC = 10000
+
+# Of the generated market messages, the share that are trades and the share
+# that move a market's mid by a tick; the rest resize a level
+TRADE_SHARE = 0.1
+MOVE_SHARE = 0.2
+
+# Seconds between batches of generated market messages and of user frames
+GENERATE_INTERVAL = 0.01
+DELIVER_INTERVAL = 0.01
+
+# Seconds between status lines
+STATUS_INTERVAL = 30
+
+# Function selectors of the two balanceOf calls the bot makes over RPC
+USDC_BALANCE_OF = '0x70a08231'
+ERC1155_BALANCE_OF = '0x00fdd58e'
+
+# Hyperparameters written by --write-config
+HYPERPARAMETERS = [
+    ('default', 'stop_loss_threshold', -5),
+    ('', 'take_profit_threshold', 2),
+    ('', 'volatility_threshold', 20),
+    ('', 'spread_threshold', 0.05),
+    ('', 'sleep_period', 1),
+]
+
+
+class WallClock:
+    """The SimClient clock outside a replay: the actual time."""
+
+    @property
+    def now(self):
+        return time.time()
+
+
+def _price(ticks):
+    return round(ticks * TICK, 2)
+
+
+def _word(value):
+    return '0x' + format(max(int(value), 0), '064x')
+
+
+class StandInExchange:
+    """
+    A local stand-in for the CLOB, data API, Polygon RPC and both websockets.
+
+    It makes up N binary markets and streams a random walk of their token1
+    books over the market websocket at a fixed total message rate. Orders posted
+    over HTTP rest in a SimClient and fill against those books the same way they
+    do in a replay, and the resulting order and trade frames go out over the
+    user websocket. Positions, open orders and balances are answered from the
+    same state, so the bot can run unmodified against it for load and soak
+    tests, with nothing sent to Polymarket.
+
+    All state lives on the event loop thread; HTTP requests are served on
+    threads that hand their work to the loop.
+
+    Position merges go through poly_merger, which sends its transaction to
+    POLYGON_RPC. The stand-in's RPC rejects it, so merges fail and are
+    retried by the bot without anything reaching Polygon.
+    """
+
+    def __init__(self, n_markets=20, rate=100.0, fills=True, latency=USER_LATENCY, seed=0):
+        """
+        Args:
+            n_markets (int): Number of markets to make up
+            rate (float): Market websocket messages per second, across all markets
+            fills (bool): Whether resting orders fill against the books
+            latency (float): Seconds between an order action and its user frame
+            seed (int): Seed of the random walk, so two runs stream the same books
+        """
+        self.rng = random.Random(seed)
+        self.rate = rate
+
+        self.rows = {}
+        self.books = {}
+        self.mids = {}
+        self.token_markets = {}
+        for i in range(n_markets):
+            self._add_market(i)
+
+        self.client = SimClient(WallClock(), latency, books=self.books, fills=fills)
+        self.client.register_markets(self.rows)
+
+        self.market_sockets = {}
+        self.user_sockets = set()
+        self.loop = None
+
+        self.sent = 0
+        self.user_sent = 0
+        self.requests = 0
+
+    # ------- Synthetic markets -------
+
+    def _add_market(self, i):
+        market = '0x' + format(i + 1, '064x')
+        token1, token2 = str(10**40 + 2 * i), str(10**40 + 2 * i + 1)
+
+        self.rows[market] = {'question': f"Stand-in market {i + 1}", 'answer1': 'Yes', 'answer2': 'No',
+                             'condition_id': market, 'token1': token1, 'token2': token2, 'neg_risk': 'FALSE',
+                             'tick_size': TICK, 'min_size': 20, 'max_spread': 3, '3_hour': 5}
+        self.token_markets[token1] = market
+        self.token_markets[token2] = market
+
+        self.books[market] = {'bids': SortedDict(), 'asks': SortedDict()}
+        self.mids[market] = self.rng.randint(20, 80)
+        self._reshape(market)
+
+    def _size(self):
+        return float(self.rng.randint(1, 100) * 10)
+
+    def _reshape(self, market):
+        # Bring a book in line with its mid, returning the levels that changed as (side, price, size)
+        book, mid = self.books[market], self.mids[market]
+        changes = []
+
+        for side, sign in (('bids', -1), ('asks', 1)):
+            wanted = {_price(mid + sign * k) for k in range(1, DEPTH + 1) if 0 < mid + sign * k < 100}
+
+            for price in [p for p in book[side] if p not in wanted]:
+                del book[side][price]
+                changes.append((side, price, 0))
+
+            for price in sorted(wanted - set(book[side])):
+                book[side][price] = self._size()
+                changes.append((side, price, book[side][price]))
+
+        return changes
+
+    def _step(self, market):
+        # Advance one market's random walk and return the message describing it
+        roll = self.rng.random()
+        book = self.books[market]
+
+        if roll < TRADE_SHARE:
+            side = self.rng.choice(('BUY', 'SELL'))
+            levels = book['asks'] if side == 'BUY' else book['bids']
+            price = levels.peekitem(0)[0] if side == 'BUY' else levels.peekitem(-1)[0]
+            return self._event(market, 'last_trade_price', price=str(price), size=str(self._size() / 10),
+                               side=side, fee_rate_bps='0')
+
+        if roll < TRADE_SHARE + MOVE_SHARE:
+            self.mids[market] = min(max(self.mids[market] + self.rng.choice((-1, 1)), 5), 95)
+            changes = self._reshape(market)
+        else:
+            side = self.rng.choice(('bids', 'asks'))
+            price = self.rng.choice(list(book[side]))
+            book[side][price] = self._size()
+            changes = [(side, price, book[side][price])]
+
+        token = self.rows[market]['token1']
+        return self._event(market, 'price_change', price_changes=[
+            {'asset_id': token, 'price': str(price), 'size': str(size), 'side': 'BUY' if side == 'bids' else 'SELL'}
+            for side, price, size in changes])
+
+    def _event(self, market, event_type, **fields):
+        return {'event_type': event_type, 'market': market, 'asset_id': self.rows[market]['token1'],
+                'timestamp': str(int(time.time() * 1000)), **fields}
+
+    def book_snapshot(self, token):
+        """The book of either token of a market, as the book endpoints and websocket event return it."""
+        market = self.token_markets[token]
+        book = self.books[market]
+
+        # Token2 is priced off the complement of the token1 book
+        if token == self.rows[market]['token2']:
+            bids = [(round(1 - p, 2), s) for p, s in book['asks'].items()]
+            asks = [(round(1 - p, 2), s) for p, s in book['bids'].items()]
+        else:
+            bids, asks = list(book['bids'].items()), list(book['asks'].items())
+
+        return {'event_type': 'book', 'market': market, 'asset_id': token, 'timestamp': str(int(time.time() * 1000)),
+                'hash': '', 'min_order_size': '5', 'tick_size': str(TICK), 'neg_risk': False, 'last_trade_price': '',
+                'bids': [{'price': str(p), 'size': str(s)} for p, s in sorted(bids)],
+                'asks': [{'price': str(p), 'size': str(s)} for p, s in sorted(asks, reverse=True)]}
+
+    # ------- Config -------
+
+    def write_config(self, path):
+        """
+        Write the made-up markets and default hyperparameters to a SQLite config file.
+
+        With CONFIG_BACKEND=sqlite and CONFIG_DB pointing at it, main.py trades
+        every stand-in market.
+        """
+        rows = []
+        for market, row in self.rows.items():
+            book = self.books[market]
+            rows.append({**row, 'best_bid': book['bids'].peekitem(-1)[0], 'best_ask': book['asks'].peekitem(0)[0]})
+
+        all_markets = pd.DataFrame(rows)
+        selected = pd.DataFrame({'question': all_markets['question'], 'param_type': 'default',
+                                 'trade_size': 50, 'max_size': 100})
+
+        backend = SQLiteConfigBackend(path)
+        backend.write_worksheet('All Markets', all_markets)
+        backend.write_worksheet('Selected Markets', selected)
+        backend.write_worksheet('Hyperparameters', pd.DataFrame(HYPERPARAMETERS, columns=['type', 'param', 'value']))
+        print(f"Wrote {len(rows)} stand-in markets to {path}")
+
+    # ------- HTTP: CLOB, data API and RPC -------
+
+    def call(self, method, path, query, body):
+        """Serve an HTTP request on the event loop thread. Called from the HTTP server's threads."""
+        async def run():
+            return self.handle(method, path, query, body)
+
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result()
+
+    def handle(self, method, path, query, body):
+        """
+        Answer one HTTP request.
+
+        Returns:
+            tuple: (status code, JSON payload)
+        """
+        self.requests += 1
+        route = (method, path.rstrip('/') or '/')
+
+        if route == ('GET', '/time'):
+            return 200, int(time.time())
+        if route in (('POST', '/auth/api-key'), ('GET', '/auth/derive-api-key')):
+            # Any credentials do; the stand-in does not check signatures
+            return 200, {'apiKey': 'stand-in', 'secret': 'c3RhbmQtaW4=', 'passphrase': 'stand-in'}
+        if route == ('GET', '/tick-size'):
+            return 200, {'minimum_tick_size': TICK}
+        if route == ('GET', '/neg-risk'):
+            return 200, {'neg_risk': False}
+        if route == ('GET', '/fee-rate'):
+            return 200, {'base_fee': 0}
+        if route == ('GET', '/book'):
+            if query.get('token_id') not in self.token_markets:
+                return 404, {'error': 'No orderbook exists for the requested token id'}
+            return 200, self.book_snapshot(query['token_id'])
+        if route == ('POST', '/books'):
+            return 200, [self.book_snapshot(str(entry['token_id'])) for entry in body or []
+                         if str(entry['token_id']) in self.token_markets]
+        if route == ('POST', '/order'):
+            return self._post_order(body)
+        if route == ('DELETE', '/cancel-market-orders'):
+            return 200, self._cancel(lambda order: order['token'] == str(body['asset_id']) if body.get('asset_id')
+                                     else order['market'] == body.get('market'))
+        if route == ('DELETE', '/cancel-all'):
+            return 200, self._cancel(lambda order: True)
+        if route == ('GET', '/data/orders'):
+            return 200, {'data': self._open_orders(), 'next_cursor': 'LTE=', 'limit': 0, 'count': 0}
+        if route == ('GET', '/positions'):
+            positions = self.client.get_all_positions()
+            return 200, positions.to_dict('records')
+        if route == ('GET', '/value'):
+            value = sum(p['size'] * self._mid(token) for token, p in self.client.positions.items() if p['size'] > 0)
+            return 200, {'user': query.get('user'), 'value': value}
+        if route in (('POST', '/rpc'), ('POST', '/')):
+            return 200, self._rpc(body)
+
+        return 404, {'error': f"{method} {path} is not implemented by the stand-in"}
+
+    def _mid(self, token):
+        market = self.token_markets[token]
+        mid = _price(self.mids[market])
+        return mid if token == self.rows[market]['token1'] else 1 - mid
+
+    def _post_order(self, body):
+        order = body['order']
+        token = str(order['tokenId'])
+        if token not in self.token_markets:
+            return 400, {'success': False, 'errorMsg': f"Unknown token {token}"}
+
+        # Amounts are in 6-decimal units: a buy pays makerAmount USDC for takerAmount shares
+        maker, taker = int(order['makerAmount']), int(order['takerAmount'])
+        if order['side'] == 'BUY':
+            price, size = maker / taker, taker / 10**6
+        else:
+            price, size = taker / maker, maker / 10**6
+
+        # Fills are reported to whoever signed the order
+        self.client.browser_wallet = order['maker']
+        response = self.client.create_order(token, order['side'], round(price, 4), round(size, 2))
+        return 200, {'success': True, 'orderID': response['orderID'], 'status': 'live', 'errorMsg': ''}
+
+    def _cancel(self, matches):
+        canceled = [order_id for order_id, order in self.client.orders.items() if matches(order)]
+        for order_id in canceled:
+            self.client.actions[self.client.orders[order_id]['market']]['cancel'] += 1
+            del self.client.orders[order_id]
+        return {'canceled': canceled, 'not_canceled': {}}
+
+    def _open_orders(self):
+        return [{'id': o['id'], 'status': 'LIVE', 'market': o['market'], 'asset_id': o['token'], 'side': o['side'],
+                 'outcome': o['outcome'], 'price': str(o['price']), 'original_size': str(o['size']),
+                 'size_matched': str(o['matched']), 'maker_address': self.client.browser_wallet,
+                 'order_type': 'GTC', 'expiration': '0'}
+                for o in self.client.orders.values()]
+
+    def _rpc(self, request):
+        # The JSON-RPC calls web3 makes for the two balanceOf reads
+        if isinstance(request, list):
+            return [self._rpc(r) for r in request]
+
+        method, params = request.get('method'), request.get('params') or []
+        reply = {'jsonrpc': '2.0', 'id': request.get('id')}
+
+        if method == 'eth_chainId':
+            return {**reply, 'result': hex(137)}
+        if method == 'net_version':
+            return {**reply, 'result': '137'}
+        if method == 'eth_blockNumber':
+            return {**reply, 'result': hex(int(time.time()))}
+        if method == 'eth_call':
+            data = params[0].get('data') or params[0].get('input') or ''
+            if data.startswith(USDC_BALANCE_OF):
+                return {**reply, 'result': _word((STARTING_USDC + self.client.cash) * 10**6)}
+            if data.startswith(ERC1155_BALANCE_OF):
+                token = str(int(data[10 + 64:10 + 128], 16))
+                raw, _ = self.client.get_position(token)
+                return {**reply, 'result': _word(raw)}
+
+        return {**reply, 'error': {'code': -32601, 'message': f"{method} is not implemented by the stand-in"}}
+
+    # ------- Websockets -------
+
+    async def _serve_socket(self, websocket, path=None):
+        # websockets before 13 passes the path separately
+        path = path or websocket.request.path
+
+        if path.startswith('/ws/market'):
+            await self._market_socket(websocket)
+        elif path.startswith('/ws/user'):
+            await self._user_socket(websocket)
+        else:
+            await websocket.close(1008, 'Unknown path')
+
+    async def _market_socket(self, websocket):
+        subscription = json.loads(await websocket.recv())
+        tokens = {str(t) for t in subscription.get('assets_ids', [])}
+
+        await websocket.send(json.dumps([self.book_snapshot(token) for token in tokens if token in self.token_markets]))
+        self.market_sockets[websocket] = tokens
+        print(f"Market websocket subscribed to {len(tokens)} tokens")
+
+        try:
+            async for _ in websocket:
+                pass
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            del self.market_sockets[websocket]
+
+    async def _user_socket(self, websocket):
+        await websocket.recv()
+        self.user_sockets.add(websocket)
+        print("User websocket connected")
+
+        try:
+            async for _ in websocket:
+                pass
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.user_sockets.discard(websocket)
+
+    async def _send(self, sockets, message):
+        for websocket in sockets:
+            try:
+                await websocket.send(message)
+            except websockets.ConnectionClosed:
+                pass
+
+    async def _generate(self):
+        # Stream market messages at self.rate per second, spread over the markets
+        markets = list(self.books)
+        owed, last = 0.0, time.perf_counter()
+
+        while True:
+            await asyncio.sleep(GENERATE_INTERVAL)
+            now = time.perf_counter()
+            owed += (now - last) * self.rate
+            last = now
+
+            for _ in range(int(owed)):
+                market = self.rng.choice(markets)
+                event = self._step(market)
+                token = event['asset_id']
+
+                message = json.dumps(event)
+                await self._send([ws for ws, tokens in list(self.market_sockets.items()) if token in tokens], message)
+                self.sent += 1
+
+                if event['event_type'] == 'last_trade_price':
+                    self.client.match_trade(event)
+                else:
+                    self.client.match(market)
+
+            owed -= int(owed)
+
+    async def _deliver(self):
+        # Send the user frames that are due; they are dropped if no user websocket is connected, as they are live
+        while True:
+            await asyncio.sleep(DELIVER_INTERVAL)
+            for frame in self.client.take_frames(time.time()):
+                await self._send(list(self.user_sockets), json.dumps([frame]))
+                self.user_sent += 1
+
+    async def _report(self):
+        start, sent = time.perf_counter(), 0
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            elapsed = time.perf_counter() - start
+            print(f"{self.sent - sent} market messages ({(self.sent - sent) / elapsed:.0f}/s), "
+                  f"{self.user_sent} user frames, {self.requests} requests, {len(self.client.orders)} open orders, "
+                  f"{sum(self.client.filled.values()):.0f} shares filled, cash {self.client.cash:+.2f}")
+            start, sent = time.perf_counter(), self.sent
+
+    async def serve(self, host='127.0.0.1', http_port=HTTP_PORT, ws_port=WS_PORT):
+        """Serve HTTP and the websockets until cancelled."""
+        self.loop = asyncio.get_running_loop()
+
+        http = ThreadingHTTPServer((host, http_port), _RequestHandler)
+        http.daemon_threads = True
+        http.exchange = self
+        threading.Thread(target=http.serve_forever, daemon=True).start()
+
+        try:
+            async with websockets.serve(self._serve_socket, host, ws_port):
+                print(f"Stand-in exchange with {len(self.rows)} markets at {self.rate:.0f} messages/s. "
+                      f"Run the bot with:\n"
+                      f"  CLOB_HOST=http://{host}:{http_port}\n"
+                      f"  DATA_API_HOST=http://{host}:{http_port}\n"
+                      f"  POLYGON_RPC=http://{host}:{http_port}/rpc\n"
+                      f"  WS_HOST=ws://{host}:{ws_port}")
+                await asyncio.gather(self._generate(), self._deliver(), self._report())
+        finally:
+            http.shutdown()
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    # Keep connections open, as requests sessions and py_clob_client expect
+    protocol_version = 'HTTP/1.1'
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        try:
+            status, payload = self.server.exchange.call(method, url.path, query, body)
+        except Exception as ex:
+            status, payload = 500, {'error': f"{type(ex).__name__}: {ex}"}
+
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def log_message(self, format, *args):
+        # One line per request would drown the status lines
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for the Polymarket CLOB, data API, RPC and websockets")
+    parser.add_argument('--markets', type=int, default=20)
+    parser.add_argument('--rate', type=float, default=100.0, help="Market websocket messages per second")
+    parser.add_argument('--fill', choices=['cross', 'none'], default='cross',
+                        help="cross: orders fill when the book trades through them; none: orders only rest")
+    parser.add_argument('--latency', type=float, default=USER_LATENCY, help="Seconds before a user frame is sent")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--http-port', type=int, default=HTTP_PORT)
+    parser.add_argument('--ws-port', type=int, default=WS_PORT)
+    parser.add_argument('--write-config', metavar='DB', help="Also write the markets to this SQLite config file")
+    args = parser.parse_args()
+
+    exchange = StandInExchange(args.markets, args.rate, fills=args.fill == 'cross', latency=args.latency, seed=args.seed)
+    if args.write_config:
+        exchange.write_config(args.write_config)
+
+    try:
+        asyncio.run(exchange.serve(args.host, args.http_port, args.ws_port))
+    except KeyboardInterrupt:
+        pass
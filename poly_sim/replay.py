@@ -0,0 +1,291 @@
+import os
+import sys
+import glob
+import time
+import asyncio
+import contextlib
+from collections import defaultdict
+
+import trading
+import poly_data.global_state as global_state
+import poly_data.data_processing as data_processing
+from poly_data.data_processing import process_data, process_user_data
+from poly_data.data_utils import update_positions, update_orders
+from poly_data.feed_recorder import read_all, MARKET, USER
+from poly_data.realized_vol import sample_market, SAMPLE_INTERVAL
+from poly_sim.clock import VirtualClock, VirtualEventLoop
+from poly_sim.sim_client import SimClient
+
+# Same cadence as update_periodically's position and order refresh
+SYNC_INTERVAL = 5
+
+STAGES = ['load', 'book', 'fills', 'strategy', 'user', 'sync', 'replay']
+
+
+def capture_hours(directory):
+    """List the capture hour prefixes in a recording directory, oldest first."""
+    return sorted(path[:-len('.idx')] for path in glob.glob(os.path.join(directory, '*.idx')))
+
+
+def iter_capture(directory, channels=(MARKET,)):
+    """
+    Yield the recorded events of every hour in a recording directory, in receive order.
+
+    Yields:
+        tuple: (receive time in seconds, channel, event dict)
+    """
+    for prefix in capture_hours(directory):
+        for received_ns, channel, event in read_all(prefix, channels):
+            yield received_ns / 1e9, channel, event
+
+
+class ReplayStats:
+    """
+    CPU time per stage and evaluation and decision counts of a replay.
+
+    Exactly one stage is current at a time, and CPU time is charged to it until
+    the next switch, so stages never double count.
+    """
+
+    def __init__(self):
+        self.cpu = dict.fromkeys(STAGES, 0.0)
+        self.current = 'replay'
+        self.mark = time.process_time()
+
+        self.events = 0
+        self.errors = 0
+        self.user_frames = 0
+        self.evaluations = defaultdict(int)
+        self.first = None
+        self.last = None
+        self.wall = 0.0
+
+    def switch(self, name):
+        """Charge the CPU time since the last switch to the current stage and make name current."""
+        now = time.process_time()
+        self.cpu[self.current] += now - self.mark
+        self.mark = now
+
+        previous, self.current = self.current, name
+        return previous
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        previous = self.switch(name)
+        try:
+            yield
+        finally:
+            self.switch(previous)
+
+    def summary(self, client):
+        self.switch(self.current)
+        evaluations = sum(self.evaluations.values())
+        span = (self.last - self.first) if self.first is not None else 0
+
+        return {
+            'events': self.events,
+            'errors': self.errors,
+            'user_frames': self.user_frames,
+            'capture_seconds': span,
+            'wall_seconds': self.wall,
+            'cpu_seconds': sum(self.cpu.values()),
+            'evaluations': evaluations,
+            'evaluations_per_second': evaluations / self.wall if self.wall > 0 else 0,
+            'events_per_second': self.events / self.wall if self.wall > 0 else 0,
+            'cpu_by_stage': dict(self.cpu),
+            'markets': {market: {'evaluations': self.evaluations.get(market, 0), **dict(client.actions.get(market, {})),
+                                 'filled': client.filled.get(market, 0)}
+                        for market in set(self.evaluations) | set(client.actions)},
+        }
+
+
+def print_summary(summary, top=10):
+    failed = f" ({summary['errors']} events failed)" if summary['errors'] else ''
+    print(f"Replayed {summary['events']} events and {summary['user_frames']} user frames covering "
+          f"{summary['capture_seconds']:.0f}s of capture in {summary['wall_seconds']:.2f}s{failed}")
+    print(f"{summary['evaluations']} perform_trade evaluations, {summary['evaluations_per_second']:.0f}/s; "
+          f"{summary['events_per_second']:.0f} events/s")
+
+    cpu = summary['cpu_seconds'] or 1
+    print("CPU by stage: " + ", ".join(f"{name} {seconds:.3f}s ({100 * seconds / cpu:.0f}%)"
+                                       for name, seconds in summary['cpu_by_stage'].items()))
+
+    markets = sorted(summary['markets'].items(), key=lambda item: -item[1]['evaluations'])
+    for market, counts in markets[:top]:
+        row = global_state.markets.get(market)
+        name = row['question'][:50] if row is not None else market[:20]
+        print(f"  {name:50}  evaluations {counts['evaluations']:6}  orders {counts.get('create', 0):5}  "
+              f"cancels {counts.get('cancel', 0):5}  fills {counts.get('fill', 0):4}  filled {counts['filled']:.0f}")
+
+
+class Replay:
+    """
+    Drives the bot's own handlers with recorded frames on a virtual clock.
+
+    Market events go through process_data and user frames through
+    process_user_data, exactly as the websocket handlers call them, with a
+    SimClient as global_state.client. The event loop keeps virtual time, so
+    perform_trade's cooldown, the volatility sampler and the position and order
+    refresh run on the capture's clock. Before each frame, everything due by
+    its receive time runs to completion, so a replay of the same capture and
+    config always makes the same decisions.
+
+    By default recorded user frames are skipped: they describe the live
+    account's orders, not the simulated ones, and the SimClient reports its own
+    fills. Pass include_user=True to replay them too.
+    """
+
+    def __init__(self, frames, realtime=False, speed=1.0, include_user=False, verbose=False):
+        self.frames = frames
+        self.realtime = realtime
+        self.speed = speed
+        self.include_user = include_user
+        self.verbose = verbose
+
+        self.clock = VirtualClock()
+        self.loop = VirtualEventLoop(self.clock)
+        self.client = SimClient(self.clock)
+        self.stats = ReplayStats()
+        self.in_flight = 0
+
+    async def _evaluate(self, perform_trade, market):
+        # Wraps perform_trade to count evaluations and know when all of them have finished
+        self.stats.evaluations[market] += 1
+        self.in_flight += 1
+        try:
+            await perform_trade(market)
+        finally:
+            self.in_flight -= 1
+
+    async def _settle(self):
+        # Run everything that is ready at the current virtual time
+        with self.stats.stage('strategy'):
+            await asyncio.sleep(0)
+            while not self.loop.idle():
+                await asyncio.sleep(0)
+
+    async def _sync_periodically(self):
+        # update_periodically's position and order refresh, on the virtual clock
+        while True:
+            await asyncio.sleep(SYNC_INTERVAL)
+            with self.stats.stage('sync'):
+                update_positions(avgOnly=True)
+                update_orders()
+
+    async def _sample_periodically(self):
+        # sample_volatility, on the virtual clock
+        while True:
+            with self.stats.stage('sync'):
+                for market in list(global_state.all_data):
+                    sample_market(market, self.clock.now)
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    async def _advance(self, until):
+        # Move the clock to `until`, firing timers and delivering user frames on the way
+        while True:
+            due = [t for t in (self.loop.next_timer(), self.client.next_frame_time()) if t is not None and t <= until]
+            if not due:
+                break
+
+            self.clock.set(min(due))
+            for frame in self.client.take_frames(self.clock.now):
+                self.stats.user_frames += 1
+                with self.stats.stage('user'):
+                    process_user_data(frame)
+                await self._settle()
+            await self._settle()
+
+        self.clock.set(until)
+
+    async def _replay(self):
+        frames = iter(self.frames)
+        wall_start = time.perf_counter()
+        tasks = []
+
+        while True:
+            with self.stats.stage('load'):
+                item = next(frames, None)
+            if item is None:
+                break
+
+            received, channel, event = item
+            if self.stats.first is None:
+                self.stats.first = received
+                self.clock.now = received
+                tasks = [asyncio.ensure_future(self._sync_periodically()),
+                         asyncio.ensure_future(self._sample_periodically())]
+                await self._settle()
+            self.stats.last = received
+
+            if self.realtime:
+                delay = (received - self.stats.first) / self.speed - (time.perf_counter() - wall_start)
+                if delay > 0:
+                    time.sleep(delay)
+
+            await self._advance(received)
+
+            if channel == USER:
+                if self.include_user:
+                    self.stats.user_frames += 1
+                    with self.stats.stage('user'):
+                        process_user_data(event)
+                    await self._settle()
+                continue
+
+            self.stats.events += 1
+            with self.stats.stage('book'):
+                try:
+                    process_data(event)
+                except Exception as ex:
+                    # Live, this drops the websocket; here the event is skipped
+                    self.stats.errors += 1
+                    print(f"Error processing {event.get('event_type')} event: {ex}")
+
+            with self.stats.stage('fills'):
+                if event.get('event_type') == 'last_trade_price':
+                    self.client.match_trade(event)
+                elif event.get('market') is not None:
+                    self.client.match(event['market'])
+
+            await self._settle()
+
+        # Let the evaluations and user frames still in flight at the end of the capture finish
+        while self.in_flight or self.client.next_frame_time() is not None:
+            next_time = min(t for t in (self.loop.next_timer(), self.client.next_frame_time()) if t is not None)
+            await self._advance(next_time)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.stats.wall = time.perf_counter() - wall_start
+
+    def run(self):
+        """
+        Replay every frame and return the summary.
+
+        The bot's own logging is silenced unless verbose, since writing it out
+        would dominate the measurement.
+
+        Returns:
+            dict: ReplayStats summary
+        """
+        perform_trade = data_processing.perform_trade
+        data_processing.perform_trade = lambda market: self._evaluate(perform_trade, market)
+
+        # Market locks are bound to the loop that created them
+        trading.market_locks.clear()
+        global_state.client = self.client
+        self.client.register_markets(global_state.markets)
+        self.clock.install()
+
+        try:
+            with contextlib.redirect_stdout(sys.stdout if self.verbose else open(os.devnull, 'w')):
+                asyncio.set_event_loop(self.loop)
+                self.loop.run_until_complete(self._replay())
+        finally:
+            asyncio.set_event_loop(None)
+            self.loop.close()
+            self.clock.uninstall()
+            data_processing.perform_trade = perform_trade
+
+        return self.stats.summary(self.client)
@@ -0,0 +1,214 @@
+from collections import defaultdict
+
+import pandas as pd
+
+import poly_data.global_state as global_state
+
+# Address the simulated account trades from, so fills are recognised as ours
+SIM_WALLET = '0x000000000000000000000000000000000000dEaD'
+
+# Seconds between an order action and the user frame reporting it
+USER_LATENCY = 0.1
+
+# Tolerance for comparing prices built from 1 - price
+EPSILON = 1e-9
+
+
+class SimClient:
+    """
+    Stands in for PolymarketClient during a replay.
+
+    Orders rest in memory and fill against the replayed token1 book: a resting
+    order fills as far as the book trades through its price, or when a replayed
+    trade prints at or through it. Token2 orders are matched against the
+    complement of the token1 book, the way the bot prices them. Fills are
+    optimistic (no queue position) and only reduce the order, not the book.
+
+    Every placement and fill is reported back as the user frame the live user
+    websocket would send, USER_LATENCY seconds later, so the bot's own order and
+    position tracking runs unchanged.
+
+    books defaults to global_state.all_data, the books the bot itself keeps;
+    the local stand-in exchange passes its own. With fills=False orders rest
+    and never fill.
+    """
+
+    def __init__(self, clock, latency=USER_LATENCY, books=None, fills=True):
+        self.browser_wallet = SIM_WALLET
+        self.clock = clock
+        self.latency = latency
+        self.books = books
+        self.fills = fills
+
+        self.tokens = {}
+        self.orders = {}
+        self.positions = {}
+        self.outbox = []
+        # USDC paid (negative) or received on fills
+        self.cash = 0.0
+
+        self.next_id = 0
+        self.actions = defaultdict(lambda: defaultdict(int))
+        self.filled = defaultdict(float)
+
+    def register_markets(self, markets):
+        """Map each token of the configured markets to (condition ID, outcome, is token2)."""
+        for market, row in markets.items():
+            self.tokens[str(row['token1'])] = (market, row['answer1'], False)
+            self.tokens[str(row['token2'])] = (market, row['answer2'], True)
+
+    def _id(self, prefix):
+        self.next_id += 1
+        return f"sim-{prefix}-{self.next_id}"
+
+    def _send(self, frame):
+        self.outbox.append((self.clock.now + self.latency, frame))
+
+    def take_frames(self, until):
+        """Remove and return the user frames due by the given virtual time."""
+        due = [frame for at, frame in self.outbox if at <= until]
+        self.outbox = [(at, frame) for at, frame in self.outbox if at > until]
+        return due
+
+    def next_frame_time(self):
+        return min((at for at, _ in self.outbox), default=None)
+
+    # ------- Order entry -------
+
+    def create_order(self, marketId, action, price, size, neg_risk=False):
+        token = str(marketId)
+        market, outcome, _ = self.tokens[token]
+        order_id = self._id('order')
+
+        self.orders[order_id] = {'id': order_id, 'token': token, 'market': market, 'outcome': outcome,
+                                 'side': action, 'price': float(price), 'size': float(size), 'matched': 0.0}
+        self.actions[market]['create'] += 1
+        self._send(self._order_frame(self.orders[order_id], 'PLACEMENT'))
+
+        # A marketable order fills right away
+        self.match(market)
+        return {'success': True, 'orderID': order_id}
+
+    def cancel_all_asset(self, asset_id):
+        token = str(asset_id)
+        for order_id in [o for o, order in self.orders.items() if order['token'] == token]:
+            del self.orders[order_id]
+
+        if token in self.tokens:
+            self.actions[self.tokens[token][0]]['cancel'] += 1
+
+    def cancel_all_market(self, marketId):
+        for order_id in [o for o, order in self.orders.items() if order['market'] == marketId]:
+            del self.orders[order_id]
+        self.actions[marketId]['cancel'] += 1
+
+    def merge_positions(self, amount_to_merge, condition_id, is_neg_risk_market):
+        amount = amount_to_merge / 10**6
+        for token, (market, _, _) in self.tokens.items():
+            if market == condition_id and token in self.positions:
+                self.positions[token]['size'] -= amount
+        self.actions[condition_id]['merge'] += 1
+
+    # ------- Account queries -------
+
+    def get_position(self, tokenId):
+        shares = self.positions.get(str(tokenId), {'size': 0})['size']
+        raw_position = int(round(shares * 10**6))
+        return raw_position, (shares if shares >= 1 else 0)
+
+    def get_all_positions(self):
+        rows = [{'asset': token, 'size': p['size'], 'avgPrice': p['avgPrice']}
+                for token, p in self.positions.items() if p['size'] > 0]
+        return pd.DataFrame(rows, columns=['asset', 'size', 'avgPrice'])
+
+    def get_all_orders(self):
+        rows = [{'id': o['id'], 'asset_id': o['token'], 'market': o['market'], 'side': o['side'],
+                 'price': o['price'], 'original_size': o['size'], 'size_matched': o['matched']}
+                for o in self.orders.values()]
+        return pd.DataFrame(rows, columns=['id', 'asset_id', 'market', 'side', 'price', 'original_size', 'size_matched'])
+
+    def get_order_books(self, markets):
+        # Books only come from the capture
+        return {}
+
+    # ------- Matching -------
+
+    def _order_frame(self, order, kind):
+        return {'event_type': 'order', 'type': kind, 'id': order['id'], 'market': order['market'],
+                'asset_id': order['token'], 'side': order['side'], 'outcome': order['outcome'],
+                'price': str(order['price']), 'original_size': str(order['size']),
+                'size_matched': str(order['matched']), 'status': 'LIVE'}
+
+    def _available(self, order, book):
+        # Token1 liquidity that trades through the order, translated to the order's token
+        _, _, is_token2 = self.tokens[order['token']]
+        price = 1 - order['price'] if is_token2 else order['price']
+
+        # Buying token1, or selling token2, takes token1 asks; the other two take bids
+        if (order['side'] == 'BUY') != is_token2:
+            return sum(size for level, size in book['asks'].items() if level <= price + EPSILON)
+        return sum(size for level, size in book['bids'].items() if level >= price - EPSILON)
+
+    def _fill(self, order, size):
+        size = min(size, order['size'] - order['matched'])
+        if size <= 0:
+            return
+
+        order['matched'] += size
+        token, price = order['token'], order['price']
+        signed = size if order['side'] == 'BUY' else -size
+
+        position = self.positions.setdefault(token, {'size': 0.0, 'avgPrice': 0.0})
+        if signed > 0:
+            total = position['size'] + signed
+            position['avgPrice'] = (position['avgPrice'] * position['size'] + price * signed) / total if total > 0 else price
+        position['size'] += signed
+        self.cash -= signed * price
+
+        self.filled[order['market']] += size
+        self.actions[order['market']]['fill'] += 1
+
+        # We are the maker; the taker traded the other side of the same outcome
+        trade_id = self._id('trade')
+        trade = {'event_type': 'trade', 'id': trade_id, 'market': order['market'], 'asset_id': token,
+                 'side': 'SELL' if order['side'] == 'BUY' else 'BUY', 'outcome': order['outcome'],
+                 'price': str(price), 'size': str(size),
+                 'maker_orders': [{'maker_address': self.browser_wallet, 'matched_amount': str(size),
+                                   'price': str(price), 'outcome': order['outcome']}]}
+        self._send({**trade, 'status': 'MATCHED'})
+        self._send(self._order_frame(order, 'UPDATE'))
+        self._send({**trade, 'status': 'CONFIRMED'})
+
+        if order['matched'] >= order['size'] - EPSILON:
+            del self.orders[order['id']]
+
+    def match(self, market):
+        """Fill the resting orders of a market against its current replayed book."""
+        books = global_state.all_data if self.books is None else self.books
+        book = books.get(market)
+        if book is None or not self.fills:
+            return
+
+        for order in [o for o in self.orders.values() if o['market'] == market]:
+            available = self._available(order, book)
+            if available > 0:
+                self._fill(order, available)
+
+    def match_trade(self, event):
+        """Fill resting orders a replayed last_trade_price print traded at or through."""
+        if not self.fills:
+            return
+
+        market = event.get('market')
+        price, size = float(event['price']), float(event['size'])
+
+        for order in [o for o in self.orders.values() if o['market'] == market]:
+            _, _, is_token2 = self.tokens[order['token']]
+            order_price = 1 - order['price'] if is_token2 else order['price']
+            buys_token1 = (order['side'] == 'BUY') != is_token2
+
+            # A seller hitting at or below our bid, or a buyer lifting at or above our ask
+            if buys_token1 and event['side'] == 'SELL' and price <= order_price + EPSILON:
+                self._fill(order, size)
+            elif not buys_token1 and event['side'] == 'BUY' and price >= order_price - EPSILON:
+                self._fill(order, size)
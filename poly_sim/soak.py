@@ -0,0 +1,116 @@
+"""
+Soak test the bot against the local stand-in exchange.
+
+Starts poly_sim.exchange with a generated config, runs main.py against it with
+SOAK_MONITOR on for the given number of hours, then prints the growth of
+memory, tasks and the bot's structures.
+
+Usage:
+    python -m poly_sim.soak [--hours H] [--markets N] [--rate R] [--fill cross|none]
+                            [--interval SECONDS] [--workdir DIR]
+"""
+import os
+import sys
+import glob
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+
+from poly_sim.exchange import HTTP_PORT, WS_PORT
+from poly_sim.sim_client import SIM_WALLET
+from poly_data.soak_monitor import print_report
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Never funded; orders are signed with it only so the client can build them
+TEST_KEY = '0x' + '11' * 32
+
+
+def _wait_for_port(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def run_soak(hours, markets, rate, fill, interval, workdir, http_port=HTTP_PORT, ws_port=WS_PORT):
+    """
+    Run the exchange and the bot for `hours`, returning the soak sample file.
+
+    Everything the bot writes (state, risk files, logs, samples) goes to
+    workdir, so a soak never touches the live bot's files.
+    """
+    config = os.path.join(workdir, 'config.db')
+    soak_dir = os.path.join(workdir, 'soak')
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [REPO, os.getenv('PYTHONPATH')]))}
+
+    exchange_log = open(os.path.join(workdir, 'exchange.log'), 'w')
+    exchange = subprocess.Popen(
+        [sys.executable, '-m', 'poly_sim.exchange', '--markets', str(markets), '--rate', str(rate), '--fill', fill,
+         '--http-port', str(http_port), '--ws-port', str(ws_port), '--write-config', config],
+        cwd=workdir, env=env, stdout=exchange_log, stderr=subprocess.STDOUT)
+
+    bot = None
+    try:
+        if not _wait_for_port(http_port) or not _wait_for_port(ws_port):
+            raise SystemExit(f"Stand-in exchange did not start, see {exchange_log.name}")
+
+        bot_env = {**env,
+                   'CLOB_HOST': f"http://127.0.0.1:{http_port}", 'DATA_API_HOST': f"http://127.0.0.1:{http_port}",
+                   'POLYGON_RPC': f"http://127.0.0.1:{http_port}/rpc", 'WS_HOST': f"ws://127.0.0.1:{ws_port}",
+                   'CONFIG_BACKEND': 'sqlite', 'CONFIG_DB': config,
+                   'UNIVERSE_DIR': os.path.join(workdir, 'universe'), 'RECORD_FEED': '0',
+                   'PK': TEST_KEY, 'BROWSER_ADDRESS': SIM_WALLET,
+                   'SOAK_MONITOR': '1', 'SOAK_DIR': soak_dir, 'SOAK_INTERVAL': str(interval)}
+
+        bot_log = open(os.path.join(workdir, 'bot.log'), 'w')
+        bot = subprocess.Popen([sys.executable, os.path.join(REPO, 'main.py')],
+                               cwd=workdir, env=bot_env, stdout=bot_log, stderr=subprocess.STDOUT)
+        print(f"Soaking {markets} markets at {rate:.0f} messages/s for {hours:g} hours in {workdir}")
+
+        deadline = time.time() + hours * 3600
+        while time.time() < deadline:
+            time.sleep(min(10, max(deadline - time.time(), 0)))
+            if bot.poll() is not None:
+                print(f"The bot exited with code {bot.returncode}, see {bot_log.name}")
+                break
+            if exchange.poll() is not None:
+                print(f"The stand-in exchange exited with code {exchange.returncode}, see {exchange_log.name}")
+                break
+    finally:
+        for process in (bot, exchange):
+            if process is not None and process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    samples = sorted(glob.glob(os.path.join(soak_dir, 'soak-*.jsonl')))
+    return samples[-1] if samples else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Soak test the bot against the local stand-in exchange")
+    parser.add_argument('--hours', type=float, default=4)
+    parser.add_argument('--markets', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=200.0, help="Market websocket messages per second")
+    parser.add_argument('--fill', choices=['cross', 'none'], default='cross')
+    parser.add_argument('--interval', type=float, default=60, help="Seconds between soak samples")
+    parser.add_argument('--workdir', help="Directory for the run's files, a new temporary one by default")
+    parser.add_argument('--skip', type=float, default=10, help="Minutes of warm-up to leave out of the report")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='soak-')
+    os.makedirs(workdir, exist_ok=True)
+
+    path = run_soak(args.hours, args.markets, args.rate, args.fill, args.interval, workdir)
+    if path is None:
+        raise SystemExit("No soak samples were written")
+    print_report(path, args.skip * 60)
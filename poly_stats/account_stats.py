@@ -3,7 +3,8 @@ from py_clob_client.headers.headers import create_level_2_headers
 from py_clob_client.clob_types import RequestArgs
 
 from poly_utils.google_utils import get_spreadsheet
-from gspread_dataframe import set_with_dataframe
+from poly_utils.sheet_sink import SheetSink
+from poly_utils.endpoints import REWARDS_HOST
 import requests
 import json
 import os
@@ -75,7 +76,7 @@ def combine_dfs(orders_df, positions, markets_df, selected_df):
 def get_earnings(client):
     args = RequestArgs(method='GET', request_path='/rewards/user/markets')
     l2Headers = create_level_2_headers(client.signer, client.creds, args)
-    url = "https://polymarket.com/api/rewards/markets"
+    url = f"{REWARDS_HOST}/api/rewards/markets"
 
     cursor = ''
     markets = []
@@ -130,8 +131,6 @@ def update_stats_once(client):
 
         combined_df = combined_df.sort_values('earnings', ascending=False)
         combined_df = combined_df[['question', 'answer', 'order_size', 'position_size', 'marketInSelected', 'earnings', 'earning_percentage']]
-        wk_summary.clear()
-
-        set_with_dataframe(wk_summary, combined_df, include_index=False, include_column_header=True, resize=True)
+        SheetSink(wk_summary).write(combined_df)
     else:
         print("Position or order is empty")
\ No newline at end of file
@@ -0,0 +1,87 @@
+from collections import namedtuple
+
+import numpy as np
+import requests
+
+from poly_utils.endpoints import CLOB_HOST
+
+# Maximum number of tokens requested per call to the batch books endpoint
+BOOKS_BATCH_SIZE = 100
+
+# Order book held as four float arrays. Both sides are ordered with the best
+# price last, the same way the API returns them: bids ascending, asks descending.
+CompactBook = namedtuple('CompactBook', ['bid_prices', 'bid_sizes', 'ask_prices', 'ask_sizes'])
+
+
+def _side_arrays(levels, descending):
+    prices = np.fromiter((float(l['price']) for l in levels), dtype=np.float64, count=len(levels))
+    sizes = np.fromiter((float(l['size']) for l in levels), dtype=np.float64, count=len(levels))
+
+    order = np.argsort(prices, kind='stable')
+    if descending:
+        order = order[::-1]
+    return prices[order], sizes[order]
+
+
+def parse_book(raw):
+    """
+    Convert an order book from the API into a CompactBook.
+
+    Args:
+        raw (dict): Book with 'bids' and 'asks' lists of {'price', 'size'} entries
+
+    Returns:
+        CompactBook: The book as float arrays, best price last on each side
+    """
+    bid_prices, bid_sizes = _side_arrays(raw.get('bids') or [], descending=False)
+    ask_prices, ask_sizes = _side_arrays(raw.get('asks') or [], descending=True)
+    return CompactBook(bid_prices, bid_sizes, ask_prices, ask_sizes)
+
+
+def best_bid(book):
+    """Return the best bid price of a CompactBook, or 0 if there are no bids."""
+    return book.bid_prices[-1] if len(book.bid_prices) else 0
+
+
+def best_ask(book):
+    """Return the best ask price of a CompactBook, or 0 if there are no asks."""
+    return book.ask_prices[-1] if len(book.ask_prices) else 0
+
+
+def chunks(token_ids, size=BOOKS_BATCH_SIZE):
+    """Split token IDs into batches for the books endpoint."""
+    token_ids = [str(t) for t in token_ids]
+    return [token_ids[i:i + size] for i in range(0, len(token_ids), size)]
+
+
+def books_request_body(token_ids):
+    """Build the JSON body of a POST /books request."""
+    return [{'token_id': t} for t in token_ids]
+
+
+def parse_books_response(response):
+    """Parse a POST /books response into {token_id: CompactBook}."""
+    return {str(raw['asset_id']): parse_book(raw) for raw in response}
+
+
+def fetch_books(token_ids, host=CLOB_HOST, session=None):
+    """
+    Fetch many order books with as few requests as possible.
+
+    Args:
+        token_ids (list): Token IDs to fetch
+        host (str, optional): CLOB API host
+        session (requests.Session, optional): Session to reuse connections from
+
+    Returns:
+        dict: {token_id: CompactBook}
+    """
+    http = session or requests
+    books = {}
+
+    for batch in chunks(token_ids):
+        response = http.post(f"{host}/books", json=books_request_body(batch), timeout=30)
+        response.raise_for_status()
+        books.update(parse_books_response(response.json()))
+
+    return books
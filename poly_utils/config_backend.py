@@ -0,0 +1,239 @@
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+from gspread.utils import numericise_all
+from dotenv import load_dotenv
+
+from poly_utils.google_utils import get_spreadsheet
+
+load_dotenv()
+
+
+def values_to_records(values):
+    """Convert a header row plus data rows into records, the same way gspread's get_all_records does."""
+    if not values:
+        return []
+
+    headers = values[0]
+    records = []
+    for row in values[1:]:
+        row = list(row) + [''] * (len(headers) - len(row))
+        records.append(dict(zip(headers, numericise_all(row[:len(headers)]))))
+    return records
+
+
+class ConfigBackend:
+    """
+    Source of the Selected Markets, All Markets and Hyperparameters worksheets.
+
+    Backends return worksheets as lists of records (the same shape as gspread's
+    get_all_records) together with a content hash that changes whenever any of
+    the requested worksheets change.
+    """
+
+    def fetch(self, titles):
+        """
+        Fetch several worksheets.
+
+        Args:
+            titles (list): Worksheet titles to fetch
+
+        Returns:
+            tuple: ({title: records}, content hash)
+        """
+        raise NotImplementedError
+
+    def worksheet(self, title):
+        """Return an object with get_all_records() for code that expects a spreadsheet."""
+        return _BackendWorksheet(self, title)
+
+
+class _BackendWorksheet:
+    def __init__(self, backend, title):
+        self.backend = backend
+        self.title = title
+
+    def get_all_records(self):
+        records, _ = self.backend.fetch([self.title])
+        return records[self.title]
+
+
+class GoogleSheetsBackend(ConfigBackend):
+    """Reads the configuration from the Google Spreadsheet at SPREADSHEET_URL."""
+
+    def __init__(self, read_only=None):
+        """
+        Args:
+            read_only (bool): If None, auto-detects based on credentials availability
+        """
+        self.read_only = read_only
+        self._spreadsheet = None
+
+    def spreadsheet(self):
+        """Open the spreadsheet, reusing the connection between calls."""
+        if self._spreadsheet is not None:
+            return self._spreadsheet
+
+        read_only = self.read_only
+
+        # Auto-detect read-only mode if not specified
+        if read_only is None:
+            creds_file = 'credentials.json' if os.path.exists('credentials.json') else '../credentials.json'
+            read_only = not os.path.exists(creds_file)
+            if read_only:
+                print("No credentials found, using read-only mode")
+
+        try:
+            self._spreadsheet = get_spreadsheet(read_only=read_only)
+        except FileNotFoundError:
+            print("No credentials found, falling back to read-only mode")
+            self._spreadsheet = get_spreadsheet(read_only=True)
+
+        return self._spreadsheet
+
+    def fetch(self, titles):
+        spreadsheet = self.spreadsheet()
+
+        if hasattr(spreadsheet, 'values_batch_get'):
+            response = spreadsheet.values_batch_get([f"'{title}'" for title in titles])
+            values = [vr.get('values', []) for vr in response['valueRanges']]
+            content_hash = hashlib.sha1(json.dumps(values).encode()).hexdigest()
+            return {title: values_to_records(v) for title, v in zip(titles, values)}, content_hash
+
+        # The public CSV export has no batch endpoint
+        records = {title: spreadsheet.worksheet(title).get_all_records() for title in titles}
+        content_hash = hashlib.sha1(json.dumps(records, sort_keys=True, default=str).encode()).hexdigest()
+        return records, content_hash
+
+    def worksheet(self, title):
+        return self.spreadsheet().worksheet(title)
+
+
+class SQLiteConfigBackend(ConfigBackend):
+    """
+    Local configuration stored in a SQLite file.
+
+    Each worksheet is stored as one row holding its header and data rows as JSON,
+    plus a revision number that is bumped on every write. Parsed records are kept
+    in memory and only reloaded when the database file's modification time
+    changes, so reads cost a couple of stat calls.
+    """
+
+    def __init__(self, path='config.db'):
+        """
+        Args:
+            path (str, optional): SQLite database file, defaults to 'config.db'
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._worksheets = {}
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS worksheets ("
+                "title TEXT PRIMARY KEY, header TEXT NOT NULL, rows TEXT NOT NULL, "
+                "revision INTEGER NOT NULL, updated REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _file_stamp(self):
+        stamp = []
+        for path in [self.path, self.path + '-wal']:
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _reload(self):
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+
+        worksheets = {}
+        with self._connect() as conn:
+            for title, header, rows, revision in conn.execute("SELECT title, header, rows, revision FROM worksheets"):
+                header = json.loads(header)
+                records = [dict(zip(header, row)) for row in json.loads(rows)]
+                worksheets[title] = (records, revision)
+
+        self._worksheets = worksheets
+        self._stamp = stamp
+        print(f"Loaded config from {self.path}: " + ", ".join(f"{t} (rev {r})" for t, (_, r) in worksheets.items()))
+
+    def fetch(self, titles):
+        with self._lock:
+            self._reload()
+            records = {title: self._worksheets.get(title, ([], 0))[0] for title in titles}
+            content_hash = ','.join(f"{title}:{self._worksheets.get(title, ([], 0))[1]}" for title in titles)
+        return records, content_hash
+
+    def write_worksheet(self, title, df):
+        """
+        Replace a worksheet's contents with a DataFrame.
+
+        Args:
+            title (str): Worksheet title
+            df (DataFrame): New contents; the columns become the header
+        """
+        header = [str(c) for c in df.columns]
+        rows = df.astype(object).where(pd.notna(df), '').values.tolist()
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO worksheets (title, header, rows, revision, updated) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT(title) DO UPDATE SET header = excluded.header, rows = excluded.rows, "
+                "revision = worksheets.revision + 1, updated = excluded.updated",
+                (title, json.dumps(header), json.dumps(rows, default=str), time.time())
+            )
+
+
+def get_config_backend():
+    """
+    Create the configuration backend selected by the CONFIG_BACKEND environment variable.
+
+    CONFIG_BACKEND=sqlite reads from the SQLite file at CONFIG_DB (default 'config.db').
+    Anything else, including leaving it unset, uses Google Sheets.
+    """
+    if os.getenv('CONFIG_BACKEND', 'sheets').lower() == 'sqlite':
+        return SQLiteConfigBackend(os.getenv('CONFIG_DB', 'config.db'))
+    return GoogleSheetsBackend()
+
+
+if __name__ == '__main__':
+    # python -m poly_utils.config_backend sync                 copy the config worksheets from Google Sheets
+    # python -m poly_utils.config_backend load <title> <csv>   replace one worksheet with a CSV file
+    local = SQLiteConfigBackend(os.getenv('CONFIG_DB', 'config.db'))
+
+    if len(sys.argv) >= 2 and sys.argv[1] == 'sync':
+        sheets = GoogleSheetsBackend()
+        for title in ['Selected Markets', 'All Markets', 'Hyperparameters']:
+            records = sheets.worksheet(title).get_all_records()
+            local.write_worksheet(title, pd.DataFrame(records))
+            print(f"Copied {len(records)} rows of {title}")
+    elif len(sys.argv) == 4 and sys.argv[1] == 'load':
+        with open(sys.argv[3], newline='') as f:
+            values = list(csv.reader(f))
+        df = pd.DataFrame(values_to_records(values), columns=values[0] if values else [])
+        local.write_worksheet(sys.argv[2], df)
+        print(f"Loaded {len(df)} rows into {sys.argv[2]}")
+    else:
+        print("Usage: python -m poly_utils.config_backend sync | load <title> <csv>")
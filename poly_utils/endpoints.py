@@ -0,0 +1,15 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Service endpoints, overridable so the bot can run against a local stand-in
+# (see poly_sim/exchange.py) instead of Polymarket and Polygon
+CLOB_HOST = os.getenv('CLOB_HOST', 'https://clob.polymarket.com').rstrip('/')
+WS_HOST = os.getenv('WS_HOST', 'wss://ws-subscriptions-clob.polymarket.com').rstrip('/')
+DATA_API_HOST = os.getenv('DATA_API_HOST', 'https://data-api.polymarket.com').rstrip('/')
+POLYGON_RPC = os.getenv('POLYGON_RPC', 'https://polygon-rpc.com')
+
+# polymarket.com itself, which serves the rewards earnings read by poly_stats
+REWARDS_HOST = os.getenv('REWARDS_HOST', 'https://polymarket.com').rstrip('/')
@@ -0,0 +1,135 @@
+import os
+import sys
+import glob
+import time
+
+import numpy as np
+import pandas as pd
+
+# Root of the local price history store
+HISTORY_DIR = 'data/history'
+
+# One record per price point: unix timestamp in seconds and price
+RECORD = np.dtype([('t', '<i8'), ('p', '<f8')])
+
+
+def _partition(t):
+    # Month partition a timestamp falls in, e.g. '2024-11'
+    return time.strftime('%Y-%m', time.gmtime(int(t)))
+
+
+class PriceHistoryStore:
+    """
+    Append-only price history per token, partitioned by month.
+
+    Each token has a directory holding one flat binary file of RECORD entries per
+    month, sorted by timestamp. New points are appended to the end of the latest
+    file, and reads memory-map only the partitions that overlap the requested
+    range, so neither path touches the full history.
+    """
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+        self._last = {}
+
+    def _token_dir(self, token):
+        return os.path.join(self.root, str(token))
+
+    def _partitions(self, token):
+        return sorted(glob.glob(os.path.join(self._token_dir(token), '*.bin')))
+
+    def last_timestamp(self, token):
+        """Return the timestamp of the newest stored point of a token, or None if there are none."""
+        token = str(token)
+        if token not in self._last:
+            last = None
+            for path in reversed(self._partitions(token)):
+                size = os.path.getsize(path) // RECORD.itemsize
+                if size:
+                    last = int(np.memmap(path, dtype=RECORD, mode='r', offset=(size - 1) * RECORD.itemsize, shape=(1,))['t'][0])
+                    break
+            self._last[token] = last
+        return self._last[token]
+
+    def append(self, token, history):
+        """
+        Append the points of a prices-history response that are newer than the stored ones.
+
+        Args:
+            token (str): Token ID
+            history (list): Points as {'t': seconds, 'p': price} dicts
+
+        Returns:
+            int: Number of points appended
+        """
+        token = str(token)
+        last = self.last_timestamp(token)
+
+        records = np.array([(int(h['t']), float(h['p'])) for h in history], dtype=RECORD)
+        records = records[np.argsort(records['t'], kind='stable')]
+        if last is not None:
+            records = records[records['t'] > last]
+        if not len(records):
+            return 0
+
+        # Drop repeated timestamps within the response, keeping the first
+        records = records[np.concatenate([[True], np.diff(records['t']) > 0])]
+
+        directory = self._token_dir(token)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        months = np.array([_partition(t) for t in records['t']])
+        for month in np.unique(months):
+            with open(os.path.join(directory, month + '.bin'), 'ab') as f:
+                f.write(records[months == month].tobytes())
+
+        self._last[token] = int(records['t'][-1])
+        return len(records)
+
+    def read(self, token, start=None, end=None):
+        """
+        Read a token's stored points with start <= t < end.
+
+        Args:
+            token (str): Token ID
+            start (int, optional): First timestamp, in seconds
+            end (int, optional): Timestamp to stop before, in seconds
+
+        Returns:
+            ndarray: RECORD entries sorted by timestamp
+        """
+        parts = []
+        for path in self._partitions(token):
+            month = os.path.basename(path)[:-4]
+            if start is not None and month < _partition(start):
+                continue
+            if end is not None and month > _partition(end):
+                break
+            if not os.path.getsize(path):
+                continue
+
+            data = np.memmap(path, dtype=RECORD, mode='r')
+            lo = np.searchsorted(data['t'], start, side='left') if start is not None else 0
+            hi = np.searchsorted(data['t'], end, side='left') if end is not None else len(data)
+            parts.append(np.array(data[lo:hi]))
+
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD)
+
+    def read_df(self, token, start=None, end=None):
+        """Same as read, as a DataFrame with 't' and 'p' columns."""
+        records = self.read(token, start, end)
+        return pd.DataFrame({'t': records['t'], 'p': records['p']})
+
+
+if __name__ == '__main__':
+    # python -m poly_utils.price_history import [data/*.csv]   move old per-token CSV files into the store
+    if len(sys.argv) >= 2 and sys.argv[1] == 'import':
+        store = PriceHistoryStore()
+        for path in sys.argv[2:] or glob.glob('data/*.csv'):
+            df = pd.read_csv(path)
+            df['t'] = pd.to_datetime(df['t']).astype('int64') // 10 ** 9
+            token = os.path.basename(path)[:-4]
+            print(f"{token}: {store.append(token, df.to_dict('records'))} points")
+    else:
+        print("Usage: python -m poly_utils.price_history import [csv files]")
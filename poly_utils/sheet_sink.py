@@ -0,0 +1,160 @@
+import os
+import json
+import time
+from numbers import Real
+
+import pandas as pd
+from gspread.utils import rowcol_to_a1
+
+# Local copies of what was last written to each worksheet
+SINK_DIR = 'state/sheets'
+
+# Rewrite the whole worksheet at least this often, in case it was edited by hand
+FULL_WRITE_INTERVAL = 24 * 60 * 60
+
+# Changed cells in a row separated by at most this many unchanged cells are sent as one range
+MAX_GAP = 3
+
+
+def _cell(value):
+    # Same representation set_with_dataframe sends, made JSON-serializable
+    if pd.isnull(value) is True:
+        return ''
+    if isinstance(value, Real):
+        return value.item() if hasattr(value, 'item') else value
+    value = str(value)
+    return "'" + value if value.startswith("'") else value
+
+
+def to_grid(df):
+    """Convert a DataFrame to rows of cell values, header first."""
+    grid = [[_cell(c) for c in df.columns]]
+    grid += [[_cell(v) for v in row] for row in df.itertuples(index=False, name=None)]
+    # Round trip through JSON so values compare equal to the ones loaded from disk
+    return json.loads(json.dumps(grid))
+
+
+def _row_runs(new_row, old_row, width):
+    # Column spans [start, end) of the changed cells of one row
+    runs = []
+    for c in range(width):
+        new = new_row[c] if c < len(new_row) else ''
+        old = old_row[c] if c < len(old_row) else ''
+        if new == old:
+            continue
+        if runs and c - runs[-1][1] <= MAX_GAP:
+            runs[-1][1] = c + 1
+        else:
+            runs.append([c, c + 1])
+    return runs
+
+
+def changed_ranges(new, old):
+    """
+    Find the rectangular ranges of a grid that differ from the previous one.
+
+    Cells that were in the old grid but not in the new one are blanked. Changed
+    runs in consecutive rows that cover the same columns are merged into one range.
+
+    Returns:
+        list: (first row, first col, last row, last col) tuples, 0-based and inclusive
+    """
+    height = max(len(new), len(old))
+    width = max([len(r) for r in new] + [len(r) for r in old] + [0])
+
+    ranges = []
+    open_ranges = {}
+    for r in range(height):
+        new_row = new[r] if r < len(new) else []
+        old_row = old[r] if r < len(old) else []
+
+        still_open = {}
+        for start, end in _row_runs(new_row, old_row, width):
+            first_row = open_ranges.pop((start, end), r)
+            still_open[(start, end)] = first_row
+
+        for (start, end), first_row in open_ranges.items():
+            ranges.append((first_row, start, r - 1, end - 1))
+        open_ranges = still_open
+
+    for (start, end), first_row in open_ranges.items():
+        ranges.append((first_row, start, height - 1, end - 1))
+
+    return ranges
+
+
+class SheetSink:
+    """
+    Writes DataFrames to a worksheet, sending only the cells that changed.
+
+    The last written grid is kept in a local JSON file, so a write is a diff
+    against it followed by one batched values update. The first write, and one
+    every FULL_WRITE_INTERVAL, rewrites the whole worksheet and resizes it.
+    """
+
+    def __init__(self, worksheet, state_dir=SINK_DIR):
+        self.worksheet = worksheet
+        key = f"{getattr(worksheet, 'spreadsheet_id', '')}_{getattr(worksheet, 'id', worksheet.title)}"
+        self.path = os.path.join(state_dir, key + '.json')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except Exception:
+            return None
+        if time.time() - state['time'] > FULL_WRITE_INTERVAL:
+            return None
+        return state
+
+    def _save(self, grid, written_at, size):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'time': written_at, 'size': size, 'grid': grid}, f)
+        os.replace(tmp_path, self.path)
+
+    def write(self, df):
+        """
+        Write a DataFrame, with its column names as the first row.
+
+        Returns:
+            int: Number of cells sent
+        """
+        grid = to_grid(df)
+        height, width = len(grid), len(grid[0])
+        state = self._load()
+
+        if state is None:
+            # Full rewrite: size the sheet to the data so nothing stale is left behind
+            self.worksheet.resize(height, width)
+            ranges = [(0, 0, height - 1, width - 1)] if height else []
+            old, written_at, size = [], time.time(), [height, width]
+        else:
+            old, written_at, size = state['grid'], state['time'], state['size']
+            ranges = changed_ranges(grid, old)
+
+            # Only grow the sheet; cells beyond the new data are blanked instead
+            if height > size[0] or width > size[1]:
+                size = [max(height, size[0]), max(width, size[1])]
+                self.worksheet.resize(*size)
+
+        data = []
+        cells = 0
+        for r0, c0, r1, c1 in ranges:
+            values = [[(grid[r][c] if r < height and c < len(grid[r]) else '') for c in range(c0, c1 + 1)]
+                      for r in range(r0, r1 + 1)]
+            data.append({'range': f"{rowcol_to_a1(r0 + 1, c0 + 1)}:{rowcol_to_a1(r1 + 1, c1 + 1)}", 'values': values})
+            cells += (r1 - r0 + 1) * (c1 - c0 + 1)
+
+        if data:
+            self.worksheet.batch_update(data, raw=False)
+
+        self._save(grid, written_at, size)
+        print(f"Wrote {cells} cells in {len(data)} ranges to {self.worksheet.title}")
+        return cells
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import shutil
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Directory shared by update_markets.py (writer) and main.py (reader)
+UNIVERSE_DIR = os.getenv('UNIVERSE_DIR', 'data/universe')
+
+# Readers ignore a universe older than this and fall back to the sheet
+MAX_UNIVERSE_AGE = 2 * 60 * 60
+
+# Number of versions kept on disk, so a reader never loses the version it is mapping
+KEEP_VERSIONS = 3
+
+
+def _column_array(series):
+    # Numbers keep their dtype; booleans are stored the way the sheet shows them,
+    # and everything else as fixed-width unicode so it can be memory-mapped
+    if series.dtype == bool:
+        return np.where(series.values, 'TRUE', 'FALSE')
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return series.to_numpy()
+    values = ['' if pd.isnull(v) is True else str(v) for v in series]
+    return np.array(values, dtype=str) if values else np.zeros(0, dtype='<U1')
+
+
+def write_universe(df, root=UNIVERSE_DIR):
+    """
+    Publish the All Markets table as a new version of the local universe.
+
+    Each column is saved as its own .npy file in a new version directory with a
+    manifest. The CURRENT file is then switched to that version atomically, so a
+    reader always sees a complete version.
+
+    Returns:
+        str: The new version
+    """
+    version = int(time.time() * 1000)
+    while os.path.exists(os.path.join(root, str(version))):
+        version += 1
+    version = str(version)
+
+    directory = os.path.join(root, version)
+    os.makedirs(directory)
+
+    columns = []
+    for n, col in enumerate(df.columns):
+        filename = f"{n}.npy"
+        np.save(os.path.join(directory, filename), _column_array(df[col]))
+        columns.append({'name': str(col), 'file': filename})
+
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump({'version': version, 'rows': len(df), 'columns': columns}, f)
+
+    tmp_path = os.path.join(root, 'CURRENT.tmp')
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(root, 'CURRENT'))
+
+    versions = sorted(v for v in os.listdir(root) if v.isdigit())
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+    return version
+
+
+def current_version(root=UNIVERSE_DIR, max_age=MAX_UNIVERSE_AGE):
+    """Return the current universe version, or None if there is none or it is too old."""
+    try:
+        with open(os.path.join(root, 'CURRENT')) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+
+    if not version.isdigit() or time.time() - int(version) / 1000 > max_age:
+        return None
+    return version
+
+
+def open_universe(version, root=UNIVERSE_DIR):
+    """
+    Map every column of a universe version read-only.
+
+    Returns:
+        dict: {column name: memory-mapped array}, in the original column order
+    """
+    directory = os.path.join(root, version)
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+
+    return {c['name']: np.load(os.path.join(directory, c['file']), mmap_mode='r') for c in manifest['columns']}
+
+
+def load_universe(version, questions=None, root=UNIVERSE_DIR):
+    """
+    Load a universe version as a DataFrame.
+
+    Args:
+        version (str): Version to load
+        questions (list, optional): Only materialize the rows of these questions;
+            the other rows are never read from the mapped files
+
+    Returns:
+        DataFrame: The All Markets rows
+    """
+    columns = open_universe(version, root)
+
+    if questions is not None and 'question' in columns:
+        rows = np.nonzero(np.isin(columns['question'], np.array(list(questions), dtype=str)))[0]
+        return pd.DataFrame({name: values[rows] for name, values in columns.items()})
+
+    return pd.DataFrame({name: np.asarray(values) for name, values in columns.items()})
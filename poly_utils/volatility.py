@@ -0,0 +1,156 @@
+import math
+from collections import deque
+
+import numpy as np
+
+# Volatility windows reported for every market, in hours
+WINDOWS = {
+    '1_hour': 1,
+    '3_hour': 3,
+    '6_hour': 6,
+    '12_hour': 12,
+    '24_hour': 24,
+    '7_day': 24 * 7,
+    '14_day': 24 * 14,
+    '30_day': 24 * 30,
+}
+
+# Scales the standard deviation of 1-minute log returns to a yearly figure
+ANNUALIZE = np.sqrt(60 * 24 * 252)
+
+
+def multi_window_volatility(t, p, counts, windows=WINDOWS):
+    """
+    Annualized volatility of many price series over several trailing windows at once.
+
+    The series are passed concatenated. Every window ends at the last point of
+    its series, so each one is a suffix of it. One cumulative sum of the log
+    returns, their squares and their count gives every window's sample standard
+    deviation (ddof=1) without revisiting the data.
+
+    Args:
+        t (ndarray): Timestamps in seconds, ascending within each series
+        p (ndarray): Prices
+        counts (ndarray): Number of points in each series
+        windows (dict, optional): {name: hours}
+
+    Returns:
+        dict: {name: array of annualized volatility per series, rounded to 2 decimals}
+    """
+    t = np.asarray(t, dtype=np.int64)
+    p = np.asarray(p, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.int64)
+
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    owner = np.repeat(np.arange(len(counts)), counts)
+
+    returns = np.full(len(p), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = np.log(p[1:] / p[:-1])
+    returns[starts[counts > 0]] = np.nan
+
+    # Infinite returns (a price of 0) make a window's volatility NaN, as pandas' std does
+    valid = np.isfinite(returns)
+    infinite = np.isinf(returns)
+
+    # Shift each series by its mean return so the sum of squares does not cancel out
+    n_valid = np.bincount(owner[valid], minlength=len(counts))
+    shift = np.bincount(owner[valid], weights=returns[valid], minlength=len(counts)) / np.maximum(n_valid, 1)
+    x = np.where(valid, returns - shift[owner], 0)
+
+    # Prefix sums with a leading zero, so sum(x[i:j]) = S[j] - S[i]
+    def prefix(values):
+        return np.concatenate([[0], np.cumsum(values)])
+
+    S1, S2, N, INF = prefix(x), prefix(x * x), prefix(valid), prefix(infinite)
+
+    # Sort key that orders points by series, then by time, to search all series at once
+    t0 = t.min() if len(t) else 0
+    span = (t.max() - t0 + 1) if len(t) else 1
+    keys = owner * span + (t - t0)
+    last_t = np.zeros(len(counts), dtype=np.int64)
+    last_t[counts > 0] = t[ends[counts > 0] - 1]
+
+    result = {}
+    for name, hours in windows.items():
+        # First point of each series inside the window
+        offset = np.clip(last_t - hours * 3600 - t0, 0, span - 1)
+        lo = np.maximum(np.searchsorted(keys, np.arange(len(counts)) * span + offset, side='left'), starts)
+
+        n = N[ends] - N[lo]
+        s1 = S1[ends] - S1[lo]
+        s2 = S2[ends] - S2[lo]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var = (s2 - s1 * s1 / n) / (n - 1)
+        var = np.where((n > 1) & (INF[ends] == INF[lo]), np.maximum(var, 0), np.nan)
+        result[name] = np.round(np.sqrt(var) * ANNUALIZE, 2)
+
+    return result
+
+
+class RollingVolatility:
+    """
+    Realized volatility of a price stream over several trailing time windows.
+
+    Each window keeps its log returns in a deque together with a running mean
+    and sum of squared deviations (Welford), so adding a sample and dropping the
+    samples that left the window costs O(1) per sample.
+    """
+
+    def __init__(self, windows, annualize=ANNUALIZE):
+        """
+        Args:
+            windows (dict): {name: window length in seconds}
+            annualize (float, optional): Factor the standard deviation is multiplied by
+        """
+        self.annualize = annualize
+        self.windows = {name: [seconds, deque(), 0, 0.0, 0.0] for name, seconds in windows.items()}
+        self.last_price = None
+        self.last_time = None
+
+    def update(self, t, price):
+        """Add a price sample taken at time t (seconds)."""
+        if price is None or not price > 0:
+            return
+
+        if self.last_price is not None:
+            self.add_return(t, math.log(price / self.last_price))
+
+        self.last_price = price
+        self.last_time = t
+
+    def add_return(self, t, r):
+        """Add a log return observed at time t (seconds), for callers that compute their own returns."""
+        for window in self.windows.values():
+            seconds, samples, n, mean, m2 = window
+
+            samples.append((t, r))
+            n += 1
+            d = r - mean
+            mean += d / n
+            m2 += d * (r - mean)
+
+            while samples and samples[0][0] < t - seconds:
+                _, old = samples.popleft()
+                n -= 1
+                if n == 0:
+                    mean, m2 = 0.0, 0.0
+                else:
+                    d = old - mean
+                    mean -= d / n
+                    m2 -= d * (old - mean)
+
+            window[2:] = [n, mean, max(m2, 0.0)]
+
+    def count(self, name):
+        """Number of returns currently in a window."""
+        return self.windows[name][2]
+
+    def volatility(self, name):
+        """Annualized volatility over a window, or None with fewer than two returns."""
+        _, _, n, _, m2 = self.windows[name]
+        if n < 2:
+            return None
+        return round(math.sqrt(m2 / (n - 1)) * self.annualize, 2)
@@ -0,0 +1,71 @@
+"""
+Replay a recorded feed through the bot offline.
+
+Loads the market config, then feeds a RECORD_DIR capture through process_data
+and perform_trade against a simulated exchange and prints how fast the bot
+evaluated it and what it decided.
+
+Usage:
+    python replay.py [recordings dir] [--config snapshot|sheet] [--realtime [SPEED]]
+                     [--user-frames] [--verbose] [--json PATH]
+"""
+import os
+import json
+import argparse
+import tempfile
+
+import poly_data.global_state as global_state
+from poly_data.data_utils import update_markets
+from poly_data.warm_start import load_snapshot
+from poly_data.feed_recorder import RECORD_DIR, MARKET, USER
+from poly_sim.replay import Replay, iter_capture, print_summary
+
+
+def load_config(source):
+    """
+    Load the markets and hyperparameters to replay with.
+
+    'snapshot' uses the warm-start snapshot's config whatever its age; 'sheet'
+    reads the configured backend. Either way the simulated account starts flat
+    and outside guarded mode.
+    """
+    if source == 'snapshot':
+        if not load_snapshot(max_age=float('inf')):
+            raise SystemExit("No warm-start snapshot to take the config from, use --config sheet")
+    else:
+        update_markets()
+
+    global_state.positions = {}
+    global_state.orders = {}
+    global_state.unvalidated = set()
+    global_state.live_books = None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay a recorded feed through the bot offline")
+    parser.add_argument('directory', nargs='?', default=RECORD_DIR)
+    parser.add_argument('--config', choices=['snapshot', 'sheet'], default='snapshot')
+    parser.add_argument('--realtime', nargs='?', type=float, const=1.0, default=None,
+                        help="Pace frames at their recorded spacing, optionally sped up")
+    parser.add_argument('--user-frames', action='store_true', help="Also replay the recorded user frames")
+    parser.add_argument('--verbose', action='store_true', help="Show the bot's own logging")
+    parser.add_argument('--json', help="Write the summary to this file")
+    args = parser.parse_args()
+
+    directory = os.path.abspath(args.directory)
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    load_config(args.config)
+
+    # Risk-off files are written relative to the working directory; keep them away from the live ones
+    os.chdir(tempfile.mkdtemp(prefix='replay-'))
+
+    channels = (MARKET, USER) if args.user_frames else (MARKET,)
+    replay = Replay(iter_capture(directory, channels), realtime=args.realtime is not None,
+                    speed=args.realtime or 1.0, include_user=args.user_frames, verbose=args.verbose)
+    summary = replay.run()
+    print_summary(summary)
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,94 @@
+import random
+
+import pandas as pd
+
+from poly_utils.sheet_sink import changed_ranges, to_grid
+
+# Few distinct values, so neighbouring cells often match and runs split and merge
+VALUES = ['', 'a', 'b', 0, 1, 0.5, "'x"]
+
+
+def random_grid(rng, height, width):
+    return [[rng.choice(VALUES) for _ in range(width)] for _ in range(height)]
+
+
+def mutate(rng, grid):
+    # Change a few cells, whole rows or nothing, so small diffs are as common as rewrites
+    grid = [list(row) for row in grid]
+    for _ in range(rng.choice([0, 1, 3, 10])):
+        if grid and grid[0]:
+            grid[rng.randrange(len(grid))][rng.randrange(len(grid[0]))] = rng.choice(VALUES)
+    if grid and rng.random() < 0.2:
+        grid[rng.randrange(len(grid))] = [rng.choice(VALUES) for _ in grid[0]]
+    return grid
+
+
+def pad(grid, height, width):
+    return [[(grid[r][c] if r < len(grid) and c < len(grid[r]) else '') for c in range(width)]
+            for r in range(height)]
+
+
+def apply(ranges, new, old, height, width):
+    # What the sheet holds after SheetSink.write sends the ranges over the old grid
+    sheet = pad(old, height, width)
+    padded = pad(new, height, width)
+    for r0, c0, r1, c1 in ranges:
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                sheet[r][c] = padded[r][c]
+    return sheet
+
+
+def check(new, old):
+    ranges = changed_ranges(new, old)
+    height = max(len(new), len(old))
+    width = max([len(r) for r in new] + [len(r) for r in old] + [0])
+
+    cells = set()
+    for r0, c0, r1, c1 in ranges:
+        assert 0 <= r0 <= r1 < height and 0 <= c0 <= c1 < width, (r0, c0, r1, c1)
+        block = {(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)}
+        assert not cells & block, 'ranges overlap'
+        cells |= block
+
+    assert apply(ranges, new, old, height, width) == pad(new, height, width)
+    return ranges
+
+
+def test_applying_ranges_gives_new_grid():
+    rng = random.Random(0)
+    for _ in range(3000):
+        old = random_grid(rng, rng.randrange(0, 12), rng.randrange(1, 10))
+        if rng.random() < 0.6 and old:
+            new = mutate(rng, old)
+            # Rows and columns are also added and dropped between writes
+            if rng.random() < 0.3:
+                new = new[:rng.randrange(len(new) + 1)]
+            if rng.random() < 0.3:
+                new += random_grid(rng, rng.randrange(1, 4), len(old[0]))
+            if rng.random() < 0.2:
+                cut = rng.randrange(1, len(old[0]) + 1)
+                new = [row[:cut] for row in new]
+        else:
+            new = random_grid(rng, rng.randrange(0, 12), rng.randrange(1, 10))
+        check(new, old)
+
+
+def test_unchanged_grid_sends_nothing():
+    rng = random.Random(1)
+    for _ in range(100):
+        grid = random_grid(rng, rng.randrange(0, 10), rng.randrange(1, 8))
+        assert changed_ranges(grid, [list(row) for row in grid]) == []
+
+
+def test_shrunk_grid_blanks_the_rest():
+    old = [['a', 'b', 'c'], [1, 2, 3], [4, 5, 6]]
+    new = [['a', 'b']]
+    ranges = check(new, old)
+    assert sum((r1 - r0 + 1) * (c1 - c0 + 1) for r0, c0, r1, c1 in ranges) >= 7
+
+
+def test_grids_from_dataframes():
+    old = to_grid(pd.DataFrame({'market': ['x', 'y', 'z'], 'price': [0.5, 0.25, None]}))
+    new = to_grid(pd.DataFrame({'market': ['x', 'y'], 'price': [0.5, 0.3], 'size': [10, 20]}))
+    check(new, old)
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import poly_utils.volatility as volatility
+from poly_utils.volatility import multi_window_volatility, RollingVolatility, WINDOWS, ANNUALIZE
+
+
+def calculate_annualized_volatility(df, hours):
+    # The per-market pandas computation multi_window_volatility replaced, without its rounding
+    end_time = df['t'].max()
+    start_time = end_time - pd.Timedelta(hours=hours)
+    window_df = df[df['t'] >= start_time]
+    volatility = window_df['log_return'].std()
+    return volatility * np.sqrt(60 * 24 * 252)
+
+
+def reference(t, p, windows=WINDOWS):
+    df = pd.DataFrame({'t': pd.to_datetime(t, unit='s'), 'p': p})
+    df['log_return'] = np.log(df['p'] / df['p'].shift(1))
+    return {name: calculate_annualized_volatility(df, hours) for name, hours in windows.items()}
+
+
+def random_series(rng, n, start=1_700_000_000):
+    # Irregular 1 to 30 minute steps over up to a month and a half, prices on the 0.01 grid
+    t = start + np.cumsum(rng.integers(60, 1800, n))
+    p = np.round(np.clip(0.5 + np.cumsum(rng.normal(0, 0.01, n)), 0.01, 0.99), 2)
+    return t, p
+
+
+def check(series, windows=WINDOWS):
+    t = np.concatenate([s[0] for s in series]) if series else np.zeros(0)
+    p = np.concatenate([s[1] for s in series]) if series else np.zeros(0)
+    result = multi_window_volatility(t, p, [len(s[0]) for s in series], windows)
+
+    for i, (ts, ps) in enumerate(series):
+        expected = reference(ts, ps, windows) if len(ts) else {name: np.nan for name in windows}
+        for name in windows:
+            got, want = result[name][i], expected[name]
+            if np.isnan(want):
+                assert np.isnan(got), (i, name, got)
+            else:
+                # Only the rounding to 2 decimals separates the two
+                assert abs(got - want) <= 0.005 + 1e-9 * abs(want), (i, name, got, want)
+
+
+def test_matches_pandas_on_random_series():
+    rng = np.random.default_rng(0)
+    series = [random_series(rng, n) for n in rng.integers(2, 3000, 40)]
+    check(series)
+
+
+def test_short_and_empty_series():
+    rng = np.random.default_rng(1)
+    series = [random_series(rng, n) for n in (0, 1, 2, 3, 0, 500, 1)]
+    check(series)
+
+    result = multi_window_volatility([], [], [])
+    assert all(len(values) == 0 for values in result.values())
+
+
+def test_window_starts_at_points_on_its_boundary():
+    # Points exactly `hours` before the last one are inside the window, as with pandas' >=
+    t = np.arange(0, 5 * 3600 + 1, 900) + 1_700_000_000
+    p = np.round(0.4 + 0.05 * np.sin(np.arange(len(t))), 2)
+    check([(t, p), (t[3:], p[3:]), (t[::2], p[::2])], {'1_hour': 1, '3_hour': 3, '5_hour': 5, '4_hour': 4})
+
+
+def test_suffix_search_keeps_series_apart():
+    # Overlapping and identical time ranges must not pull points of a neighbouring series into a window
+    rng = np.random.default_rng(2)
+    a = random_series(rng, 800)
+    b = random_series(rng, 800, start=a[0][0] + 3600)
+    c = (a[0], np.round(np.clip(a[1][::-1], 0.01, 0.99), 2))
+    d = random_series(rng, 50, start=a[0][-1] + 10 * 24 * 3600)
+    check([a, b, c, d, a])
+
+
+def test_missing_and_zero_prices():
+    rng = np.random.default_rng(3)
+    t, p = random_series(rng, 400)
+
+    with_nan = p.copy()
+    with_nan[[5, 200, 398]] = np.nan
+
+    # A zero price gives infinite returns: NaN for the windows that contain them, like pandas
+    zero_early = p.copy()
+    zero_early[10] = 0
+    zero_late = p.copy()
+    zero_late[-3] = 0
+
+    check([(t, with_nan), (t, zero_early), (t, zero_late)])
+
+    result = multi_window_volatility(t, zero_early, [len(t)])
+    assert np.isfinite(result['1_hour'][0]) and np.isnan(result['30_day'][0])
+
+
+def test_mean_shift_keeps_precision(monkeypatch):
+    # A strong trend with tiny noise: without subtracting the mean return first, the
+    # sum of squares minus the squared sum cancels out and the variance is lost
+    monkeypatch.setattr(volatility, 'ANNUALIZE', 1e12)
+    rng = np.random.default_rng(4)
+    n = 300
+    t = 1_700_000_000 + 60 * np.arange(n)
+    returns = 0.2 + rng.normal(0, 1e-7, n - 1)
+    p = np.exp(np.concatenate([[0], np.cumsum(returns)]))
+
+    result = multi_window_volatility(t, p, [n], {'1_hour': 1, '5_hour': 5})
+    logs = np.diff(np.log(p))
+    # The hour holds 61 points, and like pandas the window counts the return into its first one
+    for name, points in (('1_hour', 61), ('5_hour', n - 1)):
+        expected = np.std(logs[-points:], ddof=1) * 1e12
+        assert result[name][0] == pytest.approx(expected, rel=1e-3)
+
+
+def brute_force(samples, seconds, annualize):
+    # Standard deviation of the returns observed in the window ending at the latest one
+    window = [r for t, r in samples if t >= samples[-1][0] - seconds] if samples else []
+    if len(window) < 2:
+        return len(window), None
+    return len(window), np.std(window, ddof=1) * annualize
+
+
+def test_rolling_matches_brute_force():
+    windows = {'short': 120, 'medium': 900, 'long': 3600}
+    # A large factor so the 2 decimal rounding doesn't hide errors
+    annualize = 1e4
+    rolling = RollingVolatility(windows, annualize)
+    rng = np.random.default_rng(5)
+
+    samples, last_price, t = [], None, 0.0
+    for i in range(5000):
+        t += rng.exponential(2)
+        if rng.random() < 0.01:
+            # Gaps longer than a window empty it
+            t += rng.uniform(200, 4000)
+        price = float(np.clip(0.5 + 0.2 * np.sin(i / 300) + rng.normal(0, 0.01), 0.01, 0.99))
+        if rng.random() < 0.02:
+            price = rng.choice([0.0, -1.0, None])
+
+        rolling.update(t, price)
+        if price is not None and price > 0:
+            if last_price is not None:
+                samples.append((t, np.log(price / last_price)))
+            last_price = price
+
+        for name, seconds in windows.items():
+            n, expected = brute_force(samples, seconds, annualize)
+            assert rolling.count(name) == n
+            got = rolling.volatility(name)
+            if expected is None:
+                assert got is None
+            else:
+                assert abs(got - expected) <= 0.005 + 1e-6 * expected, (i, name, got, expected)
+
+
+def test_rolling_mean_shift():
+    # Welford's update keeps a steady trend from swamping the variance
+    rolling = RollingVolatility({'all': 10**9}, annualize=1e9)
+    rng = np.random.default_rng(6)
+    returns = 0.05 + rng.normal(0, 1e-8, 2000)
+    for i, r in enumerate(returns):
+        rolling.add_return(i, r)
+    assert abs(rolling.volatility('all') - np.std(returns, ddof=1) * 1e9) <= 0.005 + 1e-4
+
+
+def test_rolling_default_scale_matches_batch():
+    # Both implementations annualize the same way
+    rng = np.random.default_rng(7)
+    t, p = random_series(rng, 1000)
+    rolling = RollingVolatility({name: hours * 3600 for name, hours in WINDOWS.items()})
+    for ts, price in zip(t, p):
+        rolling.update(int(ts), float(price))
+
+    batch = multi_window_volatility(t, p, [len(t)])
+    for name in WINDOWS:
+        assert rolling.annualize == ANNUALIZE
+        assert abs(rolling.volatility(name) - batch[name][0]) <= 0.01
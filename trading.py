@@ -1,4 +1,5 @@
 import gc                       # Garbage collection
+import time                     # Evaluation timing
 import os                       # Operating system interface
 import json                     # JSON handling
 import asyncio                  # Asynchronous I/O
@@ -12,6 +13,9 @@ import poly_data.CONSTANTS as CONSTANTS
 # Import utility functions for trading
 from poly_data.trading_utils import get_best_bid_ask_deets, get_order_prices, get_buy_sell_amount, round_down, round_up
 from poly_data.data_utils import get_position, get_order, set_position
+from poly_data.warm_start import is_guarded, has_live_book
+from poly_data.realized_vol import get_volatility
+from poly_data.metrics import TRADE_RUNS, TRADE_SECONDS, TRADE_WAITS, TRADE_SKIPS
 
 # Create directory for storing position risk information
 if not os.path.exists('positions/'):
@@ -142,12 +146,31 @@ async def perform_trade(market):
     if market not in market_locks:
         market_locks[market] = asyncio.Lock()
 
+    if market_locks[market].locked():
+        TRADE_WAITS.inc(market)
+
     # Use lock to prevent concurrent trading on the same market
     async with market_locks[market]:
+        start = time.perf_counter()
         try:
             client = global_state.client
             # Get market details from the configuration
-            row = global_state.df[global_state.df['condition_id'] == market].iloc[0]      
+            row = global_state.markets.get(market)
+            if row is None:
+                print(f"{market} is not in the selected markets. Skipping")
+                TRADE_RUNS.inc('not_selected')
+                return
+
+            # Another shard worker owns the market, or is handing it over
+            if global_state.shard is not None and not global_state.shard.owns(market):
+                TRADE_RUNS.inc('not_owned')
+                return
+
+            # After a warm start, the snapshot's book may be minutes old; wait for a live one
+            if not has_live_book(market):
+                TRADE_RUNS.inc('stale_book')
+                return
+
             # Determine decimal precision from tick size
             round_length = len(str(row['tick_size']).split(".")[1])
 
@@ -161,6 +184,15 @@ async def perform_trade(market):
             ]
             print(f"\n\n{pd.Timestamp.utcnow().tz_localize(None)}: {row['question']}")
 
+            # After a warm start, quote minimum sizes and hold off on stop-losses
+            # until our state has been revalidated
+            guarded = is_guarded(market)
+            if guarded:
+                print(f"Trading {market} in guarded mode")
+
+            # Live 3 hour realized volatility, or the sheet's value until enough samples are in
+            volatility = get_volatility(market, '3_hour', row['3_hour'])
+
             # Get current positions for both outcomes
             pos_1 = get_position(row['token1'])['size']
             pos_2 = get_position(row['token2'])['size']
@@ -261,6 +293,9 @@ async def perform_trade(market):
                 
                 # Calculate how much to buy or sell based on our position
                 buy_amount, sell_amount = get_buy_sell_amount(position, bid_price, row, other_position)
+
+                if guarded:
+                    buy_amount = min(buy_amount, row['min_size'])
                 
                 # Get max_size for logging (same logic as in get_buy_sell_amount)
                 max_size = row.get('max_size', row['trade_size'])
@@ -322,9 +357,13 @@ async def perform_trade(market):
                     # Trigger stop-loss if either:
                     # 1. PnL is below threshold and spread is tight enough to exit
                     # 2. Volatility is too high
-                    if (pnl < params['stop_loss_threshold'] and spread <= params['spread_threshold']) or row['3_hour'] > params['volatility_threshold']:
+                    stop_loss = (pnl < params['stop_loss_threshold'] and spread <= params['spread_threshold']) or volatility > params['volatility_threshold']
+
+                    if stop_loss and guarded:
+                        print("Not risking off in guarded mode because the book may be stale")
+                    elif stop_loss:
                         risk_details['msg'] = (f"Selling {pos_to_sell} because spread is {spread} and pnl is {pnl} "
-                                              f"and ratio is {ratio} and 3 hour volatility is {row['3_hour']}")
+                                              f"and ratio is {ratio} and 3 hour volatility is {volatility}")
                         print("Stop loss Triggered: ", risk_details['msg'])
 
                         # Sell at market best bid to ensure execution
@@ -378,16 +417,18 @@ async def perform_trade(market):
                         print(risk_details, current_time, start_trading_at)
                         if current_time < start_trading_at:
                             send_buy = False
+                            TRADE_SKIPS.inc('risk_off')
                             print(f"Not sending a buy order because recently risked off. "
                                  f"Risked off at {risk_details['time']}")
 
                     # Only proceed if we're not in risk-off period
                     if send_buy:
                         # Don't buy if volatility is high or price is far from reference
-                        if row['3_hour'] > params['volatility_threshold'] or price_change >= 0.05:
-                            print(f'3 Hour Volatility of {row["3_hour"]} is greater than max volatility of '
+                        if volatility > params['volatility_threshold'] or price_change >= 0.05:
+                            print(f'3 Hour Volatility of {volatility} is greater than max volatility of '
                                   f'{params["volatility_threshold"]} or price of {order["price"]} is outside '
                                   f'0.05 of {sheet_value}. Cancelling all orders')
+                            TRADE_SKIPS.inc('volatility')
                             client.cancel_all_asset(order['token'])
                         else:
                             # Check for reverse position (holding opposite outcome)
@@ -397,6 +438,7 @@ async def perform_trade(market):
                             # If we have significant opposing position, don't buy more
                             if rev_pos['size'] > row['min_size']:
                                 print("Bypassing creation of new buy order because there is a reverse position")
+                                TRADE_SKIPS.inc('reverse_position')
                                 if orders['buy']['size'] > CONSTANTS.MIN_MERGE_SIZE:
                                     print("Cancelling buy orders because there is a reverse position")
                                     client.cancel_all_asset(order['token'])
@@ -407,6 +449,7 @@ async def perform_trade(market):
                             if overall_ratio < 0:
                                 send_buy = False
                                 print(f"Not sending a buy order because overall ratio is {overall_ratio}")
+                                TRADE_SKIPS.inc('ratio')
                                 client.cancel_all_asset(order['token'])
                             else:
                                 # Place new buy order if any of these conditions are met:
@@ -462,9 +505,15 @@ async def perform_trade(market):
                     #     print(f"Cancelling sell orders because best size is less than 90% of open orders...")
                     #     send_sell_order(order)
 
+            TRADE_RUNS.inc('ok')
+
         except Exception as ex:
             print(f"Error performing trade for {market}: {ex}")
             traceback.print_exc()
+            TRADE_RUNS.inc('error')
+        finally:
+            # Early returns are timed too, so every outcome counted in TRADE_RUNS has a duration
+            TRADE_SECONDS.observe(time.perf_counter() - start, market)
 
         # Clean up memory and introduce a small delay
         gc.collect()
@@ -1,38 +1,36 @@
+import os
 import time
 import pandas as pd
-from data_updater.trading_utils import get_clob_client
 from data_updater.google_utils import get_spreadsheet
-from data_updater.find_markets import get_sel_df, get_all_markets, get_all_results, get_markets, add_volatility_to_df
-from gspread_dataframe import set_with_dataframe
+from data_updater.find_markets import get_sel_df, get_markets, volatility_frame
+from data_updater.pipeline import discover_markets
+from poly_utils.sheet_sink import SheetSink
+from poly_utils.universe_store import write_universe
+from data_updater.universe_cache import UniverseCache
+from poly_utils.config_backend import get_config_backend, SQLiteConfigBackend
 import traceback
 
 # Initialize global variables
 spreadsheet = get_spreadsheet()
-client = get_clob_client()
 
 wk_all = spreadsheet.worksheet("All Markets")
 wk_vol = spreadsheet.worksheet("Volatility Markets")
 
-sel_df = get_sel_df(spreadsheet, "Selected Markets")
+# Local config store written alongside the sheets when CONFIG_BACKEND=sqlite
+config_backend = get_config_backend()
+local_config = config_backend if isinstance(config_backend, SQLiteConfigBackend) else None
 
-def update_sheet(data, worksheet):
-    all_values = worksheet.get_all_values()
-    existing_num_rows = len(all_values)
-    existing_num_cols = len(all_values[0]) if all_values else 0
-
-    num_rows, num_cols = data.shape
-    max_rows = max(num_rows, existing_num_rows)
-    max_cols = max(num_cols, existing_num_cols)
+sel_df = get_sel_df(local_config or spreadsheet, "Selected Markets")
 
-    # Create a DataFrame with the maximum size and fill it with empty strings
-    padded_data = pd.DataFrame('', index=range(max_rows), columns=range(max_cols))
+# MARKET_REFRESH=incremental reuses markets that have not changed since the previous
+# refresh, which makes it cheap enough to refresh every few minutes
+INCREMENTAL = os.getenv('MARKET_REFRESH', 'full').lower() == 'incremental'
+FULL_INTERVAL = 60 * 60
+INCREMENTAL_INTERVAL = 5 * 60
 
-    # Update the padded DataFrame with the original data and its columns
-    padded_data.iloc[:num_rows, :num_cols] = data.values
-    padded_data.columns = list(data.columns) + [''] * (max_cols - num_cols)
-
-    # Update the sheet with the padded DataFrame, including column headers
-    set_with_dataframe(worksheet, padded_data, include_index=False, include_column_header=True, resize=True)
+def update_sheet(data, worksheet):
+    # Only the cells that changed since the last write are sent
+    SheetSink(worksheet).write(data)
 
 def sort_df(df):
     # Calculate the mean and standard deviation for each column
@@ -75,27 +73,35 @@ def sort_df(df):
     return sorted_df
 
 def fetch_and_process_data():
-    global spreadsheet, client, wk_all, wk_vol, sel_df
+    global spreadsheet, wk_all, wk_vol, sel_df
     
     spreadsheet = get_spreadsheet()
-    client = get_clob_client()
 
     wk_all = spreadsheet.worksheet("All Markets")
     wk_vol = spreadsheet.worksheet("Volatility Markets")
     wk_full = spreadsheet.worksheet("Full Markets")
 
-    sel_df = get_sel_df(spreadsheet, "Selected Markets")
+    sel_df = get_sel_df(local_config or spreadsheet, "Selected Markets")
 
 
-    all_df = get_all_markets(client)
-    print("Got all Markets")
-    all_results = get_all_results(all_df, client)
+    # Paging, book fetches, scoring and history fetches run concurrently as a pipeline
+    cache = UniverseCache.load() if INCREMENTAL else None
+    all_results, refreshed = discover_markets(sel_df, maker_reward=0.75, cache=cache)
     print("Got all Results")
     m_data, all_markets = get_markets(all_results, sel_df, maker_reward=0.75)
-    print("Got all orderbook")
 
     print(f'{pd.to_datetime("now")}: Fetched all markets data of length {len(all_markets)}.')
-    new_df = add_volatility_to_df(all_markets)
+    if INCREMENTAL:
+        cache.update_volatility(volatility_frame(all_markets[all_markets['condition_id'].isin(refreshed)]))
+        new_df = cache.with_volatility(all_markets)
+        cache.save()
+
+        # Nothing cached yet, as on the first incremental run; use whatever histories are stored
+        if len(new_df) == 0:
+            new_df = volatility_frame(all_markets)
+    else:
+        new_df = volatility_frame(all_markets)
+
     new_df['volatility_sum'] =  new_df['24_hour'] + new_df['7_day'] + new_df['14_day']
     
     new_df = new_df.sort_values('volatility_sum', ascending=True)
@@ -117,6 +123,14 @@ def fetch_and_process_data():
     print(f'{pd.to_datetime("now")}: Fetched select market of length {len(new_df)}.')
 
     if len(new_df) > 50:
+        if local_config is not None:
+            local_config.write_worksheet("All Markets", new_df)
+            local_config.write_worksheet("Volatility Markets", volatility_df)
+            local_config.write_worksheet("Full Markets", m_data)
+
+        # Local handoff to main.py on this host; the sheets below are for people
+        write_universe(new_df)
+
         update_sheet(new_df, wk_all)
         update_sheet(volatility_df, wk_vol)
         update_sheet(m_data, wk_full)
@@ -127,7 +141,7 @@ if __name__ == "__main__":
     while True:
         try:
             fetch_and_process_data()
-            time.sleep(60 * 60)  # Sleep for an hour
+            time.sleep(INCREMENTAL_INTERVAL if INCREMENTAL else FULL_INTERVAL)
         except Exception as e:
             traceback.print_exc()
             print(str(e))